@@ -0,0 +1,262 @@
+# coding: utf-8
+"""Persistent sidecar indices for archive filesystems.
+
+A sidecar index is a small binary file stored next to an archive (for
+instance ``archive.tar.gz.fsindex``) which records the metadata needed
+to open the archive without scanning it again. Each index is keyed by the
+size, modification time and a partial digest of the archive, so that it is
+automatically invalidated when the archive changes.
+
+The on-disk format is a fixed magic string, a JSON header describing the
+key and the stored columns, followed by the raw bytes of each column as
+written by `array.array`, aligned on 8 bytes so that they can be memory
+mapped and cast in place.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import array
+import hashlib
+import io
+import json
+import mmap
+import os
+import struct
+import sys
+
+import six
+
+
+__all__ = [
+    'INT64',
+    'archive_key',
+    'index_path',
+    'load_index',
+    'save_index',
+    'pack_strings',
+    'unpack_string',
+    'unpack_strings',
+]
+
+
+_MAGIC = b'FSAIDX\x00\x01'
+_HEADER = struct.Struct('<I')
+_DIGEST_BLOCK = 64 * 1024
+
+try:
+    array.array(str('q'))
+except ValueError:  # pragma: no cover
+    INT64 = str('l')
+else:
+    INT64 = str('q')
+
+
+def _tobytes(arr):
+    return arr.tobytes() if six.PY3 else arr.tostring()
+
+
+def archive_key(handle):
+    """Compute the key identifying the current state of an archive file.
+
+    The key combines the size and modification time of the file with a
+    SHA-1 digest of its first and last 64 KiB, which is enough to detect
+    in-place rewrites without hashing the whole archive.
+
+    Arguments:
+        handle (`io.IOBase`): a readable and seekable handle over an
+            archive stored on the local filesystem.
+
+    Returns:
+        dict: a JSON-serializable description of the archive state.
+
+    """
+    stat = os.fstat(handle.fileno())
+    position = handle.tell()
+    digest = hashlib.sha1()
+    try:
+        handle.seek(0)
+        digest.update(handle.read(_DIGEST_BLOCK))
+        if stat.st_size > _DIGEST_BLOCK:
+            handle.seek(max(_DIGEST_BLOCK, stat.st_size - _DIGEST_BLOCK))
+            digest.update(handle.read(_DIGEST_BLOCK))
+    finally:
+        handle.seek(position)
+    return {
+        'size': stat.st_size,
+        'mtime': stat.st_mtime,
+        'digest': digest.hexdigest(),
+    }
+
+
+def index_path(handle, index):
+    """Get the path of the sidecar index to use for an archive handle.
+
+    Arguments:
+        handle (`io.IOBase`): the handle over the archive.
+        index (`bool` or `str`): either `True` to store the index next
+            to the archive, or an explicit path to the index file.
+
+    Returns:
+        str: the path to the sidecar index, or `None` if the archive
+        is not backed by a file on the local filesystem.
+
+    """
+    name = getattr(handle, 'name', None)
+    if not isinstance(name, six.string_types) or not os.path.isfile(name):
+        return None
+    try:
+        handle.fileno()
+    except (AttributeError, io.UnsupportedOperation, OSError):
+        return None
+    if isinstance(index, six.string_types):
+        return index
+    return '{}.fsindex'.format(name)
+
+
+def save_index(path, kind, key, columns):
+    """Write a sidecar index to the given path.
+
+    The index is first written to a temporary file which is then moved
+    over the destination, so that concurrent readers never observe a
+    partially written index. Errors are silently ignored, since the index
+    is only a cache that can always be rebuilt.
+
+    Arguments:
+        path (str): the path to the sidecar index file.
+        kind (str): the kind of archive the index was built for.
+        key (dict): the key of the archive, as given by `archive_key`.
+        columns (dict): a mapping of column names to `array.array`.
+
+    """
+    layout = []
+    for name in sorted(columns):
+        column = columns[name]
+        layout.append([name, column.typecode, len(column)])
+    header = json.dumps({
+        'kind': kind,
+        'key': key,
+        'byteorder': sys.byteorder,
+        'columns': layout,
+    }).encode('utf-8')
+
+    tmp = '{}.{}.tmp'.format(path, os.getpid())
+    try:
+        with open(tmp, 'wb') as f:
+            f.write(_MAGIC)
+            f.write(_HEADER.pack(len(header)))
+            f.write(header)
+            for name, _, _ in layout:
+                f.write(b'\0' * (-f.tell() % 8))
+                f.write(_tobytes(columns[name]))
+        _replace(tmp, path)
+    except (IOError, OSError):
+        if os.path.exists(tmp):
+            os.remove(tmp)
+
+
+def _replace(src, dst):
+    if hasattr(os, 'replace'):
+        os.replace(src, dst)
+    else:  # pragma: no cover
+        if os.name == 'nt' and os.path.exists(dst):
+            os.remove(dst)
+        os.rename(src, dst)
+
+
+def load_index(path, kind, key):
+    """Load a sidecar index from the given path.
+
+    On Python 3, columns are memory-mapped `memoryview` objects cast to
+    the type of the column, so that loading the index does not copy its
+    contents. On Python 2, columns are loaded into `array.array` objects.
+
+    Arguments:
+        path (str): the path to the sidecar index file.
+        kind (str): the kind of archive the index is expected to describe.
+        key (dict): the expected key of the archive.
+
+    Returns:
+        dict: a mapping of column names to sequences, or `None` if the
+        index does not exist, is corrupted or is stale.
+
+    """
+    try:
+        with open(path, 'rb') as f:
+            if f.read(len(_MAGIC)) != _MAGIC:
+                return None
+            length, = _HEADER.unpack(f.read(_HEADER.size))
+            header = json.loads(f.read(length).decode('utf-8'))
+            if header['kind'] != kind or header['key'] != key:
+                return None
+            if header['byteorder'] != sys.byteorder:
+                return None
+            position = len(_MAGIC) + _HEADER.size + length
+            if six.PY3:
+                data = memoryview(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+                return _map_columns(data, header['columns'], position)
+            else:  # pragma: no cover
+                return _read_columns(f, header['columns'], position)
+    except (IOError, OSError, ValueError, KeyError, EOFError, struct.error):
+        return None
+
+
+def _map_columns(data, layout, position):
+    # Cast the columns of a memory-mapped index in place.
+    columns = {}
+    for name, typecode, count in layout:
+        position += -position % 8
+        size = array.array(str(typecode)).itemsize * count
+        chunk = data[position:position + size]
+        if len(chunk) != size:
+            return None
+        columns[name] = chunk.cast(str(typecode))
+        position += size
+    return columns
+
+
+def _read_columns(handle, layout, position):  # pragma: no cover
+    # Read the columns of an index into arrays, since Python 2 cannot
+    # expose a memory map through a `memoryview`.
+    columns = {}
+    for name, typecode, count in layout:
+        position += -position % 8
+        handle.seek(position)
+        column = columns[name] = array.array(str(typecode))
+        column.fromfile(handle, count)
+        position += column.itemsize * count
+    return columns
+
+
+def pack_strings(strings, encoding='utf-8'):
+    """Pack a sequence of strings into a blob and an offset column.
+
+    Returns:
+        tuple: an `array.array` of bytes and an `array.array` of offsets,
+        where the i-th string is stored between ``offsets[i]`` and
+        ``offsets[i+1]``.
+
+    """
+    blob = bytearray()
+    offsets = array.array(INT64, [0])
+    for string in strings:
+        blob.extend(string.encode(encoding, 'surrogateescape' if six.PY3 else 'strict'))
+        offsets.append(len(blob))
+    return array.array(str('B'), bytes(blob)), offsets
+
+
+def unpack_strings(blob, offsets, encoding='utf-8'):
+    """Unpack a list of strings packed with `pack_strings`.
+    """
+    data = _tobytes(blob)
+    errors = 'surrogateescape' if six.PY3 else 'strict'
+    return [
+        data[offsets[i]:offsets[i+1]].decode(encoding, errors)
+        for i in six.moves.range(len(offsets) - 1)
+    ]
+
+
+def unpack_string(blob, offsets, index, encoding='utf-8'):
+    """Unpack a single string packed with `pack_strings`.
+    """
+    data = _tobytes(blob[offsets[index]:offsets[index+1]])
+    return data.decode(encoding, 'surrogateescape' if six.PY3 else 'strict')
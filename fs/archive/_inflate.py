@@ -0,0 +1,280 @@
+# coding: utf-8
+"""Random access to zlib-compressed streams using inflate checkpoints.
+
+This is an implementation of the approach used by ``zran.c`` from the
+zlib examples: while a compressed stream is decompressed sequentially,
+snapshots of the inflate state are taken at regular intervals of the
+decompressed stream. Seeking to an arbitrary position then only requires
+restoring the closest snapshot and decompressing at most one interval.
+
+Snapshots are taken with `zlib.Decompress.copy`, so they only live in
+memory: the standard library does not expose the ``inflatePrime`` and
+``inflateSetDictionary`` functions that would be required to restore a
+decompressor from a serialized window.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import bisect
+import io
+import threading
+import zlib
+
+from ..enums import Seek
+
+
+__all__ = ['CheckpointReader']
+
+
+class _Checkpoint(object):
+
+    __slots__ = ('position', 'offset', 'decompressor')
+
+    def __init__(self, position, offset, decompressor):
+        self.position = position            # offset in the decompressed data
+        self.offset = offset                # offset in the compressed data
+        self.decompressor = decompressor    # inflate state, or None if fresh
+
+
+class CheckpointReader(io.RawIOBase):
+    """A read-only, seekable file over a zlib-compressed byte range.
+
+    Checkpoints are created lazily, the first time the decompressed
+    stream is read past a multiple of the checkpoint interval. When the
+    number of checkpoints exceeds ``max_checkpoints``, every other one is
+    discarded and the interval is doubled, so that memory usage stays
+    bounded even for very large streams.
+    """
+
+    chunk_size = io.DEFAULT_BUFFER_SIZE * 8
+
+    def __init__(self, handle, start=0, end=None, wbits=zlib.MAX_WBITS | 16,
+                 interval=1 << 22, max_checkpoints=None, size=None, lock=None,
+                 close_handle=False):
+        """Create a new checkpointed reader.
+
+        Parameters:
+            handle (`io.IOBase`): a readable and seekable binary handle
+                containing the compressed data.
+            start (`int`): the offset of the compressed data in ``handle``.
+                **[default: 0]**
+            end (`int`): the offset where the compressed data ends in
+                ``handle``, or `None` to read until the end of the
+                handle. **[default: None]**
+            wbits (`int`): the ``wbits`` parameter of the decompressor:
+                use ``zlib.MAX_WBITS | 16`` for gzip streams (possibly made
+                of several members), and ``-zlib.MAX_WBITS`` for raw deflate
+                streams. **[default: zlib.MAX_WBITS | 16]**
+            interval (`int`): the number of decompressed bytes between two
+                checkpoints. **[default: 4 MiB]**
+            max_checkpoints (`int`): the maximum number of checkpoints to
+                keep in memory, or `None` to keep all of them.
+                **[default: None]**
+            size (`int`): the size of the decompressed data, if known in
+                advance. **[default: None]**
+            lock (`threading.RLock`): a lock to acquire when accessing
+                ``handle``, if it is shared with other readers.
+                **[default: None]**
+            close_handle (`bool`): whether to close ``handle`` when the
+                reader is closed. **[default: False]**
+
+        """
+        super(CheckpointReader, self).__init__()
+        self._handle = handle
+        self._start = start
+        self._end = end
+        self._wbits = wbits
+        self._interval = interval
+        self._max_checkpoints = max_checkpoints
+        self._size = size
+        self._lock = lock or threading.RLock()
+        self._close_handle = close_handle
+
+        self._checkpoints = [_Checkpoint(0, start, None)]
+        self._positions = [0]
+        self._position = 0
+        self._restore(self._checkpoints[0])
+
+    # --- Decompression ------------------------------------------------------
+
+    def _restore(self, checkpoint):
+        if checkpoint.decompressor is None:
+            self._decompressor = zlib.decompressobj(self._wbits)
+        else:
+            self._decompressor = checkpoint.decompressor.copy()
+        self._offset = checkpoint.offset        # next compressed byte to read
+        self._tail = b''                        # compressed bytes not consumed
+        self._buffer = b''                      # last decompressed chunk
+        self._buffer_start = checkpoint.position
+        self._eof = False
+
+    def _read_compressed(self):
+        size = self.chunk_size
+        if self._end is not None:
+            size = min(size, self._end - self._offset)
+        if size <= 0:
+            return b''
+        with self._lock:
+            self._handle.seek(self._offset)
+            data = self._handle.read(size)
+        self._offset += len(data)
+        return data
+
+    def _checkpoint(self, position):
+        if position != self._positions[-1] + self._interval:
+            return
+        consumed = self._offset - len(self._tail)
+        self._checkpoints.append(
+            _Checkpoint(position, consumed, self._decompressor.copy()))
+        self._positions.append(position)
+        if self._max_checkpoints is not None:
+            if len(self._checkpoints) > self._max_checkpoints:
+                self._checkpoints = self._checkpoints[::2]
+                self._positions = self._positions[::2]
+                self._interval *= 2
+
+    def _stream_end(self):
+        # Python 2 decompressors have no `eof` attribute, but they only
+        # store `unused_data` once the end of the stream was reached.
+        eof = getattr(self._decompressor, 'eof', None)
+        return bool(self._decompressor.unused_data) if eof is None else eof
+
+    def _next_member(self, data):
+        # Gzip streams can be made of several members, possibly followed
+        # by padding: only restart decompression on a valid gzip header
+        # (raw deflate streams have negative `wbits`).
+        if self._wbits > zlib.MAX_WBITS and data[:2] == b'\x1f\x8b':
+            self._decompressor = zlib.decompressobj(self._wbits)
+            return data
+        self._eof = True
+        return b''
+
+    def _decompress_chunk(self):
+        """Decompress the next chunk of data into the buffer.
+        """
+        position = self._buffer_start + len(self._buffer)
+        boundary = self._positions[-1] + self._interval
+        max_length = self.chunk_size
+        if position < boundary:
+            max_length = min(max_length, boundary - position)
+
+        chunk = b''
+        while not chunk and not self._eof:
+            data = self._tail or self._read_compressed()
+            if not data:
+                self._eof = True
+                break
+            chunk = self._decompressor.decompress(data, max_length)
+            self._tail = self._decompressor.unconsumed_tail
+            if self._stream_end():
+                unused = self._decompressor.unused_data
+                if len(unused) < 2:
+                    unused += self._read_compressed()
+                self._tail = self._next_member(unused)
+
+        self._buffer_start = position
+        self._buffer = chunk
+        if self._eof and self._size is None:
+            self._size = position + len(chunk)
+        if chunk:
+            self._checkpoint(position + len(chunk))
+        return chunk
+
+    def _seek_decompressor(self, position):
+        """Move the decompressor so that the buffer contains ``position``.
+        """
+        buffer_end = self._buffer_start + len(self._buffer)
+        if self._buffer_start <= position < buffer_end:
+            return
+
+        # Restore the closest checkpoint if it is closer than the current
+        # decompressor position, or if we need to go backwards.
+        index = bisect.bisect_right(self._positions, position) - 1
+        checkpoint = self._checkpoints[index]
+        if position < self._buffer_start or checkpoint.position > buffer_end:
+            self._restore(checkpoint)
+
+        while not self._eof:
+            chunk = self._decompress_chunk()
+            if position < self._buffer_start + len(chunk):
+                break
+
+    # --- IOBase -------------------------------------------------------------
+
+    def readable(self):  # noqa: D102
+        return True
+
+    def seekable(self):  # noqa: D102
+        return True
+
+    def writable(self):  # noqa: D102
+        return False
+
+    def tell(self):  # noqa: D102
+        return self._position
+
+    def seek(self, offset, whence=Seek.set):  # noqa: D102
+        if whence == Seek.set:
+            if offset < 0:
+                raise ValueError("Negative seek position {}".format(offset))
+            self._position = offset
+        elif whence == Seek.current:
+            self._position = max(self._position + offset, 0)
+        elif whence == Seek.end:
+            if offset > 0:
+                raise ValueError("Positive seek position {}".format(offset))
+            self._position = max(self.size() + offset, 0)
+        else:
+            raise ValueError(
+                "Invalid whence ({}, should be {}, {} or {})".format(
+                    whence, Seek.set, Seek.current, Seek.end
+                )
+            )
+        return self._position
+
+    def size(self):
+        """Get the size of the decompressed data.
+
+        If the size was not given to the constructor, this requires
+        decompressing the stream until its end the first time.
+        """
+        if self._size is None:
+            while not self._eof:
+                self._buffer_start += len(self._buffer)
+                self._buffer = b''
+                self._decompress_chunk()
+        return self._size
+
+    def read(self, size=-1):  # noqa: D102
+        if size is not None and size < 0:
+            size = None
+        chunks = []
+        while size is None or size > 0:
+            self._seek_decompressor(self._position)
+            start = self._position - self._buffer_start
+            end = None if size is None else start + size
+            chunk = self._buffer[start:end] if start >= 0 else b''
+            if not chunk:
+                break
+            chunks.append(chunk)
+            self._position += len(chunk)
+            if size is not None:
+                size -= len(chunk)
+        return b''.join(chunks)
+
+    def readinto(self, b):  # noqa: D102
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def readall(self):  # noqa: D102
+        return self.read()
+
+    def close(self):  # noqa: D102
+        if self.closed:
+            return
+        try:
+            if self._close_handle:
+                self._handle.close()
+        finally:
+            super(CheckpointReader, self).close()
@@ -0,0 +1,175 @@
+# coding: utf-8
+"""Journal of the changes made to an archive filesystem.
+
+A `~fs.archive.wrap.WrapWritable` keeps the modified files in a separate
+filesystem, which tells whether a file differs from the original archive
+but not how. A `Journal` records the kind of each change instead, so
+that a saver can copy untouched members as they are stored, only write
+a new header for members whose metadata changed or which were renamed,
+or skip the members of a removed directory altogether.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+from ..path import recursepath
+
+
+__all__ = [
+    'Journal', 'ADDED', 'MODIFIED', 'METADATA', 'REMOVED', 'RENAMED',
+]
+
+
+#: A resource that did not exist in the original filesystem.
+ADDED = 'added'
+#: A resource of the original filesystem which was written again.
+MODIFIED = 'modified'
+#: A file of the original filesystem of which only the metadata changed.
+METADATA = 'metadata'
+#: A resource of the original filesystem which was removed.
+REMOVED = 'removed'
+#: A file moved from another path, with the contents of an original file.
+RENAMED = 'renamed'
+
+
+class Journal(object):
+    """The changes made to the resources of an original filesystem.
+
+    Each path is recorded with the kind of its latest change, relative
+    to the original filesystem: writing a file that was added stays an
+    addition, and removing it discards it from the journal. Paths are
+    expected to be absolute and normalized.
+
+    Example:
+        >>> journal = Journal(lambda path: path in {'/foo', '/foo/bar', '/baz'})
+        >>> journal.remove('/foo/bar'); journal.remove('/foo')
+        >>> journal.remove('/baz'); journal.rename('/spam', '/baz')
+        >>> journal.removed(), journal.renamed()
+        (['/baz', '/foo'], [('/spam', '/baz')])
+        >>> journal.change('/foo/bar')
+        'removed'
+
+    """
+
+    def __init__(self, original):
+        """Create a new journal.
+
+        Arguments:
+            original (callable): a function returning whether a path
+                exists in the original filesystem.
+
+        """
+        self._original = original
+        self._changes = {}
+        self._sources = {}
+
+    def __len__(self):  # noqa: D105
+        return len(self._changes)
+
+    def __bool__(self):  # noqa: D105
+        return bool(self._changes)
+
+    __nonzero__ = __bool__
+
+    def change(self, path):
+        """Get the kind of change made to a path.
+
+        Returns:
+            str: the kind of the latest change, ``'removed'`` if a parent
+            directory was removed, or `None` if the path was not changed.
+
+        """
+        kind = self._changes.get(path)
+        if kind is None:
+            for parent in recursepath(path)[:-1]:
+                if self._changes.get(parent) == REMOVED:
+                    return REMOVED
+        return kind
+
+    def source(self, path):
+        """Get the original path storing the contents of a file.
+
+        Returns:
+            str: the path of ``path`` in the original filesystem, or
+            `None` if its contents are not the ones of an original file.
+
+        """
+        kind = self.change(path)
+        if kind == RENAMED:
+            return self._sources[path]
+        elif kind in (None, METADATA) and self._original(path):
+            return path
+        return None
+
+    def write(self, path):
+        """Record that a resource was created or written at ``path``.
+        """
+        self._sources.pop(path, None)
+        self._changes[path] = MODIFIED if self._original(path) else ADDED
+
+    def setinfo(self, path):
+        """Record that the metadata of the resource at ``path`` changed.
+        """
+        if path not in self._changes:
+            self._changes[path] = METADATA
+
+    def remove(self, path):
+        """Record that the resource at ``path`` was removed.
+        """
+        self._sources.pop(path, None)
+        if self._original(path):
+            self._changes[path] = REMOVED
+        else:
+            self._changes.pop(path, None)
+
+    def rename(self, path, source):
+        """Record that the file at ``path`` has the contents of an original file.
+
+        Arguments:
+            path (str): the path of a file that was moved or copied.
+            source (str): the path of the original file storing its
+                contents, as given by `source` before it was moved.
+
+        """
+        if path == source:
+            self._sources.pop(path, None)
+            self._changes[path] = METADATA
+        else:
+            self._changes[path] = RENAMED
+            self._sources[path] = source
+
+    def _paths(self, kind):
+        return sorted(p for p, k in self._changes.items() if k == kind)
+
+    def added(self):
+        """Get the paths of the resources added, sorted.
+        """
+        return self._paths(ADDED)
+
+    def modified(self):
+        """Get the paths of the resources written again, sorted.
+        """
+        return self._paths(MODIFIED)
+
+    def metadata(self):
+        """Get the paths of the files with only new metadata, sorted.
+        """
+        return self._paths(METADATA)
+
+    def renamed(self):
+        """Get the renamed files, as sorted ``(path, source)`` tuples.
+        """
+        return [(path, self._sources[path]) for path in self._paths(RENAMED)]
+
+    def removed(self):
+        """Get the paths of the resources removed, sorted.
+
+        The resources of a removed directory are not listed, only the
+        directory itself is.
+        """
+        return [
+            path for path in self._paths(REMOVED)
+            if not any(
+                self._changes.get(parent) == REMOVED
+                for parent in recursepath(path)[:-1]
+            )
+        ]
@@ -0,0 +1,165 @@
+# coding: utf-8
+"""Compact tables of the members of an archive.
+
+Keeping a `zipfile.ZipInfo` or a `tarfile.TarInfo` object for every
+member of an archive, together with a mapping of each directory to its
+children, costs several hundred bytes per member. A `MemberTable` stores
+the directory tree of an archive in a few `array.array` columns instead,
+with interned path components so that names shared by several members are
+only stored once. The metadata of the members is left to columns owned by
+the reader, indexed by the row of each member, from which the standard
+library objects can be built on demand.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import array
+
+import six
+
+from ..path import iteratepath
+from ._index import INT64
+
+
+__all__ = ['MemberTable']
+
+
+class MemberTable(object):
+    """The directory tree of an archive, stored in flat arrays.
+
+    Every file and directory of the archive, including the directories
+    that are only implied by the path of a member, is a node of the table,
+    identified by an integer. The root directory is always the node ``0``.
+    Nodes created from an archive member record the row of that member.
+
+    Nodes are added with `add`, after which `freeze` must be called once
+    to sort the children of each directory, before the table can be
+    queried. Lookups then use a binary search in each directory along the
+    path, so that no per-directory mapping has to be kept in memory.
+
+    Example:
+        >>> table = MemberTable()
+        >>> table.add('foo/bar.txt', row=0)
+        2
+        >>> table.freeze()
+        >>> table.lookup('/foo')
+        1
+        >>> table.isdir(1), table.row(1)
+        (True, -1)
+
+    """
+
+    def __init__(self):  # noqa: D107
+        self._names = ['']
+        self._parents = array.array(INT64, [-1])
+        self._rows = array.array(INT64, [-1])
+        self._dirs = array.array(str('b'), [1])
+        # only used while the table is being built
+        self._interned = {}
+        self._nodes = {}
+        # only available once the table is frozen
+        self._children = None
+        self._offsets = None
+
+    def __len__(self):  # noqa: D105
+        return len(self._names)
+
+    def _child(self, parent, name, is_dir):
+        key = (parent, name)
+        node = self._nodes.get(key)
+        if node is None:
+            node = self._nodes[key] = len(self._names)
+            self._names.append(self._interned.setdefault(name, name))
+            self._parents.append(parent)
+            self._rows.append(-1)
+            self._dirs.append(is_dir)
+        elif is_dir:
+            self._dirs[node] = 1
+        return node
+
+    def add(self, path, row=-1, is_dir=False):
+        """Add a member to the table, as well as its parent directories.
+
+        If a member was already added with the same path, its row is
+        replaced, and the node is a directory if any of them was.
+
+        Arguments:
+            path (str): the normalized path of the member.
+            row (int): the row of the member, or ``-1`` for a directory
+                that does not have a member in the archive.
+            is_dir (bool): whether the member is a directory.
+
+        Returns:
+            int: the node of the member.
+
+        """
+        node = 0
+        components = iteratepath(path)
+        for index, name in enumerate(components):
+            last = index == len(components) - 1
+            node = self._child(node, name, is_dir or not last)
+        if node and row >= 0:
+            self._rows[node] = row
+        return node
+
+    def freeze(self):
+        """Sort the children of each directory to allow lookups.
+        """
+        order = sorted(
+            six.moves.range(1, len(self._names)),
+            key=lambda node: (self._parents[node], self._names[node]),
+        )
+        offsets = array.array(INT64, [0]) * (len(self._names) + 1)
+        for node in order:
+            offsets[self._parents[node] + 1] += 1
+        for node in six.moves.range(len(self._names)):
+            offsets[node + 1] += offsets[node]
+        self._children = array.array(INT64, order)
+        self._offsets = offsets
+        self._nodes = self._interned = None
+
+    def lookup(self, path):
+        """Get the node of the given path.
+
+        Arguments:
+            path (str): a normalized path.
+
+        Returns:
+            int: the node of ``path``, or `None` if it does not exist.
+
+        """
+        node = 0
+        for name in iteratepath(path):
+            lo, hi = self._offsets[node], self._offsets[node + 1]
+            while lo < hi:
+                mid = (lo + hi) // 2
+                if self._names[self._children[mid]] < name:
+                    lo = mid + 1
+                else:
+                    hi = mid
+            if lo == self._offsets[node + 1]:
+                return None
+            node = self._children[lo]
+            if self._names[node] != name:
+                return None
+        return node
+
+    def isdir(self, node):
+        """Check whether the given node is a directory.
+        """
+        return self._dirs[node] != 0
+
+    def row(self, node):
+        """Get the row of the member of the given node, or ``-1``.
+        """
+        return self._rows[node]
+
+    def name(self, node):
+        """Get the name of the given node.
+        """
+        return self._names[node]
+
+    def children(self, node):
+        """Get the nodes of the children of the given node, sorted by name.
+        """
+        return self._children[self._offsets[node]:self._offsets[node + 1]]
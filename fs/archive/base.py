@@ -9,6 +9,7 @@ import six
 import sys
 import shutil
 import tempfile
+import collections
 
 from .. import errors
 from ..mode import Mode
@@ -21,7 +22,9 @@ from ..multifs import MultiFS
 from .._fscompat import fsdecode, fspath
 
 from .wrap import WrapWritable
-from ._utils import writable_stream, writable_path, unique
+from ._utils import writable_stream, writable_path, unique, import_from_names
+
+futures = import_from_names('concurrent.futures')
 
 
 @six.add_metaclass(abc.ABCMeta)
@@ -41,11 +44,20 @@ class ArchiveSaver(object):
             initial_position (`int`): The initial position of the stream when
                 it was seen for the first time. **[default: 0]**
 
+        Keyword Arguments:
+            update (`str`): How to update an existing archive file in
+                place instead of writing it again to a temporary file,
+                among the modes supported by the saver, e.g. ``'append'``
+                to append new files after the original members when files
+                were only added. Use `None` to always write the archive
+                again. **[default: None]**
+
         """
         self.output = output
         self.overwrite = overwrite
         self.initial_position = initial_position
         self.stream = isinstance(output, io.IOBase)
+        self.update = options.get('update')
 
     def save(self, fs):
         """Save the given FS.
@@ -67,6 +79,9 @@ class ArchiveSaver(object):
 
         """
         if self.overwrite: # If we need to overwrite, use temporary file
+            overlay = self._get_overlay(fs) if self.update else None
+            if overlay is not None and self._update(fs, overlay):
+                return
             tmp = '.'.join([self.output, 'tmp'])
             self._to(tmp, fs)
             shutil.move(tmp, self.output)
@@ -94,6 +109,71 @@ class ArchiveSaver(object):
         else:
             self._to(self.output, fs)
 
+    @staticmethod
+    def _get_overlay(fs):
+        """Get the overlay of an `ArchiveFS` opened on an existing archive.
+
+        Savers can use it to find the files left untouched since the
+        archive was opened, and copy them from the original archive
+        instead of reading them again through the filesystem.
+
+        Returns:
+            `~fs.archive.wrap.WrapWritable`: the overlay over the reader
+            of the original archive, or `None` if ``fs`` is not an
+            `ArchiveFS` opened on an existing archive.
+
+        """
+        if isinstance(fs, ArchiveFS):
+            overlay = fs.delegate_fs()
+            if isinstance(overlay, WrapWritable):
+                return overlay
+        return None
+
+    def _update(self, fs, overlay):
+        """Update the archive ``self.output`` in place, if possible.
+
+        This is only attempted when an ``update`` mode was given. By
+        default, new files are appended with `_append` when nothing else
+        was changed. Savers able to apply other changes in place can
+        override this method.
+
+        Parameters:
+            fs (`fs.base.FS`): the filesystem to save in the archive.
+            overlay (`~fs.archive.wrap.WrapWritable`): the overlay over
+                the reader of the original archive.
+
+        Returns:
+            `bool`: `True` if the archive was updated, or `False` if it
+            must be written again.
+
+        """
+        added = overlay._added()
+        return added is not None and self._append(fs, overlay._rfs, added)
+
+    def _append(self, fs, source_fs, added):
+        """Append new files to the archive ``self.output`` in place.
+
+        This is only attempted when the files and directories of ``fs``
+        that are not in the original archive are the only changes made
+        to it, so that the archive does not need to be written again.
+        Savers supporting it must override this method.
+
+        Parameters:
+            fs (`fs.base.FS`): the filesystem to save in the archive.
+            source_fs (`ArchiveReadFS`): the reader of the original archive.
+            added (`list`): the paths of the new files and directories,
+                parents first.
+
+        Returns:
+            `bool`: `True` if the new files were appended, or `False` if
+            the whole archive must be written again. Since the archive is
+            then written again from its original members, appending must
+            never overwrite them, and a failure to append should return
+            `False` rather than raise.
+
+        """
+        return False
+
     @abc.abstractmethod
     def _to(self, handle, fs):
         """Save the given FS to the given stream handle.
@@ -201,6 +281,98 @@ class ArchiveReadFS(FS):
             return self._meta['standard'].copy()
         return {}
 
+    #: Whether `extract` can read several files concurrently.
+    _extract_concurrently = False
+
+    #: The maximum size of a file read in memory by `extract` while the
+    #: previous files are being written.
+    _extract_buffer_size = 1 << 24
+
+    def _extract_order(self, paths):
+        """Sort the files to extract in the order they should be read.
+        """
+        return paths
+
+    def _extract_open(self, paths):
+        """Open the files to extract, in the order they should be read.
+        """
+        for path in self._extract_order(paths):
+            yield path, self.openbin(path)
+
+    def _extract_file(self, dst_fs, path):
+        with self.openbin(path) as src_file:
+            dst_fs.upload(path, src_file)
+
+    def extract(self, dst_fs, paths=None, workers=None):
+        """Extract files from the archive to another filesystem.
+
+        Files are read in the order best suited to the archive format,
+        for instance following their location in the archive. When
+        ``workers`` is greater than one, archives with independently
+        compressed members (such as ZIP files) are extracted by a pool of
+        threads, while other archives are read sequentially and the files
+        are written to ``dst_fs`` by the pool.
+
+        Arguments:
+            dst_fs (`fs.base.FS`): The filesystem to extract the files to.
+            paths (`list` of `str`, optional): The paths of the files and
+                directories to extract, or `None` to extract the whole
+                archive. **[default: None]**
+            workers (`int`, optional): The number of threads to use.
+                **[default: None]**
+
+        Raises:
+            `~fs.errors.ResourceNotFound`: When one of the ``paths`` does
+                not exist.
+
+        """
+        self.check()
+        files, dirs = [], []
+        for path in ['/'] if paths is None else paths:
+            _path = abspath(normpath(path))
+            if self.isdir(_path):
+                dirs.append(_path)
+                dirs.extend(self.walk.dirs(_path))
+                files.extend(self.walk.files(_path))
+            elif self.exists(_path):
+                files.append(_path)
+            else:
+                raise errors.ResourceNotFound(path)
+
+        files = list(unique(files))
+        dirs.extend(dirname(path) for path in files)
+        for path in unique(dirs):
+            dst_fs.makedirs(path, recreate=True)
+
+        if futures is None or workers is None or workers <= 1:
+            for path, src_file in self._extract_open(files):
+                with src_file:
+                    dst_fs.upload(path, src_file)
+            return
+
+        with futures.ThreadPoolExecutor(workers) as executor:
+            if self._extract_concurrently:
+                pending = [
+                    executor.submit(self._extract_file, dst_fs, path)
+                    for path in self._extract_order(files)
+                ]
+            else:
+                pending = collections.deque()
+                for path, src_file in self._extract_open(files):
+                    with src_file:
+                        data = src_file.read(self._extract_buffer_size + 1)
+                        if len(data) > self._extract_buffer_size:
+                            # too large to be buffered: copy it right away
+                            with dst_fs.openbin(path, 'w') as dst_file:
+                                dst_file.write(data)
+                                shutil.copyfileobj(src_file, dst_file)
+                            continue
+                    pending.append(executor.submit(dst_fs.writebytes, path, data))
+                    while len(pending) > workers:
+                        pending.popleft().result()
+        for future in pending:
+            future.result()
+
     def close(self):  # noqa: D102
         if not self.isclosed():
             if self._close_handle:
@@ -231,6 +403,9 @@ class ArchiveFS(WrapFS):
             close_handle (boolean): If `True`, close the handle
                 when the filesystem is closed. **[default: True]**
 
+        Any other keyword argument is passed to both the reader filesystem
+        and the saver, which ignore the options they do not support.
+
         """
         initial_position = 0
         read_fs = None
@@ -265,7 +440,8 @@ class ArchiveFS(WrapFS):
 
         overwrite = read_fs is not None
         if create_saver:
-            self._saver = self._saver_cls(handle, overwrite, initial_position)
+            self._saver = self._saver_cls(
+                handle, overwrite, initial_position, **options)
 
         proxy = proxy or "mem://"
         wrapped_fs = WrapWritable(read_fs, writable_fs=proxy) \
@@ -274,7 +450,10 @@ class ArchiveFS(WrapFS):
 
     def close(self):  # noqa: D102
         if not self.isclosed():
-            if self._saver is not None:
+            # an existing archive is only saved again if it was modified
+            wrapped_fs = self.delegate_fs()
+            modified = not isinstance(wrapped_fs, WrapWritable) or wrapped_fs._dirty
+            if self._saver is not None and modified:
                 self._saver.save(self)
             self.delegate_fs().close()
             super(ArchiveFS, self).close()
@@ -242,6 +242,11 @@ class ISOReadFS(base.ArchiveReadFS):
             meta['max_path_length'] = 255
         return meta
 
+    _extract_concurrently = True
+
+    def _extract_order(self, paths):
+        return sorted(paths, key=lambda path: self._get_cd_entry(path).orig_extent_loc)
+
     def getsize(self, path):  # noqa: D102
         _path = self.validatepath(path)
         entry = self._get_cd_entry(_path)
@@ -8,12 +8,16 @@ import collections
 import io
 import functools
 import itertools
+import re
+import shutil
 import stat
+import tempfile
 
 import six
 import lzma
 import py7zr
 import iocursor
+from py7zr.archiveinfo import Folder
 from py7zr.helpers import ArchiveTimestamp
 from py7zr.py7zr import FILE_ATTRIBUTE_UNIX_EXTENSION
 from py7zr.exceptions import Bad7zFile
@@ -25,8 +29,21 @@ from ...osfs import OSFS
 from ...path import abspath, dirname, basename, join, relpath
 from ...enums import ResourceType
 from ...permissions import Permissions
+from ...wildcard import match_any
 
 from .. import base
+from .._utils import import_from_names
+from .iotools import SevenZipStreamReader
+from .keys import key_cache
+
+futures = import_from_names('concurrent.futures')
+
+# Writing several solid blocks replaces the folders and streams of the
+# header built by `py7zr`, which relies on its internals: only do it with
+# the versions it was tested with, and use the `py7zr` writer otherwise.
+_PY7ZR_VERSION = tuple(
+    int(x) for x in re.findall(r'\d+', py7zr.__version__)[:3])
+_SOLID_BLOCKS = (0, 17, 3) <= _PY7ZR_VERSION < (0, 21)
 
 
 class _Origin(object):
@@ -37,6 +54,35 @@ class _Origin(object):
         return self.fs.openbin(self.path, mode)
 
 
+class _Record(object):
+    """The metadata of an archive member, decoded once when opening it.
+    """
+
+    __slots__ = ('name', 'is_dir', 'type', 'size', 'created', 'accessed', 'modified')
+
+    def __init__(self, entry):
+        properties = entry.file_properties()
+        self.name = basename(entry.filename)
+        self.is_dir = entry.is_directory
+
+        raw_type = entry.st_fmt
+        if raw_type is not None:
+            self.type = OSFS.STAT_TO_RESOURCE_TYPE.get(raw_type, ResourceType.unknown)
+        elif properties['is_directory']:
+            self.type = stat.S_IFDIR
+        else:
+            self.type = stat.S_IFREG
+
+        self.size = properties.get("uncompressed")
+        self.created = self._timestamp(properties.get("creationtime"))
+        self.accessed = self._timestamp(properties.get("lastaccesstime"))
+        self.modified = self._timestamp(properties.get("lastwritetime"))
+
+    @staticmethod
+    def _timestamp(value):
+        return None if value is None else value.totimestamp()
+
+
 class SevenZipReadFS(base.ArchiveReadFS):
     """A read-only filesystem within a 7z archive.
     """
@@ -68,64 +114,70 @@ class SevenZipReadFS(base.ArchiveReadFS):
                 when the filesystem is closed. **[default: True]**
             password (`str`): The password to use for decrypting the
                 archive contents. **[default: None]**
+            cache_size (`int`): The maximum number of decompressed bytes
+                of solid blocks to keep in memory, so that reading several
+                files from the same solid block only decompresses it once.
+                Use ``0`` to disable the cache. **[default: 64 MiB]**
+            spill_size (`int`): The size above which files that are not
+                cached are decompressed incrementally as they are read,
+                instead of being extracted in memory when opened. Such
+                files keep at most ``spill_size`` decompressed bytes in
+                memory, and spill the rest to a temporary file.
+                **[default: 16 MiB]**
+            key_cache (`dict`): A mapping in which to cache the AES keys
+                derived from the password, which can be shared with a
+                `SevenZipSaver`. **[default: a new cache]**
 
         """
         super(SevenZipReadFS, self).__init__(handle, **options)
         self._password = options.get('password')
+        self._cache_size = options.get('cache_size', 1 << 26)
+        self._cache = collections.OrderedDict()
+        self._key_cache = options.get('key_cache', {})
+        self._spill_size = options.get('spill_size', 1 << 24)
         self._start_position = self._handle.tell()
+        self._7z = None
 
-        _7z = None
         try:
-            _7z = py7zr.SevenZipFile(handle, 'r', password=self._password)
+            with key_cache(self._key_cache):
+                self._7z = py7zr.SevenZipFile(self._handle, 'r', password=self._password)
         except py7zr.exceptions.PasswordRequired as exc:
             raise errors.CreateFailed(
                 exc=errors.PermissionDenied(msg="7z archive is password protected", exc=exc)
             )
         except (lzma.LZMAError, TypeError, Bad7zFile) as exc:
             raise errors.CreateFailed(exc=exc)
-        else:
-            self._members = {abspath(info.filename):info for info in _7z.files}
-            self._bydir = collections.defaultdict(list)
-            for info in _7z.files:
-                self._bydir[abspath(dirname(info.filename))].append(info)
-        finally:
-            if _7z is not None:
-                _7z.close()
 
-    def _get_info_from_entry(self, entry, namespaces=None):
+        self._members = {}
+        self._records = {}
+        self._bydir = collections.defaultdict(list)
+        for entry in self._7z.files:
+            _path = abspath(entry.filename)
+            record = _Record(entry)
+            self._members[_path] = entry
+            self._records[_path] = record
+            self._bydir[abspath(dirname(entry.filename))].append(record)
+
+    def _get_info_from_record(self, record, namespaces=None):
         namespaces = namespaces or ()
 
         info = {
             'basic': {
-                'name': basename(entry.filename),
-                'is_dir': entry.is_directory,
+                'name': record.name,
+                'is_dir': record.is_dir,
             }
         }
 
         if "details" in namespaces:
-            properties = entry.file_properties()
-            info['details'] = details = {}
-
-            raw_type = entry.st_fmt
-            if raw_type is not None:
-                details['type'] = OSFS.STAT_TO_RESOURCE_TYPE.get(raw_type, ResourceType.unknown)
-            elif properties['is_directory']:
-                details['type'] = stat.S_IFDIR
-            else:
-                details['type'] = stat.S_IFREG
-
-            if "uncompressed" in properties:
-                details["size"] = properties["uncompressed"]
-
-            creationtime = properties.get("creationtime")
-            if creationtime is not None:
-                details['created'] = creationtime.totimestamp()
-            lastaccesstime = properties.get("lastaccesstime")
-            if lastaccesstime is not None:
-                details['accessed'] = lastaccesstime.totimestamp()
-            lastwritetime = properties.get("lastwritetime")
-            if lastwritetime is not None:
-                details['modified'] = lastwritetime.totimestamp()
+            info['details'] = details = {'type': record.type}
+            if record.size is not None:
+                details['size'] = record.size
+            if record.created is not None:
+                details['created'] = record.created
+            if record.accessed is not None:
+                details['accessed'] = record.accessed
+            if record.modified is not None:
+                details['modified'] = record.modified
 
         # TODO: extract UNIX permissions
         # if "access" in namespaces:
@@ -140,11 +192,11 @@ class SevenZipReadFS(base.ArchiveReadFS):
         if _path == '/':
             return Info({'basic': {'name': '', 'is_dir': True}})
 
-        entry = self._members.get(_path)
-        if entry is None:
+        record = self._records.get(_path)
+        if record is None:
             raise errors.ResourceNotFound(path)
 
-        return self._get_info_from_entry(entry, namespaces)
+        return self._get_info_from_record(record, namespaces)
 
     def listdir(self, path):  # noqa: D102
         return [entry.name for entry in self.scandir(path)]
@@ -159,8 +211,8 @@ class SevenZipReadFS(base.ArchiveReadFS):
             elif not _info.is_directory:
                 raise errors.DirectoryExpected(path)
 
-        for entry in self._bydir.get(_path, ()):
-            yield self._get_info_from_entry(entry, namespaces)
+        for record in self._bydir.get(_path, ()):
+            yield self._get_info_from_record(record, namespaces)
 
     def openbin(self, path, mode='r', buffering=-1, **options):  # noqa: D102
         _path = abspath(self.validatepath(path))
@@ -177,21 +229,144 @@ class SevenZipReadFS(base.ArchiveReadFS):
         elif _info.emptystream:
             return io.BytesIO()
 
-        self._handle.seek(self._start_position)
+        with self._lock:
+            contents = self._cache.pop(_info.folder, None)
+            if contents is None:
+                if not self._cacheable(_info.folder) and _info.uncompressed > self._spill_size:
+                    return self._stream(_info)
+                contents = self._read_folder(_info)
+            if self._cacheable(_info.folder):
+                self._cache[_info.folder] = contents
+                self._evict()
 
-        _7z = None
+        return iocursor.Cursor(contents[relpath(_path)])
+
+    def _stream(self, entry):
+        """Open a member for reading without extracting it in memory.
+        """
         try:
-            _7z = py7zr.SevenZipFile(self._handle, 'r', password=self._password)
-            decompressed = _7z.read([_path])
+            return SevenZipStreamReader(
+                self._handle, self._7z, entry, lock=self._lock,
+                spill_size=self._spill_size, key_cache=self._key_cache)
+        except py7zr.exceptions.PasswordRequired as exc:
+            raise errors.PermissionDenied(msg="7z archive is password protected", exc=exc)
+
+    def openbins(self, paths=None, filter=None):
+        """Open several files, decompressing each solid block only once.
+
+        Files are yielded in the order they are stored in the archive, so
+        that every solid block containing a requested file is decompressed
+        in a single pass, instead of once per file as with `openbin`.
+
+        Arguments:
+            paths (`list` of `str`, optional): The paths of the files to
+                open, or `None` to open every file in the archive.
+            filter (`list` of `str`, optional): A list of wildcard
+                patterns (e.g. ``['*.py']``) the file names must match.
+
+        Yields:
+            (str, io.IOBase): the absolute path and a binary file opened
+            in read mode for each requested file.
+
+        Raises:
+            `~fs.errors.ResourceNotFound`: When one of the ``paths`` does
+                not exist.
+            `~fs.errors.FileExpected`: When one of the ``paths`` is a
+                directory.
+
+        """
+        if paths is None:
+            entries = [e for e in self._members.values() if not e.is_directory]
+        else:
+            entries = []
+            for path in paths:
+                _path = abspath(self.validatepath(path))
+                entry = self._members.get(_path)
+                if entry is None:
+                    raise errors.ResourceNotFound(path)
+                elif entry.is_directory:
+                    raise errors.FileExpected(path)
+                entries.append(entry)
+        if filter is not None:
+            entries = [e for e in entries if match_any(filter, basename(e.filename))]
+
+        # Group the files by solid block, in the order blocks are stored.
+        blocks = collections.OrderedDict()
+        if self._7z.header.main_streams is not None:
+            for folder in self._7z.header.main_streams.unpackinfo.folders:
+                blocks[folder] = []
+        for entry in entries:
+            if entry.emptystream:
+                yield abspath(entry.filename), io.BytesIO()
+            else:
+                blocks[entry.folder].append(entry)
+
+        for block_entries in blocks.values():
+            if not block_entries:
+                continue
+            block_entries.sort(key=lambda e: e.id)
+            with self._lock:
+                contents = self._extract([e.filename for e in block_entries])
+            for entry in block_entries:
+                _path = abspath(entry.filename)
+                yield _path, iocursor.Cursor(contents[relpath(_path)])
+
+    def _read_folder(self, entry):
+        """Decompress the solid block containing the given entry.
+
+        If the solid block fits in the cache, all its files are extracted
+        in a single pass, otherwise only the requested file is extracted.
+
+        Returns:
+            dict: a mapping of relative paths to decompressed contents.
+
+        """
+        folder = entry.folder
+        if self._cacheable(folder):
+            return self._extract([f.filename for f in folder.files])
+        return self._extract([entry.filename])
+
+    def _extract(self, targets):
+        """Extract the given members in a single pass over the archive.
+
+        Returns:
+            dict: a mapping of relative paths to decompressed contents.
+
+        """
+        # The parsed archive is shared by all readers: only the decompression
+        # state needs to be reset before extracting other members.
+        try:
+            with key_cache(self._key_cache):
+                self._7z.reset()
+                decompressed = self._7z.read(targets)
         except py7zr.exceptions.PasswordRequired as exc:
             raise errors.PermissionDenied(msg="7z archive is password protected", exc=exc)
         except lzma.LZMAError as exc:
             raise errors.OperationFailed(exc=exc)
-        finally:
-            if _7z is not None:
-                _7z.close()
 
-        return iocursor.Cursor(decompressed[relpath(_path)].getbuffer())
+        return {name:buffer.getbuffer() for name, buffer in decompressed.items()}
+
+    def _cacheable(self, folder):
+        return folder.solid and folder.get_unpack_size() <= self._cache_size
+
+    def _evict(self):
+        """Evict the least recently used solid blocks exceeding the cache size.
+        """
+        cached = sum(folder.get_unpack_size() for folder in self._cache)
+        while cached > self._cache_size:
+            folder, _ = self._cache.popitem(last=False)
+            cached -= folder.get_unpack_size()
+
+    def _extract_open(self, paths):
+        return self.openbins(paths)
+
+    def close(self):  # noqa: D102
+        if not self.isclosed():
+            self._cache.clear()
+            if self._7z is not None:
+                self._7z.close()
+                self._7z = None
+            super(SevenZipReadFS, self).close()
 
     def isdir(self, path):
         if path in '/':
@@ -235,10 +410,41 @@ class SevenZipSaver(base.ArchiveSaver):
                 archive contents. **[default: None]**
             encrypt_header (`bool`): Whether or not to encrypt the archive
                 header, which contains the file list. **[default: False]**
+            key_cache (`dict`): A mapping in which to cache the AES keys
+                derived from the password, which can be shared with a
+                `SevenZipReadFS`. **[default: a new cache]**
+            solid_size (`int`): The maximum number of uncompressed bytes
+                to store in a single solid block, or `None` for no limit.
+                Files larger than this are stored in their own block.
+                **[default: None]**
+            solid_files (`int`): The maximum number of files to store in
+                a single solid block, or `None` for no limit.
+                **[default: None]**
+            solid_by_directory (`bool`): Whether or not to store the files
+                of each directory in a separate solid block.
+                **[default: False]**
+            workers (`int`): The number of threads to use to compress
+                solid blocks concurrently. **[default: None]**
+
+        Smaller solid blocks usually compress less efficiently, but can be
+        compressed in parallel, and make reading a single file from the
+        archive cheaper, since a file can only be decompressed along with
+        the files preceding it in its solid block.
+
+        Note:
+            Archives are written in a single solid block with the `py7zr`
+            writer when no ``solid_*`` option splits them and no
+            ``workers`` are used, or with versions of `py7zr` other than
+            the ones supported for splitting blocks (``>=0.17.3,<0.21``).
 
         """
         self._password = options.get("password")
         self._encrypt_header = options.get("encrypt_header", False)
+        self._key_cache = options.get("key_cache", {})
+        self._solid_size = options.get("solid_size")
+        self._solid_files = options.get("solid_files")
+        self._solid_by_directory = options.get("solid_by_directory", False)
+        self._workers = options.get("workers")
         super(SevenZipSaver, self).__init__(output, overwrite, initial_position)
 
     @staticmethod
@@ -274,23 +480,144 @@ class SevenZipSaver(base.ArchiveSaver):
 
         return file_info
 
+    def _split_blocks(self, entries):
+        """Split the files to compress into solid blocks.
+
+        Returns:
+            list: a list of solid blocks, each block being a list of
+            ``(file_info, info)`` tuples, in archive order.
+
+        """
+        blocks = []
+        size = parent = None
+        for file_info, info in entries:
+            if file_info["emptystream"]:
+                continue
+            if not blocks \
+                    or (self._solid_files and len(blocks[-1]) >= self._solid_files) \
+                    or (self._solid_size and size + info.size > self._solid_size) \
+                    or (self._solid_by_directory and dirname(file_info["filename"]) != parent):
+                blocks.append([])
+                size = 0
+            blocks[-1].append((file_info, info))
+            size += info.size
+            parent = dirname(file_info["filename"])
+        return blocks
+
+    @staticmethod
+    def _compress_block(folder, block):
+        """Compress a solid block in a temporary file.
+
+        Returns:
+            tuple: the temporary file, a list of ``(insize, outsize, crc)``
+            tuples for each file of the block, and the size of the data
+            written when flushing the compressor.
+
+        """
+        output = tempfile.SpooledTemporaryFile(max_size=1 << 24)
+        compressor = folder.get_compressor()
+        sizes = []
+        for file_info, _ in block:
+            with file_info["origin"].open() as src:
+                sizes.append(compressor.compress(src, output))
+        flushed = compressor.flush(output)
+        return output, sizes, flushed
+
+    def _compress_blocks(self, header, blocks):
+        """Compress the solid blocks, yielding them in order.
+
+        Folders are created in the calling thread, since they derive the
+        encryption key, and compressed concurrently in a thread pool when
+        the saver uses several workers.
+        """
+        executor = None
+        if futures is not None and self._workers is not None and self._workers > 1:
+            executor = futures.ThreadPoolExecutor(self._workers)
+        try:
+            pending = collections.deque()
+            for block in blocks:
+                folder = Folder()
+                folder.password = header.password
+                folder.prepare_coderinfo(header.filters)
+                if executor is None:
+                    yield (folder,) + self._compress_block(folder, block)
+                    continue
+                pending.append((folder, executor.submit(self._compress_block, folder, block)))
+                while len(pending) > self._workers:
+                    folder, future = pending.popleft()
+                    yield (folder,) + future.result()
+            while pending:
+                folder, future = pending.popleft()
+                yield (folder,) + future.result()
+        finally:
+            if executor is not None:
+                executor.shutdown()
+
     def _to(self, handle, fs):  # noqa: D102
-        with py7zr.SevenZipFile(
+        entries = []
+        for parent, dirs, files in fs.walk("/", search='breadth', namespaces=["details", "access"]):
+            for resource in itertools.chain(dirs, files):
+                path = join(parent, resource.name)
+                entries.append((self._make_file_info(fs, path, resource), resource))
+
+        # Store directories and empty files first, so that the files of each
+        # folder are contiguous in the header, as `py7zr` expects them to be.
+        entries.sort(key=lambda entry: not entry[0]["emptystream"])
+        blocks = self._split_blocks(entries)
+
+        with key_cache(self._key_cache), py7zr.SevenZipFile(
                 handle,
                 mode="w",
                 password=self._password,
                 header_encryption=self._encrypt_header
         ) as _7z:
-            _7z.header.initialize()
-            for parent, dirs, files in fs.walk("/", search='breadth', namespaces=["details", "access"]):
-                for resource in itertools.chain(dirs, files):
-                    path = join(parent, resource.name)
-                    file_info = self._make_file_info(fs, path, resource)
-                    _7z.header.files_info.files.append(file_info)
-                    _7z.header.files_info.emptyfiles.append(file_info["emptystream"])
-                    _7z.files.append(file_info)
-                    folder = _7z.header.main_streams.unpackinfo.folders[-1]
+            header = _7z.header
+            header.initialize()
+            for file_info, _ in entries:
+                header.files_info.files.append(file_info)
+                header.files_info.emptyfiles.append(file_info["emptystream"])
+                _7z.files.append(file_info)
+            if not blocks:
+                return
+            elif len(blocks) == 1 and not (self._workers and self._workers > 1) \
+                    or not _SOLID_BLOCKS:
+                # write the files directly, in a single solid folder
+                folder = header.main_streams.unpackinfo.folders[-1]
+                for _ in entries:
                     _7z.worker.archive(_7z.fp, _7z.files, folder, deref=_7z.dereference)
+                return
+
+            # Replace the single solid folder created by `py7zr` with the
+            # folders compressed for each block, and mark the header as
+            # uninitialized so that `py7zr` does not flush the folder again.
+            streams = header.main_streams
+            streams.unpackinfo.folders = []
+            streams.unpackinfo.numfolders = 0
+            streams.substreamsinfo.num_unpackstreams_folders = []
+            header._initialized = False
+
+            compressed = self._compress_blocks(header, blocks)
+            for block, (folder, output, sizes, flushed) in zip(blocks, compressed):
+                with output:
+                    output.seek(0)
+                    shutil.copyfileobj(output, _7z.fp)
+                compressor = folder.get_compressor()
+                for (file_info, _), (insize, outsize, crc) in zip(block, sizes):
+                    file_info["maxsize"] = outsize
+                    file_info["digest"] = crc
+                    streams.substreamsinfo.unpacksizes.append(insize)
+                    streams.substreamsinfo.digests.append(crc)
+                    streams.substreamsinfo.digestsdefined.append(True)
+                block[-1][0]["maxsize"] += flushed
+                streams.substreamsinfo.num_unpackstreams_folders.append(len(block))
+                streams.unpackinfo.folders.append(folder)
+                streams.unpackinfo.numfolders += 1
+                streams.packinfo.numstreams += 1
+                if streams.packinfo.enable_digests:
+                    streams.packinfo.crcs.append(compressor.digest)
+                    streams.packinfo.digestdefined.append(True)
+                streams.packinfo.packsizes.append(compressor.packsize)
+                folder.unpacksizes = compressor.unpacksizes
 
 
 class SevenZipFS(base.ArchiveFS):
@@ -299,3 +626,29 @@ class SevenZipFS(base.ArchiveFS):
 
     _read_fs_cls = SevenZipReadFS
     _saver_cls = SevenZipSaver
+
+    def __init__(self, handle, **options):  # noqa: D102, D107
+        """Create a new 7z archive filesystem.
+
+        Parameters:
+            handle (io.IOBase or str): A filename or a stream storing an
+                archive and/or in which to write the updated archive.
+            proxy (FS): The filesystem to use as to perform temporary
+                write operations. Leave to `None` to use the default
+                defined in `~fs.archive.wrap.WrapWritable`.
+                **[default: `~fs.memoryfs.MemoryFS`]**
+
+        Keyword Arguments:
+            close_handle (boolean): If `True`, close the handle
+                when the filesystem is closed. **[default: True]**
+            password (str): The password to use for decrypting and
+                encrypting the archive contents. **[default: None]**
+            encrypt_header (bool): Whether or not to encrypt the archive
+                header when saving it. **[default: False]**
+
+        The AES keys derived from the password while reading the archive
+        are cached, and reused when the updated archive is encrypted.
+
+        """
+        options.setdefault('key_cache', {})
+        super(SevenZipFS, self).__init__(handle, **options)
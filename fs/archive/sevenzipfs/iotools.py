@@ -0,0 +1,225 @@
+# coding: utf-8
+"""Streaming readers over the members of a 7z archive.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import io
+import tempfile
+import threading
+import zlib
+
+from py7zr.compressor import SevenZipDecompressor
+from py7zr.exceptions import CrcError
+
+from ...enums import Seek
+from . import keys
+
+
+class _PackedStream(object):
+    """A file-like view over the packed streams of a folder.
+
+    Each read seeks the shared archive handle to the current position of
+    the view, so that several views can be used concurrently.
+    """
+
+    def __init__(self, handle, offset, lock):
+        self._handle = handle
+        self._offset = offset
+        self._lock = lock
+
+    def read(self, size=-1):
+        with self._lock:
+            self._handle.seek(self._offset)
+            data = self._handle.read(size)
+        self._offset += len(data)
+        return data
+
+
+class SevenZipStreamReader(io.RawIOBase):
+    """A read-only file decompressing a 7z member incrementally.
+
+    The member is decompressed with its own decoder chain, as the caller
+    reads it, instead of being extracted in memory at once. As long as
+    the member is read forward, decompressed data is returned directly.
+    The first time the reader is seeked backwards, the member is
+    decompressed again from its start into a
+    `~tempfile.SpooledTemporaryFile`, so that further backward seeks do
+    not require decompressing the member again, while no more than
+    ``spill_size`` bytes are ever kept in memory.
+    """
+
+    chunk_size = io.DEFAULT_BUFFER_SIZE * 8
+
+    def __init__(self, handle, archive, entry, lock=None, spill_size=1 << 24,
+                 key_cache=None):
+        """Create a new streaming reader.
+
+        Parameters:
+            handle (`io.IOBase`): the readable and seekable handle storing
+                the archive.
+            archive (`py7zr.SevenZipFile`): the parsed archive.
+            entry (`py7zr.py7zr.ArchiveFile`): the member to read.
+            lock (`threading.RLock`): a lock to acquire when accessing
+                ``handle``, if it is shared with other readers.
+                **[default: None]**
+            spill_size (`int`): the maximum number of decompressed bytes
+                to keep in memory before spilling to a temporary file.
+                **[default: 16 MiB]**
+            key_cache (`dict`): the cache of derived AES keys to use,
+                see `~fs.archive.sevenzipfs.keys.key_cache`.
+                **[default: None]**
+
+        """
+        super(SevenZipStreamReader, self).__init__()
+        self._handle = handle
+        self._archive = archive
+        self._entry = entry
+        self._lock = lock or threading.RLock()
+        self._key_cache = {} if key_cache is None else key_cache
+        self._spill_size = spill_size
+
+        self._filename = entry.filename
+        self._size = entry.uncompressed
+        self._crc = entry.crc32
+        self._spool = None
+        self._position = 0
+        self._start()
+
+    def _start(self):
+        """Start decompressing the folder of the member from its start.
+        """
+        folder = self._entry.folder
+        streams = self._archive.header.main_streams
+        index = streams.unpackinfo.folders.index(folder)
+        positions = streams.packinfo.packpositions
+        packsize = positions[index + 1] - positions[index]
+
+        with keys.key_cache(self._key_cache):
+            self._decompressor = SevenZipDecompressor(
+                folder.coders, packsize, folder.unpacksizes, folder.crc, folder.password)
+        self._packed = _PackedStream(
+            self._handle, self._archive.afterheader + positions[index], self._lock)
+
+        # Files of a solid folder are stored one after the other: the files
+        # preceding the entry have to be decompressed (and discarded) first.
+        self._skip = 0
+        for f in folder.files:
+            if f.filename == self._entry.filename:
+                break
+            self._skip += f.uncompressed
+
+        self._digest = 0
+        self._decompressed = 0
+        self._stalled = False
+
+    def _decompress(self, size):
+        """Decompress at most ``size`` bytes of the folder.
+        """
+        data = self._decompressor.decompress(self._packed, size)
+        # The decoders may need several chunks of packed data before
+        # producing any output, but not once the packed data is exhausted.
+        exhausted = self._decompressor.consumed >= self._decompressor.input_size
+        if not data and exhausted:
+            if self._stalled:
+                raise EOFError("unexpected end of 7z folder")
+            self._stalled = True
+        return data
+
+    def _next(self, size):
+        """Decompress at most ``size`` of the next bytes of the member.
+        """
+        while self._skip > 0:
+            self._skip -= len(self._decompress(min(self._skip, self.chunk_size)))
+
+        size = min(self._size - self._decompressed, size, self.chunk_size)
+        data = self._decompress(size) if size > 0 else b''
+        self._digest = zlib.crc32(data, self._digest) & 0xffffffff
+        self._decompressed += len(data)
+
+        if self._decompressed == self._size and self._crc is not None:
+            if self._digest != self._crc:
+                raise CrcError(self._crc, self._digest, self._filename)
+            self._crc = None
+        return data
+
+    def _fill(self, position):
+        """Decompress the member to the spool until ``position`` is available.
+        """
+        self._spool.seek(0, Seek.end)
+        while self._decompressed < min(position, self._size):
+            self._spool.write(self._next(position - self._decompressed))
+
+    def readable(self):  # noqa: D102
+        return True
+
+    def seekable(self):  # noqa: D102
+        return True
+
+    def writable(self):  # noqa: D102
+        return False
+
+    def tell(self):  # noqa: D102
+        return self._position
+
+    def seek(self, offset, whence=Seek.set):  # noqa: D102
+        if whence == Seek.set:
+            if offset < 0:
+                raise ValueError("Negative seek position {}".format(offset))
+            self._position = offset
+        elif whence == Seek.current:
+            self._position = max(self._position + offset, 0)
+        elif whence == Seek.end:
+            if offset > 0:
+                raise ValueError("Positive seek position {}".format(offset))
+            self._position = max(self._size + offset, 0)
+        else:
+            raise ValueError(
+                "Invalid whence ({}, should be {}, {} or {})".format(
+                    whence, Seek.set, Seek.current, Seek.end
+                )
+            )
+        return self._position
+
+    def read(self, size=-1):  # noqa: D102
+        end = self._size
+        if size is not None and size >= 0:
+            end = min(end, self._position + size)
+        if end <= self._position:
+            return b''
+
+        if self._spool is None and self._position < self._decompressed:
+            # the data before the current position was not kept
+            self._spool = tempfile.SpooledTemporaryFile(max_size=self._spill_size)
+            self._start()
+
+        if self._spool is None:
+            # skip the data before the current position, and return the
+            # following data as it is decompressed
+            while self._decompressed < self._position:
+                self._next(self._position - self._decompressed)
+            chunks = []
+            while self._decompressed < end:
+                chunks.append(self._next(end - self._decompressed))
+            data = b''.join(chunks)
+        else:
+            self._fill(end)
+            self._spool.seek(self._position)
+            data = self._spool.read(end - self._position)
+
+        self._position += len(data)
+        return data
+
+    def readinto(self, b):  # noqa: D102
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def readall(self):  # noqa: D102
+        return self.read()
+
+    def close(self):  # noqa: D102
+        if not self.closed:
+            if self._spool is not None:
+                self._spool.close()
+            super(SevenZipStreamReader, self).close()
@@ -0,0 +1,62 @@
+# coding: utf-8
+"""Caching of the AES keys derived from 7z archive passwords.
+
+The 7z AES coder derives its key by hashing the password and salt with
+SHA-256 for ``2**cycles`` rounds (usually ``2**19``), which `py7zr` does
+again every time a coder is created, i.e. for every folder decompressed
+or compressed. The derivation function of `py7zr.compressor` is wrapped
+so that, within a `key_cache` context, derived keys are looked up in a
+cache owned by the caller instead of being computed again.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import contextlib
+import threading
+
+import py7zr.compressor
+
+
+__all__ = ['key_cache']
+
+
+_local = threading.local()
+_install_lock = threading.Lock()
+_calculate_key = py7zr.compressor.calculate_key
+
+
+def _cached_calculate_key(password, cycles, salt, digest):
+    cache = getattr(_local, 'cache', None)
+    if cache is None:
+        return _calculate_key(password, cycles, salt, digest)
+    params = (bytes(password), cycles, bytes(salt), digest)
+    key = cache.get(params)
+    if key is None:
+        key = cache[params] = _calculate_key(password, cycles, salt, digest)
+    return key
+
+
+def _install():
+    with _install_lock:
+        if py7zr.compressor.calculate_key is not _cached_calculate_key:
+            py7zr.compressor.calculate_key = _cached_calculate_key
+
+
+@contextlib.contextmanager
+def key_cache(cache):
+    """Use the given cache for the keys derived in the current thread.
+
+    Arguments:
+        cache (dict): a mapping storing derived keys, indexed by the
+            password, number of cycles, salt and digest they were derived
+            from. It can be shared between several readers and savers of
+            the same archive.
+
+    """
+    _install()
+    previous = getattr(_local, 'cache', None)
+    _local.cache = cache
+    try:
+        yield cache
+    finally:
+        _local.cache = previous
@@ -7,6 +7,7 @@ from __future__ import unicode_literals
 import io
 import sys
 import time
+import array
 import tarfile
 import datetime
 
@@ -16,17 +17,24 @@ from ... import errors
 from ...info import Info
 from ...mode import Mode
 from ...time import datetime_to_epoch
-from ...path import basename, relpath, splitext, isbase, parts, frombase, normpath
+from ...path import basename, relpath, splitext, normpath
 from ...enums import ResourceType
 from ...permissions import Permissions
 
 from .. import base
-from .._utils import unique
+from .. import _index
+from .. import _table
 
 from .iotools import RawWrapper
 from .tarfile2 import TarFile
 
 
+def _data_size(size):
+    # the size of the data blocks storing a member of ``size`` bytes
+    blocks, remainder = divmod(size, tarfile.BLOCKSIZE)
+    return (blocks + (remainder > 0)) * tarfile.BLOCKSIZE
+
+
 class TarReadFS(base.ArchiveReadFS):
     """A read-only filesystem within a TAR archive.
     """
@@ -62,9 +70,13 @@ class TarReadFS(base.ArchiveReadFS):
     if six.PY2:
         def _decode(self, string):
             return string.decode(self._encoding)
+        def _encode(self, string):
+            return string.encode(self._encoding)
     else:
         def _decode(self, string):
             return string
+        def _encode(self, string):
+            return string
 
     def __init__(self, handle, **options):  # noqa: D102, D107
         """Create a new TAR reader filesystem.
@@ -79,58 +91,168 @@ class TarReadFS(base.ArchiveReadFS):
             encoding (`str`): The encoding to use for reading the TAR
                 file. When `None` given, use `sys.getdefaultencoding`
                 to detect the system encoding. **[default: None]**
+            index (`bool` or `str`): If ``True``, store the member headers
+                in a sidecar index next to the archive (``<archive>.fsindex``)
+                the first time it is opened, and load them from the index
+                afterwards instead of scanning the whole archive. A path
+                can be given instead to store the index elsewhere. The
+                index is rebuilt whenever the archive changes.
+                **[default: False]**
+            checkpoint_interval (`int`): If given, and the archive is
+                compressed as a single gzip member, record a snapshot of the decompressor
+                state every ``checkpoint_interval`` decompressed bytes, so
+                that members can be opened and seeked without decompressing
+                the archive from its start. **[default: None]**
+            workers (`int`): The number of threads to use to decompress
+                the blocks of multi-block ``gz`` and ``xz`` archives
+                concurrently.
+                **[default: None]**
 
         """
         super(TarReadFS, self).__init__(handle, **options)
-        if isinstance(handle, io.IOBase):
-            self._tar = TarFile.open(fileobj=handle, mode='r')
-        else:
-            self._tar = TarFile.open(handle, mode='r')
 
         self._encoding = encoding = options.get('encoding') or \
             sys.getdefaultencoding().replace('ascii', 'utf-8')
 
-        self._members = {
-            normpath(self._decode(info.name)): info
-                for info in self._tar.getmembers()
+        index = options.get('index', False)
+        index_file = _index.index_path(self._handle, index) if index else None
+        index_key = _index.archive_key(self._handle) if index_file else None
+
+        self._compression = compression = self._sniff_compression(self._handle)
+        checkpoint_interval = options.get('checkpoint_interval')
+        workers = options.get('workers')
+        if compression == 'gz' and (checkpoint_interval or workers):
+            self._tar = TarFile.open(
+                fileobj=self._handle, mode='r:gz', workers=workers,
+                checkpoint_interval=checkpoint_interval)
+        elif workers and compression == 'xz':
+            self._tar = TarFile.open(fileobj=self._handle, mode='r:xz', workers=workers)
+        elif isinstance(handle, io.IOBase):
+            self._tar = TarFile.open(fileobj=handle, mode='r')
+        else:
+            self._tar = TarFile.open(handle, mode='r')
+
+        columns = None
+        self._sparse = {}
+        if index_file is not None:
+            columns = _index.load_index(index_file, 'tar', index_key)
+        if columns is None:
+            members = self._tar.getmembers()
+            columns = self._dump_members(members)
+            # sparse members keep their `TarInfo`, which stores the map
+            # of their data blocks (only set on sparse members in Python 2)
+            self._sparse = {
+                row: m for row, m in enumerate(members)
+                if getattr(m, 'sparse', None)
+            }
+            if index_file is not None and not self._sparse:
+                _index.save_index(index_file, 'tar', index_key, columns)
+
+        # Only the metadata of the members is kept, in columns, from which
+        # `TarInfo` objects are built when a member is actually needed.
+        self._tar.members = []
+        self._tar._loaded = True
+        self._columns = columns
+        self._table = self._get_table(columns)
+
+    _MAGIC_MAP = [
+        (b'\x1f\x8b', 'gz'),
+        (b'\xfd7zXZ\x00', 'xz'),
+        (b'BZh', 'bz2'),
+    ]
+
+    @classmethod
+    def _sniff_compression(cls, handle):
+        position = handle.tell()
+        try:
+            header = handle.read(6)
+        finally:
+            handle.seek(position)
+        return next((c for m, c in cls._MAGIC_MAP if header.startswith(m)), None)
+
+    _INDEX_INTS = (
+        'offset', 'offset_data', 'size', 'mode', 'uid', 'gid',
+        'devmajor', 'devminor', 'chksum',
+    )
+    _INDEX_STRINGS = ('name', 'linkname', 'uname', 'gname')
+
+    def _dump_members(self, members):
+        columns = {
+            attr: array.array(_index.INT64, (getattr(m, attr) for m in members))
+            for attr in self._INDEX_INTS
         }
+        columns['mtime'] = array.array(str('d'), (m.mtime for m in members))
+        columns['type'] = array.array(str('B'), (ord(m.type) for m in members))
+        for attr in self._INDEX_STRINGS:
+            strings = (self._decode(getattr(m, attr)) for m in members)
+            blob, offsets = _index.pack_strings(strings, self._encoding)
+            columns['{}_data'.format(attr)] = blob
+            columns['{}_offsets'.format(attr)] = offsets
+        return columns
+
+    def _load_member(self, row):
+        if row in self._sparse:
+            return self._sparse[row]
+        columns = self._columns
+        info = tarfile.TarInfo()
+        for attr in self._INDEX_INTS:
+            setattr(info, attr, columns[attr][row])
+        for attr in self._INDEX_STRINGS:
+            string = _index.unpack_string(
+                columns['{}_data'.format(attr)],
+                columns['{}_offsets'.format(attr)],
+                row, self._encoding)
+            setattr(info, attr, self._encode(string))
+        mtime = columns['mtime'][row]
+        info.mtime = int(mtime) if mtime.is_integer() else mtime
+        info.type = six.int2byte(columns['type'][row])
+        return info
+
+    def _get_table(self, columns):
+        table = _table.MemberTable()
+        names = _index.unpack_strings(
+            columns['name_data'], columns['name_offsets'], self._encoding)
+        dirtype = ord(tarfile.DIRTYPE)
+        for row, name in enumerate(names):
+            table.add(normpath(name), row, columns['type'][row] == dirtype)
+        table.freeze()
+        return table
+
+    def _get_row(self, path):
+        node = self._table.lookup(path)
+        return -1 if node is None else self._table.row(node)
 
     def exists(self, path):  # noqa: D102
-        _path = self.validatepath(path)
-        return any(isbase(_path, f) for f in self._members)
+        return self._table.lookup(self.validatepath(path)) is not None
 
     def isdir(self, path):  # noqa: D102
-        _path = relpath(self.validatepath(path))
-        try:
-            return self._members[_path].isdir()
-        except KeyError:
-            return any(isbase(_path, f) for f in self._members)
+        node = self._table.lookup(self.validatepath(path))
+        return node is not None and self._table.isdir(node)
 
     def isfile(self, path):  # noqa: D102
-        _path = relpath(self.validatepath(path))
-        try:
-            return self._members[_path].isfile()
-        except KeyError:
-            return False
+        row = self._get_row(self.validatepath(path))
+        return row >= 0 and six.int2byte(self._columns['type'][row]) in tarfile.REGULAR_TYPES
 
     def listdir(self, path):  # noqa: D102
-        _path = relpath(self.validatepath(path))
-        if self.gettype(_path) is not ResourceType.directory:
+        _path = self.validatepath(path)
+        node = self._table.lookup(_path)
+        if node is None:
+            raise errors.ResourceNotFound(path)
+        if not self._table.isdir(node):
             raise errors.DirectoryExpected(path)
-        children = (frombase(_path, n) for n in self._members if isbase(_path, n))
-        return list(unique(parts(child)[1] for child in children if relpath(child)))
+        return [self._table.name(child) for child in self._table.children(node)]
 
     def getinfo(self, path, namespaces=None):  # noqa: D102
         namespaces = namespaces or ()
         _path = relpath(self.validatepath(path))
 
-        try:
-            _inferred = False
-            tar_info = self._members[_path]
-        except KeyError:
+        row = self._get_row(_path)
+        _inferred = row < 0
+        if not _inferred:
+            tar_info = self._load_member(row)
+        else:
             if not self.isdir(_path):
                 raise errors.ResourceNotFound(path)
-            _inferred = True
             tar_info = tarfile.TarInfo(_path)
             tar_info.type = tarfile.DIRTYPE
 
@@ -158,7 +280,7 @@ class TarReadFS(base.ArchiveReadFS):
             }
 
         if not _inferred and 'tar' in namespaces:
-            info['tar'] = tar_info.get_info(self._encoding) \
+            info['tar'] = tar_info.get_info(self._encoding, self._tar.errors) \
                           if six.PY2 else tar_info.get_info()
             info['tar'].update({
                 k.replace('is', 'is_'):getattr(tar_info, k)()
@@ -177,11 +299,17 @@ class TarReadFS(base.ArchiveReadFS):
         if self.gettype(path) is not ResourceType.file:
             raise errors.FileExpected(path)
 
-        bin_file = self._tar.extractfile(self._members[_path])
+        bin_file = self._tar.extractfile(self._load_member(self._get_row(_path)))
         if six.PY2: bin_file.flush = lambda: None
 
         return RawWrapper(bin_file)
 
+    def _extract_order(self, paths):
+        # Follow the location of the members in the archive, so that a
+        # compressed archive is decompressed in a single pass.
+        offsets = self._columns['offset']
+        return sorted(paths, key=lambda path: offsets[self._get_row(path)])
+
 
 class TarSaver(base.ArchiveSaver):
     """A TAR archive serializer.
@@ -192,6 +320,8 @@ class TarSaver(base.ArchiveSaver):
         '.gz': 'gz', '.tgz':'gz', '.bz2': 'bz2', '.tbz':'bz2',
     }
 
+    _block_compressions = {'gz', 'xz'}
+
     if six.PY2:
         def _encode(self, string):
             return string.encode(self.encoding)
@@ -214,73 +344,181 @@ class TarSaver(base.ArchiveSaver):
         Keyword Arguments:
             encoding (`str`): The encoding to use for the TAR archive.
                 **[default: utf-8]**
-            compression (`int`): The compression algorithm to use, or
-                an empty string to write the TAR file uncompressed.
+            compression (`str`): The compression algorithm to use, or
+                an empty string to write the TAR file uncompressed. When
+                not given, it is inferred from the output file extension.
                 **[default: '']**
             buffer_size (`int`): The buffer size to use.
                 **[default: io.DEFAULT_BUFFER_SIZE]**
+            block_size (`int`): If given, split the compressed stream in
+                independent blocks of ``block_size`` uncompressed bytes,
+                which can be compressed in parallel and allow random
+                access when reading the archive. Only supported with
+                ``gz`` and ``xz`` compression. **[default: None]**
+            workers (`int`): The number of threads to use to compress
+                independent blocks concurrently. **[default: None]**
+            update (`str`): Use ``'append'`` to write the new files after
+                the last member of an existing uncompressed archive file,
+                when files were only added to it, instead of writing the
+                whole archive again to a temporary file.
+                **[default: None]**
 
         """
-        super(TarSaver, self).__init__(output, overwrite, initial_position)
+        super(TarSaver, self).__init__(
+            output, overwrite, initial_position, **options)
         self.encoding = options.pop('encoding', 'utf-8')
 
         self.compression = options.pop('compression', '')
 
-        if not self.compression and hasattr(output, 'name'):
-            if isinstance(output.name, six.binary_type):
-                name = output.name.decode(sys.getfilesystemencoding())
-            else:
-                name = output.name
+        name = output if isinstance(output, six.string_types) \
+               else getattr(output, 'name', None)
+        if not self.compression and name is not None:
+            if isinstance(name, six.binary_type):
+                name = name.decode(sys.getfilesystemencoding())
             _, extension = splitext(name)
             self.compression = self._compression_map.get(extension, '')
 
         self.buffer_size = options.pop('buffer_size', io.DEFAULT_BUFFER_SIZE)
+        self.block_size = options.pop('block_size', None)
+        self.workers = options.pop('workers', None)
 
-    def _to(self, handle, fs):  # noqa: D102
-        attr_map = {
-            'uid': 'uid', 'gid': 'gid', 'uname': 'user', 'gname': 'group'}
-        type_map = {
-            v:k for k,v in TarReadFS._TYPE_MAP.items()}
+    _attr_map = {
+        'uid': 'uid', 'gid': 'gid', 'uname': 'user', 'gname': 'group'}
+    _type_map = {
+        v:k for k,v in TarReadFS._TYPE_MAP.items()}
 
+    def _to(self, handle, fs):  # noqa: D102
         mode = 'w:{}'.format(self.compression or '')
+        kwargs = {}
+        if self.block_size is not None and self.compression in self._block_compressions:
+            kwargs.update(block_size=self.block_size, workers=self.workers)
+
         if isinstance(handle, io.IOBase):
-            _tar = TarFile.open(fileobj=handle, mode=mode)
+            _tar = TarFile.open(fileobj=handle, mode=mode, **kwargs)
         else:
-            _tar = TarFile.open(handle, mode=mode)
+            _tar = TarFile.open(handle, mode=mode, **kwargs)
+
+        # Files left untouched in a `TarFS` are copied from the original
+        # archive once every other entry has been written.
+        overlay = self._get_overlay(fs)
+        if overlay is not None and not isinstance(overlay._rfs, TarReadFS):
+            overlay = None
+        unchanged = []
 
         current_time = time.time()
 
         with _tar:
             for path, info in fs.walk.info(namespaces=('details', 'access', 'stat')):
 
-                tar_info = tarfile.TarInfo(self._encode(relpath(path)))
-
-                if info.has_namespace('stat'):
-                    mtime = info.get('stat', 'st_mtime', current_time)
+                if overlay is not None and not info.is_dir \
+                        and self._copyable(overlay, path):
+                    unchanged.append(path)
                 else:
-                    mtime = info.modified or current_time
+                    self._write_entry(_tar, fs, path, info, current_time)
+
+            if unchanged:
+                self._copy_members(_tar, overlay._rfs, unchanged)
+
+    def _append(self, fs, source_fs, added):  # noqa: D102
+        # Only an uncompressed archive can be extended in place.
+        if self.compression or not isinstance(source_fs, TarReadFS):
+            return False
+        if source_fs._compression is not None or source_fs._sparse:
+            return False
+        offsets = source_fs._columns['offset']
+        if not len(offsets):
+            return False
 
-                if isinstance(mtime, datetime.datetime):
-                    mtime = datetime_to_epoch(mtime)
-                if isinstance(mtime, float):
-                    mtime = int(mtime)
-                tar_info.mtime = mtime
+        # New members overwrite the end-of-archive blocks, which follow
+        # the data of the last member.
+        last = max(six.moves.range(len(offsets)), key=offsets.__getitem__)
+        tar_info = source_fs._load_member(last)
+        end = tar_info.offset_data
+        if tar_info.isreg() or tar_info.type not in tarfile.SUPPORTED_TYPES:
+            end += _data_size(tar_info.size)
 
-                if info.has_namespace('access'):
-                    for tarattr, infoattr in attr_map.items():
-                        if getattr(info, infoattr) is not None:
-                            setattr(tar_info, tarattr, getattr(info, infoattr))
-                    tar_info.mode = getattr(info.permissions, 'mode', 0o420)
+        # The original members are left untouched, so the archive can
+        # still be written again from them if appending fails.
+        current_time = time.time()
+        try:
+            with open(self.output, 'r+b') as handle:
+                handle.seek(end)
+                with TarFile.open(fileobj=handle, mode='w:') as _tar:
+                    for path in added:
+                        info = fs.getinfo(path, namespaces=('details', 'access', 'stat'))
+                        self._write_entry(_tar, fs, path, info, current_time)
+                handle.truncate()
+        except Exception:
+            return False
+        return True
 
+    def _write_entry(self, _tar, fs, path, info, current_time):
+        tar_info = tarfile.TarInfo(self._encode(relpath(path)))
 
-                tar_info.size = info.size
-                tar_info.type = type_map.get(info.type, tarfile.REGTYPE)
+        if info.has_namespace('stat'):
+            mtime = info.get('stat', 'st_mtime', current_time)
+        else:
+            mtime = info.modified or current_time
 
-                if not info.is_dir:
-                    with fs.openbin(path) as bin_file:
-                        _tar.addfile(tar_info, bin_file)
-                else:
-                    _tar.addfile(tar_info)
+        if isinstance(mtime, datetime.datetime):
+            mtime = datetime_to_epoch(mtime)
+        if isinstance(mtime, float):
+            mtime = int(mtime)
+        tar_info.mtime = mtime
+
+        if info.has_namespace('access'):
+            for tarattr, infoattr in self._attr_map.items():
+                if getattr(info, infoattr) is not None:
+                    setattr(tar_info, tarattr, getattr(info, infoattr))
+            tar_info.mode = getattr(info.permissions, 'mode', 0o420)
+
+
+        tar_info.size = info.size
+        tar_info.type = self._type_map.get(info.type, tarfile.REGTYPE)
+
+        if not info.is_dir:
+            with fs.openbin(path) as bin_file:
+                _tar.addfile(tar_info, bin_file)
+        else:
+            _tar.addfile(tar_info)
+
+    @staticmethod
+    def _copyable(overlay, path):
+        # sparse members are stored with a map of their data blocks that
+        # is not kept by the reader, so they are written again instead
+        if not overlay._unchanged(path):
+            return False
+        source_fs = overlay._rfs
+        return source_fs._get_row(path) not in source_fs._sparse
+
+    def _copy_members(self, _tar, source_fs, paths):
+        # Members are read in the order they are stored in, so that a
+        # compressed source archive is decompressed in a single pass. If
+        # neither archive is compressed, the header and data blocks of
+        # each member are copied verbatim.
+        raw = not self.compression and source_fs._compression is None
+        handle = source_fs._handle
+        for path in source_fs._extract_order(paths):
+            tar_info = source_fs._load_member(source_fs._get_row(path))
+            if not raw:
+                bin_file = source_fs._tar.extractfile(tar_info)
+                try:
+                    _tar.addfile(tar_info, bin_file)
+                finally:
+                    bin_file.close()
+                continue
+            end = tar_info.offset_data + _data_size(tar_info.size)
+            position = tar_info.offset
+            while position < end:
+                with source_fs._lock:
+                    handle.seek(position)
+                    chunk = handle.read(min(end - position, self.buffer_size))
+                if not chunk:
+                    raise tarfile.ReadError("unexpected end of data")
+                _tar.fileobj.write(chunk)
+                position += len(chunk)
+            _tar.offset += end - tar_info.offset
+            _tar.members.append(tar_info)
 
 
 class TarFS(base.ArchiveFS):
@@ -305,11 +543,17 @@ class TarFS(base.ArchiveFS):
             close_handle (boolean): If `True`, close the handle
                 when the filesystem is closed. **[default: True]**
             compression (str): The compression algorithm to use.
-                **[default: 'gz']**
+                **[default: inferred from the archive extension]**
             encoding (str): The encoding to use for the TAR archive.
                 **[default: 'utf-8']**
+            block_size (int): The number of uncompressed bytes to store
+                in each independent block of a compressed archive, see
+                `TarSaver`. **[default: None]**
+            workers (int): The number of threads to use to compress and
+                decompress independent blocks. **[default: None]**
+            update (str): How to update the archive file in place instead
+                of writing it again, see `TarSaver`. **[default: None]**
 
         """
-        options.setdefault('compression', 'gz')
         options.setdefault('encoding', 'utf-8')
         super(TarFS, self).__init__(handle, **options)
@@ -0,0 +1,525 @@
+# coding: utf-8
+"""Compressed streams made of independently compressed blocks.
+
+Splitting a compressed stream into blocks that can be decompressed on
+their own allows compressing and decompressing blocks in parallel, and
+reading any part of the decompressed stream by only decompressing the
+blocks overlapping with the requested range.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import bisect
+import collections
+import io
+import struct
+import threading
+import zlib
+
+import six
+
+from ...enums import Seek
+from .._utils import import_from_names
+
+futures = import_from_names('concurrent.futures')
+lzma = import_from_names('lzma', 'backports.lzma')
+
+
+__all__ = [
+    'Block',
+    'BlockReader',
+    'BlockWriter',
+    'gz_blocks',
+    'gz_compress',
+    'gz_decompress',
+    'xz_blocks',
+    'xz_compress',
+    'xz_decompress',
+]
+
+
+#: A compressed block, located in both the compressed and decompressed
+#: streams, with additional format-specific information in ``info``.
+Block = collections.namedtuple(
+    'Block', ['offset', 'compressed_size', 'position', 'size', 'info'])
+
+
+def _executor(workers):
+    if futures is None or workers is None or workers <= 1:
+        return None
+    return futures.ThreadPoolExecutor(workers)
+
+
+class BlockWriter(io.RawIOBase):
+    """A write-only file compressing its contents in independent blocks.
+
+    Incoming data is split in blocks of ``block_size`` bytes, which are
+    compressed concurrently by a thread pool when ``workers`` is greater
+    than one, and written in order to the underlying handle.
+    """
+
+    def __init__(self, handle, compress, block_size, workers=None, close_handle=False):
+        """Create a new block writer.
+
+        Parameters:
+            handle (`io.IOBase`): the writable handle where to write the
+                compressed blocks.
+            compress (callable): a function compressing a block of data
+                into a self-contained compressed stream.
+            block_size (`int`): the number of uncompressed bytes per block.
+            workers (`int`): the number of threads to use to compress
+                blocks concurrently. **[default: None]**
+            close_handle (`bool`): whether to close ``handle`` when the
+                writer is closed. **[default: False]**
+
+        """
+        super(BlockWriter, self).__init__()
+        self._handle = handle
+        self._compress = compress
+        self._block_size = block_size
+        self._close_handle = close_handle
+        self._buffer = bytearray()
+        self._executor = _executor(workers)
+        self._pending = collections.deque()
+        self._max_pending = 2 * (workers or 1)
+        self._position = 0
+
+    def _submit(self, block):
+        if self._executor is None:
+            self._handle.write(self._compress(block))
+            return
+        self._pending.append(self._executor.submit(self._compress, block))
+        while len(self._pending) > self._max_pending:
+            self._handle.write(self._pending.popleft().result())
+
+    def writable(self):  # noqa: D102
+        return True
+
+    def tell(self):  # noqa: D102
+        return self._position
+
+    def write(self, data):  # noqa: D102
+        self._buffer.extend(data)
+        self._position += len(data)
+        while len(self._buffer) >= self._block_size:
+            self._submit(bytes(self._buffer[:self._block_size]))
+            del self._buffer[:self._block_size]
+        return len(data)
+
+    def flush(self):  # noqa: D102
+        if not self.closed:
+            self._handle.flush()
+
+    def close(self):  # noqa: D102
+        if self.closed:
+            return
+        try:
+            if self._buffer or not self._position:
+                self._submit(bytes(self._buffer))
+                del self._buffer[:]
+            while self._pending:
+                self._handle.write(self._pending.popleft().result())
+            self._handle.flush()
+        finally:
+            if self._executor is not None:
+                self._executor.shutdown()
+            super(BlockWriter, self).close()
+            if self._close_handle:
+                self._handle.close()
+
+
+class BlockReader(io.RawIOBase):
+    """A read-only, seekable file over a stream of independent blocks.
+
+    Only the blocks overlapping with a read are decompressed. Decompressed
+    blocks are kept in a cache of at most ``cache_size`` bytes (but always
+    at least one block), and when ``workers`` is greater than one, reading
+    a block schedules the decompression of the following blocks in a
+    thread pool so that sequential reads are decompressed in parallel.
+    """
+
+    def __init__(self, handle, blocks, decompress, workers=None,
+                 cache_size=1 << 26, lock=None, close_handle=False):
+        """Create a new block reader.
+
+        Parameters:
+            handle (`io.IOBase`): the readable and seekable handle storing
+                the compressed blocks.
+            blocks (`list` of `Block`): the blocks of the stream, sorted in
+                stream order.
+            decompress (callable): a function decompressing a single
+                block, called with the `Block` and its compressed bytes.
+            workers (`int`): the number of threads to use to decompress
+                blocks concurrently. **[default: None]**
+            cache_size (`int`): the maximum number of decompressed bytes
+                to keep in memory. **[default: 64 MiB]**
+            lock (`threading.RLock`): a lock to acquire when accessing
+                ``handle``, if it is shared with other readers.
+                **[default: None]**
+            close_handle (`bool`): whether to close ``handle`` when the
+                reader is closed. **[default: False]**
+
+        """
+        super(BlockReader, self).__init__()
+        self._handle = handle
+        self._blocks = blocks
+        self._positions = [block.position for block in blocks]
+        self._decompress = decompress
+        self._workers = workers or 1
+        self._executor = _executor(workers)
+        self._cache = collections.OrderedDict()
+        self._cache_size = cache_size
+        self._lock = lock or threading.RLock()
+        self._close_handle = close_handle
+        self._position = 0
+        last = blocks[-1] if blocks else Block(0, 0, 0, 0, None)
+        self._size = last.position + last.size
+
+    def _read_block(self, index):
+        block = self._blocks[index]
+        with self._lock:
+            self._handle.seek(block.offset)
+            return self._handle.read(block.compressed_size)
+
+    def _schedule(self, index):
+        if index not in self._cache:
+            block, data = self._blocks[index], self._read_block(index)
+            if self._executor is None:
+                self._cache[index] = self._decompress(block, data)
+            else:
+                self._cache[index] = self._executor.submit(
+                    self._decompress, block, data)
+
+    def _get_block(self, index):
+        self._schedule(index)
+        if self._executor is not None:
+            end = min(index + self._workers, len(self._blocks))
+            for following in six.moves.range(index + 1, end):
+                self._schedule(following)
+
+        data = self._cache.pop(index)
+        if not isinstance(data, bytes):
+            data = data.result()
+        self._cache[index] = data
+
+        # Evict the least recently used blocks, keeping the current one.
+        cached = sum(self._blocks[i].size for i in self._cache)
+        while cached > self._cache_size and len(self._cache) > 1:
+            evicted, _ = self._cache.popitem(last=False)
+            cached -= self._blocks[evicted].size
+        return data
+
+    def readable(self):  # noqa: D102
+        return True
+
+    def seekable(self):  # noqa: D102
+        return True
+
+    def writable(self):  # noqa: D102
+        return False
+
+    def tell(self):  # noqa: D102
+        return self._position
+
+    def seek(self, offset, whence=Seek.set):  # noqa: D102
+        if whence == Seek.set:
+            if offset < 0:
+                raise ValueError("Negative seek position {}".format(offset))
+            self._position = offset
+        elif whence == Seek.current:
+            self._position = max(self._position + offset, 0)
+        elif whence == Seek.end:
+            if offset > 0:
+                raise ValueError("Positive seek position {}".format(offset))
+            self._position = max(self._size + offset, 0)
+        else:
+            raise ValueError(
+                "Invalid whence ({}, should be {}, {} or {})".format(
+                    whence, Seek.set, Seek.current, Seek.end
+                )
+            )
+        return self._position
+
+    def read(self, size=-1):  # noqa: D102
+        end = self._size
+        if size is not None and size >= 0:
+            end = min(end, self._position + size)
+        chunks = []
+        while self._position < end:
+            index = bisect.bisect_right(self._positions, self._position) - 1
+            block = self._blocks[index]
+            data = self._get_block(index)
+            start = self._position - block.position
+            chunk = data[start:end - block.position]
+            if not chunk:
+                break
+            chunks.append(chunk)
+            self._position += len(chunk)
+        return b''.join(chunks)
+
+    def readinto(self, b):  # noqa: D102
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def readall(self):  # noqa: D102
+        return self.read()
+
+    def close(self):  # noqa: D102
+        if self.closed:
+            return
+        try:
+            if self._executor is not None:
+                self._executor.shutdown()
+            self._cache.clear()
+            if self._close_handle:
+                self._handle.close()
+        finally:
+            super(BlockReader, self).close()
+
+
+# --- XZ ---------------------------------------------------------------------
+
+_XZ_HEADER_MAGIC = b'\xfd7zXZ\x00'
+_XZ_FOOTER_MAGIC = b'YZ'
+_XZ_FOOTER = struct.Struct('<IIH2s')
+
+
+def _crc32(data):
+    return zlib.crc32(data) & 0xffffffff
+
+
+def _encode_mbi(value):
+    """Encode an integer in the XZ variable-length integer format.
+    """
+    data = bytearray()
+    while value >= 0x80:
+        data.append((value & 0x7f) | 0x80)
+        value >>= 7
+    data.append(value)
+    return bytes(data)
+
+
+def _decode_mbi(data, position):
+    """Decode an XZ variable-length integer, returning it with the new position.
+    """
+    value = shift = 0
+    while True:
+        byte = six.indexbytes(data, position)
+        value |= (byte & 0x7f) << shift
+        position += 1
+        shift += 7
+        if not byte & 0x80:
+            return value, position
+        if shift >= 63:
+            raise ValueError("invalid variable-length integer")
+
+
+def _xz_index(records):
+    index = bytearray(b'\x00')
+    index.extend(_encode_mbi(len(records)))
+    for unpadded_size, size in records:
+        index.extend(_encode_mbi(unpadded_size))
+        index.extend(_encode_mbi(size))
+    index.extend(b'\x00' * (-len(index) % 4))
+    index.extend(struct.pack('<I', _crc32(bytes(index))))
+    return bytes(index)
+
+
+def _xz_stream_blocks(handle, end):
+    """Parse the index of the XZ stream ending at ``end``.
+
+    Returns:
+        tuple: the offset where the stream starts, its stream flags, and a
+        list of ``(offset, unpadded_size, size)`` tuples for its blocks.
+
+    """
+    handle.seek(end - _XZ_FOOTER.size)
+    crc, backward_size, flags, magic = _XZ_FOOTER.unpack(handle.read(_XZ_FOOTER.size))
+    if magic != _XZ_FOOTER_MAGIC or crc != _crc32(struct.pack('<IH', backward_size, flags)):
+        raise ValueError("invalid stream footer")
+
+    index_size = (backward_size + 1) * 4
+    index_start = end - _XZ_FOOTER.size - index_size
+    handle.seek(index_start)
+    index = handle.read(index_size)
+    if len(index) != index_size or index[:1] != b'\x00':
+        raise ValueError("invalid stream index")
+
+    records = []
+    count, position = _decode_mbi(index, 1)
+    for _ in six.moves.range(count):
+        unpadded_size, position = _decode_mbi(index, position)
+        size, position = _decode_mbi(index, position)
+        records.append((unpadded_size, size))
+
+    blocks_size = sum(u + (-u % 4) for u, _ in records)
+    start = index_start - blocks_size - 12
+    handle.seek(start)
+    header = handle.read(12)
+    if header[:6] != _XZ_HEADER_MAGIC or header[6:8] != struct.pack('<H', flags):
+        raise ValueError("invalid stream header")
+
+    blocks, offset = [], start + 12
+    for unpadded_size, size in records:
+        blocks.append((offset, unpadded_size, size))
+        offset += unpadded_size + (-unpadded_size % 4)
+    return start, flags, blocks
+
+
+def xz_blocks(handle):
+    """Get the blocks of an XZ file, possibly made of several streams.
+
+    Each block is described with a `Block` storing the stream flags and
+    the unpadded size of the block, which are needed by `xz_decompress`.
+
+    Returns:
+        list: the list of blocks in the file, or `None` if ``handle`` does
+        not contain a valid XZ file.
+
+    """
+    position = handle.tell()
+    try:
+        handle.seek(0, Seek.end)
+        end = handle.tell()
+        handle.seek(position)
+        if handle.read(len(_XZ_HEADER_MAGIC)) != _XZ_HEADER_MAGIC:
+            return None
+
+        streams = []
+        while end > position:
+            # Skip the stream padding, made of 4-byte groups of null bytes
+            handle.seek(end - 4)
+            if handle.read(4) == b'\x00' * 4:
+                end -= 4
+                continue
+            start, flags, records = _xz_stream_blocks(handle, end)
+            streams.append((flags, records))
+            end = start
+
+        blocks, uncompressed = [], 0
+        for flags, records in reversed(streams):
+            for offset, unpadded_size, size in records:
+                padded_size = unpadded_size + (-unpadded_size % 4)
+                info = (flags, unpadded_size)
+                blocks.append(Block(offset, padded_size, uncompressed, size, info))
+                uncompressed += size
+        return blocks
+    except (ValueError, IndexError, struct.error, IOError, OSError):
+        return None
+    finally:
+        handle.seek(position)
+
+
+def xz_compress(data, preset=None):
+    """Compress a block of data into a single-block XZ stream.
+    """
+    return lzma.compress(data, format=lzma.FORMAT_XZ, preset=preset)
+
+
+def xz_decompress(block, data):
+    """Decompress a block described by a `Block` returned by `xz_blocks`.
+
+    Since `lzma` can only decode XZ blocks within a stream, the block is
+    wrapped into a single-block stream with a minimal header, index and
+    footer before being decompressed.
+    """
+    flags, unpadded_size = block.info
+    raw_flags = struct.pack('<H', flags)
+    header = _XZ_HEADER_MAGIC + raw_flags + struct.pack('<I', _crc32(raw_flags))
+    index = _xz_index([(unpadded_size, block.size)])
+    footer = struct.pack('<IH', len(index) // 4 - 1, flags)
+    footer = struct.pack('<I', _crc32(footer)) + footer + _XZ_FOOTER_MAGIC
+    decompressor = lzma.LZMADecompressor(lzma.FORMAT_XZ)
+    return decompressor.decompress(header + data + index + footer)
+
+
+# --- Gzip -------------------------------------------------------------------
+
+_GZ_MAGIC = b'\x1f\x8b\x08'
+_GZ_FEXTRA = 0x04
+_GZ_HEADER = struct.Struct('<3sB6xH')
+_GZ_SUBFIELD = struct.Struct('<2sH')
+_GZ_FA = struct.Struct('<II')           # compressed and uncompressed size
+_GZ_BC = struct.Struct('<H')            # BGZF compressed size, minus one
+_GZ_TRAILER = struct.Struct('<II')      # CRC32 and uncompressed size
+
+
+def _gz_member_sizes(extra):
+    """Get the sizes of a gzip member from its extra field, if recorded.
+    """
+    position = 0
+    while position + _GZ_SUBFIELD.size <= len(extra):
+        tag, length = _GZ_SUBFIELD.unpack_from(extra, position)
+        position += _GZ_SUBFIELD.size
+        if tag == b'FA' and length == _GZ_FA.size:
+            return _GZ_FA.unpack_from(extra, position)
+        if tag == b'BC' and length == _GZ_BC.size:
+            return _GZ_BC.unpack_from(extra, position)[0] + 1, None
+        position += length
+    return None
+
+
+def gz_blocks(handle):
+    """Get the blocks of a gzip file made of independent members.
+
+    Members must record their compressed size in their extra field,
+    either in a ``FA`` subfield (as written by `gz_compress`) or in the
+    ``BC`` subfield used by BGZF files, so that the member boundaries can
+    be found without decompressing the file.
+
+    Returns:
+        list: the list of blocks in the file, or `None` if ``handle`` does
+        not contain a gzip file made of indexed members.
+
+    """
+    position = offset = handle.tell()
+    try:
+        blocks, uncompressed = [], 0
+        while True:
+            handle.seek(offset)
+            header = handle.read(_GZ_HEADER.size)
+            if not header and offset > position:
+                return blocks
+            magic, flags, xlen = _GZ_HEADER.unpack(header)
+            if magic != _GZ_MAGIC or not flags & _GZ_FEXTRA:
+                return None
+            sizes = _gz_member_sizes(handle.read(xlen))
+            if sizes is None:
+                return None
+            compressed_size, size = sizes
+            if size is None:
+                handle.seek(offset + compressed_size - _GZ_TRAILER.size)
+                _, size = _GZ_TRAILER.unpack(handle.read(_GZ_TRAILER.size))
+            if size:
+                blocks.append(Block(offset, compressed_size, uncompressed, size, None))
+            uncompressed += size
+            offset += compressed_size
+    except (struct.error, IOError, OSError):
+        return None
+    finally:
+        handle.seek(position)
+
+
+def gz_compress(data, compresslevel=9):
+    """Compress a block of data into a gzip member indexed by `gz_blocks`.
+    """
+    compressor = zlib.compressobj(compresslevel, zlib.DEFLATED, -zlib.MAX_WBITS)
+    deflated = compressor.compress(data) + compressor.flush()
+    extra = _GZ_SUBFIELD.pack(b'FA', _GZ_FA.size)
+    header_size = _GZ_HEADER.size + len(extra) + _GZ_FA.size
+    member_size = header_size + len(deflated) + _GZ_TRAILER.size
+    return b''.join([
+        _GZ_MAGIC,
+        struct.pack('<BIBBH', _GZ_FEXTRA, 0, 0, 255, len(extra) + _GZ_FA.size),
+        extra,
+        _GZ_FA.pack(member_size, len(data)),
+        deflated,
+        _GZ_TRAILER.pack(_crc32(data), len(data) & 0xffffffff),
+    ])
+
+
+def gz_decompress(block, data):
+    """Decompress a block described by a `Block` returned by `gz_blocks`.
+    """
+    return zlib.decompress(data, zlib.MAX_WBITS | 16)
@@ -4,10 +4,13 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import functools
 import six
 import tarfile
 
+from .._inflate import CheckpointReader
 from .._utils import import_from_names
+from . import blocks
 
 lzma = import_from_names('lzma', 'backports.lzma')
 
@@ -20,18 +23,139 @@ class TarFile(tarfile.TarFile):  # noqa: D101
         "bz2": "bz2open",
     }
 
-    if six.PY3:
+    if six.PY3 or lzma is not None:
         OPEN_METH["xz"] = "xzopen"
 
-    elif lzma is not None:
-        OPEN_METH["xz"] = "xzopen"
+    @classmethod
+    def _blockopen(cls, name, mode, stream, **kwargs):
+        try:
+            t = cls.taropen(name, mode, stream, **kwargs)
+        except:
+            stream.close()
+            raise
+        t._extfileobj = False
+        return t
+
+    @classmethod
+    def gzopen(cls, name, mode="r", fileobj=None, compresslevel=9,
+               block_size=None, workers=None, checkpoint_interval=None, **kwargs):
+        """Open gzip compressed tar archive name for reading or writing.
+
+        Gzip files made of several members recording their compressed size
+        (such as the ones written with a ``block_size`` given here, or BGZF
+        files) are read with a `~fs.archive.tarfs.blocks.BlockReader`, so
+        that only the members overlapping with a tar member need to be
+        decompressed.
+
+        Arguments:
+            block_size (`int`, optional): When writing, the number of
+                uncompressed bytes to store in each independent gzip
+                member. Use `None` to write a single member.
+                **[default: None]**
+            workers (`int`, optional): The number of threads to use to
+                compress or decompress independent members concurrently.
+                **[default: None]**
+            checkpoint_interval (`int`, optional): When reading an archive
+                made of a single member, the number of decompressed bytes
+                between two checkpoints of a
+                `~fs.archive._inflate.CheckpointReader`. Use `None` to
+                read the archive sequentially. **[default: None]**
+
+        Attention:
+            Appending is not allowed.
+
+        """
+        if mode == "r":
+            handle = fileobj if fileobj is not None else open(name, "rb")
+            gz_blocks = blocks.gz_blocks(handle)
+            if gz_blocks is not None and len(gz_blocks) > 1:
+                stream = blocks.BlockReader(
+                    handle, gz_blocks, blocks.gz_decompress, workers=workers,
+                    close_handle=fileobj is None)
+                return cls._blockopen(name, mode, stream, **kwargs)
+            elif checkpoint_interval:
+                stream = CheckpointReader(
+                    handle, handle.tell(), interval=checkpoint_interval,
+                    close_handle=fileobj is None)
+                return cls._blockopen(name, mode, stream, **kwargs)
+            elif fileobj is None:
+                handle.close()
+
+        elif block_size is not None:
+            if mode not in ("w", "x"):
+                raise ValueError("mode must be 'r', 'w' or 'x'")
+            if not 0 < block_size < 1 << 32:
+                raise ValueError("block_size must be between 1 and 2**32 - 1")
+            handle = fileobj if fileobj is not None else open(name, mode + "b")
+            compress = functools.partial(
+                blocks.gz_compress, compresslevel=compresslevel)
+            stream = blocks.BlockWriter(
+                handle, compress, block_size, workers=workers,
+                close_handle=fileobj is None)
+            return cls._blockopen(name, mode, stream, **kwargs)
+
+        return super(TarFile, cls).gzopen(
+            name, mode, fileobj, compresslevel, **kwargs)
+
+    @classmethod
+    def xzopen(cls, name, mode="r", fileobj=None, preset=None,
+               block_size=None, workers=None, **kwargs):
+        """Open lzma compressed tar archive name for reading or writing.
+
+        XZ files made of several blocks (such as the ones written by
+        ``xz --block-size`` or with a ``block_size`` given here) are
+        read with a `~fs.archive.tarfs.blocks.BlockReader`, so that only
+        the blocks overlapping with a member need to be decompressed.
+
+        Arguments:
+            block_size (`int`, optional): When writing, the number of
+                uncompressed bytes to store in each independent block. Use
+                `None` to write a single block. **[default: None]**
+            workers (`int`, optional): The number of threads to use to
+                compress or decompress independent blocks concurrently.
+                **[default: None]**
+
+        Attention:
+            Appending is not allowed.
+
+        """
+        if lzma is None:
+            raise tarfile.CompressionError("lzma module is not available")
+
+        if mode == "r":
+            handle = fileobj if fileobj is not None else open(name, "rb")
+            xz_blocks = blocks.xz_blocks(handle)
+            if xz_blocks is not None and len(xz_blocks) > 1:
+                stream = blocks.BlockReader(
+                    handle, xz_blocks, blocks.xz_decompress, workers=workers,
+                    close_handle=fileobj is None)
+                return cls._blockopen(name, mode, stream, **kwargs)
+            elif fileobj is None:
+                handle.close()
+
+        elif block_size is not None:
+            if mode not in ("w", "x"):
+                raise ValueError("mode must be 'r', 'w' or 'x'")
+            handle = fileobj if fileobj is not None else open(name, mode + "b")
+            compress = functools.partial(blocks.xz_compress, preset=preset)
+            stream = blocks.BlockWriter(
+                handle, compress, block_size, workers=workers,
+                close_handle=fileobj is None)
+            return cls._blockopen(name, mode, stream, **kwargs)
+
+        return cls._lzmaopen(name, mode, fileobj, preset, **kwargs)
+
+    if six.PY3:
 
         @classmethod
-        def xzopen(cls, name, mode="r", fileobj=None, preset=None, **kwargs):
-            """Open lzma compressed tar archive name for reading or writing.
+        def _lzmaopen(cls, name, mode="r", fileobj=None, preset=None, **kwargs):
+            return super(TarFile, cls).xzopen(name, mode, fileobj, preset, **kwargs)
 
-            Attention:
-                Appending is not allowed.
+    else:
+
+        @classmethod
+        def _lzmaopen(cls, name, mode="r", fileobj=None, preset=None, **kwargs):
+            """Open lzma compressed tar archive name for reading or writing.
 
             Note:
                Backported from `Python 3.6
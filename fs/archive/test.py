@@ -251,6 +251,37 @@ class ArchiveReadTestCases(object):
             archive_files
         )
 
+    def _check_extracted(self, dst_fs, paths):
+        for path in paths:
+            self.assertEqual(dst_fs.getbytes(path), self.fs.getbytes(path))
+
+    def test_extract(self):
+        """Check that `ArchiveReadFS.extract` extracts the whole archive.
+        """
+        for workers in (None, 4):
+            with open_fs('mem://') as dst_fs:
+                self.fs.extract(dst_fs, workers=workers)
+                self.assertEqual(
+                    sorted(walk.walk_files(dst_fs)),
+                    sorted(walk.walk_files(self.fs)))
+                self.assertEqual(
+                    sorted(walk.walk_dirs(dst_fs)),
+                    sorted(walk.walk_dirs(self.fs)))
+                self._check_extracted(dst_fs, walk.walk_files(self.fs))
+
+    def test_extract_paths(self):
+        """Check that `ArchiveReadFS.extract` only extracts the given paths.
+        """
+        with open_fs('mem://') as dst_fs:
+            self.fs.extract(dst_fs, ['top.txt', 'foo'], workers=2)
+            self.assertEqual(
+                sorted(walk.walk_files(dst_fs)),
+                ['/foo/bar/egg', '/top.txt'])
+            self.assertTrue(dst_fs.isdir('foo/bar/baz'))
+            self._check_extracted(dst_fs, walk.walk_files(dst_fs))
+            with self.assertRaises(errors.ResourceNotFound):
+                self.fs.extract(dst_fs, ['nothere.txt'])
+
     def test_implied_dir(self):
         """Check that implied directories are accessible from archives.
         """
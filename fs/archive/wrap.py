@@ -16,6 +16,7 @@ from ..mode import Mode
 from ..opener import open_fs
 from ..wrapfs import WrapFS
 
+from ._journal import Journal
 from ._utils import unique, UniversalContainer, NoWrapMeta
 
 
@@ -32,6 +33,11 @@ class WrapWritable(WrapFS):
     the `NoWrapMeta` metaclass, the wrapper will use the base `FS`
     implementation of the non-essential methods instead of using the
     `WrapFS` implementation.
+
+    Every change is recorded in a `~fs.archive._journal.Journal`, so
+    that an unmodified filesystem does not need to be saved, and that
+    savers can find which files of the delegate filesystem were left
+    untouched, renamed, or only had their metadata changed.
     """
 
     def __init__(self, delegate_fs, writable_fs="mem://"):  # noqa: D107
@@ -39,6 +45,11 @@ class WrapWritable(WrapFS):
         self._rfs = delegate_fs
         self._wfs = open_fs(writable_fs)
         self._removed = set()
+        self._journal = Journal(self._rfs.exists)
+
+    @property
+    def _dirty(self):
+        return bool(self._journal)
 
     def appendbytes(self, path, data):  # noqa: D102
         _path = self.validatepath(path)
@@ -54,6 +65,7 @@ class WrapWritable(WrapFS):
                 _copy_file_rich(self._rfs, _path, self._wfs)
         if _path in self._removed:
             self._removed.remove(_path)
+        self._journal.write(_path)
         return self._wfs.appendbytes(_path, data)
 
     # def appendtext(self, path, text):
@@ -72,6 +84,43 @@ class WrapWritable(WrapFS):
     #         self._removed.remove(_path)
     #     return self._wfs.appendtext(_path, text)
 
+    def _unchanged(self, path):
+        """Check whether a file is still the one of the delegate filesystem.
+        """
+        _path = self.validatepath(path)
+        return self._journal.change(_path) is None and self._rfs.isfile(_path)
+
+    def _source(self, path):
+        """Get the file of the delegate filesystem with the same contents.
+
+        Returns:
+            `str`: the path of the file of the delegate filesystem storing
+            the contents of the file at ``path``, or `None` if they were
+            modified or if ``path`` is not a file of the delegate filesystem.
+
+        """
+        source = self._journal.source(self.validatepath(path))
+        if source is not None and self._rfs.isfile(source):
+            return source
+        return None
+
+    def _added(self):
+        """Get the paths created since the delegate filesystem was wrapped.
+
+        Returns:
+            `list`: the paths of the files and directories that do not
+            exist in the delegate filesystem, parents first, or `None`
+            if a resource of the delegate filesystem was also modified
+            or removed.
+
+        """
+        journal = self._journal
+        if journal.modified() or journal.metadata() or journal.renamed():
+            return None
+        if journal.removed():
+            return None
+        return journal.added()
+
     def close(self):  # noqa: D102
         if not self.isclosed():
             self._wfs.close()
@@ -120,6 +169,8 @@ class WrapWritable(WrapFS):
             raise errors.ResourceNotFound(dirname(path))
         elif self.isfile(dirname(_path)):
             raise errors.DirectoryExpected(dirname(path))
+        else:
+            self._journal.write(_path)
 
         if _path in self._removed:
             self._removed.remove(_path)
@@ -128,6 +179,17 @@ class WrapWritable(WrapFS):
         self._wfs.makedirs(dirname(_path), recreate=True)
         return self._wfs.makedir(_path, permissions, recreate)
 
+    def move(self, src_path, dst_path, overwrite=False, preserve_time=False):  # noqa: D102
+        _src_path = self.validatepath(src_path)
+        _dst_path = self.validatepath(dst_path)
+        with self._lock:
+            source = self._source(_src_path)
+            # `preserve_time` is only accepted since fs 2.4.15
+            options = {'preserve_time': True} if preserve_time else {}
+            FS.move(self, src_path, dst_path, overwrite, **options)
+            if source is not None:
+                self._journal.rename(_dst_path, source)
+
     def openbin(self, path, mode='r', buffering=-1, **options):  # noqa: D102
         _path = self.validatepath(path)
         _mode = Mode(mode)
@@ -139,15 +201,19 @@ class WrapWritable(WrapFS):
             if _mode.create:
                 if _path in self._removed:
                     self._removed.remove(_path)
+                self._journal.write(_path)
                 self._wfs.makedirs(dirname(_path), recreate=True)
                 return self._wfs.openbin(path, mode, buffering, **options)
             else:
                 raise ResourceNotFound(path)
         elif self._wfs.exists(_path):
+            if _mode.writing:
+                self._journal.write(_path)
             return self._wfs.openbin(path, mode, buffering, **options)
         elif not _mode.writing:
             return self._rfs.openbin(path, mode, buffering, **options)
         else:
+            self._journal.write(_path)
             self._wfs.makedirs(dirname(_path), recreate=True)
             _copy_file_rich(self._rfs, _path, self._wfs)
             return self._wfs.openbin(path, mode, buffering, **options)
@@ -157,6 +223,7 @@ class WrapWritable(WrapFS):
         if not self.getinfo(path).is_file:
             raise errors.FileExpected(path)
         self._removed.add(_path)
+        self._journal.remove(_path)
         if self._wfs.isfile(_path):
             self._wfs.remove(_path)
 
@@ -165,6 +232,7 @@ class WrapWritable(WrapFS):
         if not self.isempty(_path):
             raise errors.DirectoryNotEmpty(path)
         self._removed.add(_path)
+        self._journal.remove(_path)
         if self._wfs.isdir(_path):
             self._wfs.removedir(_path)
 
@@ -195,6 +263,7 @@ class WrapWritable(WrapFS):
         _path = self.validatepath(path)
         if not self.exists(_path):
             raise errors.ResourceNotFound(path)
+        self._journal.setinfo(_path)
         if self._rfs.exists(_path):
             self._wfs.makedirs(dirname(_path), recreate=True)
             _copy_file_rich(self._rfs, _path, self._wfs, _path)
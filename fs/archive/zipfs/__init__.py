@@ -5,10 +5,14 @@ from __future__ import absolute_import
 from __future__ import unicode_literals
 
 import io
+import os
 import sys
+import mmap
 import six
 import time
+import array
 import shutil
+import struct
 import zipfile
 import datetime
 
@@ -16,13 +20,120 @@ from ... import errors
 from ...info import Info
 from ...mode import Mode
 from ...time import datetime_to_epoch
-from ...path import forcedir, relpath, dirname, basename, abspath
-from ...path import iteratepath, recursepath, frombase, join, isbase
+from ...path import abspath, forcedir, relpath, basename, normpath
+from ...path import join
 from ...enums import ResourceType, Seek
 from ...iotools import RawWrapper
 from ..._fscompat import fsdecode, fsencode
 
 from .. import base
+from .. import _index
+from .. import _table
+from .iotools import MemoryReader, PositionalReader
+from .iotools import data_offset, open_member, pread_fileno
+
+
+def _dos_date_time(date_time):
+    year, month, day, hour, minute, second = date_time
+    return (
+        (year - 1980) << 25 | month << 21 | day << 16
+        | hour << 11 | minute << 5 | second // 2
+    )
+
+
+def _dos_date_time_tuple(value):
+    return (
+        (value >> 25) + 1980, (value >> 21) & 0xF, (value >> 16) & 0x1F,
+        (value >> 11) & 0x1F, (value >> 5) & 0x3F, (value & 0x1F) * 2,
+    )
+
+
+def _zip_filename(orig_filename):
+    # Get the name of a member the way `zipfile.ZipInfo.__init__` builds
+    # its `filename` from the name stored in the archive.
+    null_byte = orig_filename.find('\x00')
+    if null_byte >= 0:
+        orig_filename = orig_filename[:null_byte]
+    if os.sep != '/' and os.sep in orig_filename:
+        orig_filename = orig_filename.replace(os.sep, '/')
+    return orig_filename
+
+
+_CENTRAL_DIRECTORY = struct.Struct('<4s4B4HL2L5H2L')
+_END_RECORD = struct.Struct('<4s4H2LH')
+_END_RECORD64 = struct.Struct('<4sQ2H2L4Q')
+_END_LOCATOR64 = struct.Struct('<4sLQL')
+
+
+def _encode_filename(zip_info):
+    # Encode a member name like `zipfile.ZipInfo` does, in ASCII when
+    # possible, or in UTF-8 with the flag bit 11 set.
+    filename, flag_bits = zip_info.filename, zip_info.flag_bits
+    if isinstance(filename, six.text_type):
+        try:
+            filename = filename.encode('ascii')
+        except UnicodeEncodeError:
+            filename, flag_bits = filename.encode('utf-8'), flag_bits | 0x800
+    return filename, flag_bits
+
+
+def _write_central_directory(handle, infolist):
+    # Write the central directory of the given members at the current
+    # position of ``handle``, followed by the end of central directory
+    # records, with their ZIP64 variants when needed.
+    start = handle.tell()
+    for zip_info in infolist:
+        zip64 = []
+        file_size, compress_size = zip_info.file_size, zip_info.compress_size
+        if max(file_size, compress_size) > zipfile.ZIP64_LIMIT:
+            zip64.extend((file_size, compress_size))
+            file_size = compress_size = 0xFFFFFFFF
+        header_offset = zip_info.header_offset
+        if header_offset > zipfile.ZIP64_LIMIT:
+            zip64.append(header_offset)
+            header_offset = 0xFFFFFFFF
+        extra = _strip_zip64_extra(zip_info.extra)
+        extract_version = zip_info.extract_version
+        if zip64:
+            extra = struct.pack(
+                '<HH{}Q'.format(len(zip64)), 1, 8 * len(zip64), *zip64) + extra
+            extract_version = max(extract_version, 45)
+        filename, flag_bits = _encode_filename(zip_info)
+        date_time = _dos_date_time(zip_info.date_time)
+        handle.write(_CENTRAL_DIRECTORY.pack(
+            b'PK\x01\x02', max(zip_info.create_version, extract_version),
+            zip_info.create_system, extract_version, zip_info.reserved,
+            flag_bits, zip_info.compress_type, date_time & 0xFFFF,
+            date_time >> 16, zip_info.CRC, compress_size, file_size,
+            len(filename), len(extra), len(zip_info.comment), 0,
+            zip_info.internal_attr, zip_info.external_attr, header_offset))
+        handle.write(filename)
+        handle.write(extra)
+        handle.write(zip_info.comment)
+
+    end = handle.tell()
+    count, size, offset = len(infolist), end - start, start
+    if count > 0xFFFF or size > zipfile.ZIP64_LIMIT or offset > zipfile.ZIP64_LIMIT:
+        handle.write(_END_RECORD64.pack(
+            b'PK\x06\x06', 44, 45, 45, 0, 0, count, count, size, offset))
+        handle.write(_END_LOCATOR64.pack(b'PK\x06\x07', 0, end, 1))
+        count = min(count, 0xFFFF)
+        size, offset = min(size, 0xFFFFFFFF), min(offset, 0xFFFFFFFF)
+    handle.write(_END_RECORD.pack(
+        b'PK\x05\x06', 0, 0, count, count, size, offset, 0))
+
+
+def _strip_zip64_extra(extra):
+    # Remove the ZIP64 extended information from an extra field, since
+    # `zipfile.ZipInfo.FileHeader` adds its own when needed.
+    stripped, position = [], 0
+    while position + 4 <= len(extra):
+        header_id, size = struct.unpack('<HH', extra[position:position+4])
+        end = position + 4 + size
+        if header_id != 1:
+            stripped.append(extra[position:end])
+        position = end
+    return b''.join(stripped)
 
 
 class _ZipFileWrapper(RawWrapper):
@@ -67,37 +178,136 @@ class ZipReadFS(base.ArchiveReadFS):
             encoding (`str`): The encoding to use for reading the ZIP
                 file. When `None` given, use `sys.getdefaultencoding`
                 to detect the system encoding. **[default: None]**
+            checkpoint_interval (`int`): If given, record a snapshot of
+                the decompressor state every ``checkpoint_interval``
+                decompressed bytes of a deflated file, so that it can be
+                seeked without decompressing it from its start again.
+                CRCs are not checked for files opened this way.
+                **[default: None]**
+            max_checkpoints (`int`): The maximum number of snapshots to
+                keep for each opened file: the interval between snapshots
+                is doubled when it is exceeded. **[default: 64]**
+            index (`bool` or `str`): If ``True``, store the central
+                directory in a sidecar index next to the archive
+                (``<archive>.fsindex``) the first time it is opened, and
+                load it from the index afterwards instead of parsing it
+                again. A path can be given instead to store the index
+                elsewhere. The index is rebuilt whenever the archive
+                changes. **[default: False]**
 
         """
+        # set before parsing the archive, which can fail, since `close`
+        # is also called on a reader that failed to open
+        self._mmap = None
         super(ZipReadFS, self).__init__(handle, **options)
 
-        try:
-            self._zip = zipfile.ZipFile(self._handle)
-        except Exception as err:
-            raise six.raise_from(errors.CreateFailed("failed to open Zip file"), err)
-
         self._encoding = options.get('encoding') or \
             sys.getdefaultencoding().replace('ascii', 'utf-8')
 
-        self._namelist = self._get_namelist(self._encoding)
-        self._contents = self._get_contents(self._namelist)
-
-    def _get_contents(self, namelist):
-        contents = set()
-        for name in self._namelist:
-            for partial_name in recursepath(name):
-                partial_name = relpath(partial_name)
-                if partial_name != name:
-                    partial_name = forcedir(partial_name)
-                if partial_name:
-                    contents.add(partial_name)
-        return contents
-
-    def _get_namelist(self, encoding):
-        if six.PY2:
-            return [n.decode(encoding) for n in self._zip.namelist()]
-        else:
-            return list(self._zip.namelist())
+        index = options.get('index', False)
+        index_file = _index.index_path(self._handle, index) if index else None
+        index_key = _index.archive_key(self._handle) if index_file else None
+
+        columns = None
+        if index_file is not None:
+            columns = _index.load_index(index_file, 'zip', index_key)
+        if columns is None:
+            try:
+                with zipfile.ZipFile(self._handle) as _zip:
+                    columns = self._dump_members(_zip.infolist())
+            except Exception as err:
+                raise six.raise_from(errors.CreateFailed("failed to open Zip file"), err)
+            if index_file is not None:
+                _index.save_index(index_file, 'zip', index_key, columns)
+
+        # Only the metadata of the members is kept, in columns, from which
+        # `ZipInfo` objects are built when a member is actually needed.
+        self._columns = columns
+        self._table = self._get_table(columns)
+
+        # Members are read with positional reads when the archive is a
+        # regular file, otherwise by seeking the shared handle.
+        self._fileno = pread_fileno(self._handle)
+
+        self._checkpoint_interval = options.get('checkpoint_interval')
+        self._max_checkpoints = options.get('max_checkpoints', 64)
+
+    def _get_table(self, columns):
+        table = _table.MemberTable()
+        names = _index.unpack_strings(
+            columns['orig_filename_data'], columns['orig_filename_offsets'],
+            self._encoding)
+        for row, name in enumerate(map(_zip_filename, names)):
+            table.add(normpath(name), row, name.endswith('/'))
+        table.freeze()
+        return table
+
+    _INDEX_INTS = (
+        'header_offset', 'compress_size', 'file_size', 'CRC', 'compress_type',
+        'flag_bits', 'external_attr', 'internal_attr', 'create_system',
+        'create_version', 'extract_version', 'volume', 'reserved',
+    )
+    # `filename` is rebuilt from `orig_filename` by `zipfile.ZipInfo`
+    _INDEX_STRINGS = ('orig_filename',)
+    _INDEX_BYTES = ('comment', 'extra')
+
+    def _dump_members(self, infolist):
+        columns = {
+            attr: array.array(_index.INT64, (getattr(i, attr) for i in infolist))
+            for attr in self._INDEX_INTS
+        }
+        columns['date_time'] = array.array(
+            _index.INT64, (_dos_date_time(i.date_time) for i in infolist))
+        strings = {
+            attr: [self._decode(getattr(i, attr)) for i in infolist]
+            for attr in self._INDEX_STRINGS
+        }
+        for attr in self._INDEX_BYTES:
+            # arbitrary bytes are stored as their latin-1 decoding
+            strings[attr] = [getattr(i, attr).decode('latin-1') for i in infolist]
+        for attr, values in strings.items():
+            encoding = 'latin-1' if attr in self._INDEX_BYTES else self._encoding
+            blob, offsets = _index.pack_strings(values, encoding)
+            columns['{}_data'.format(attr)] = blob
+            columns['{}_offsets'.format(attr)] = offsets
+        return columns
+
+    def _load_member(self, row):
+        columns = self._columns
+        def string(attr, encoding):
+            return _index.unpack_string(
+                columns['{}_data'.format(attr)],
+                columns['{}_offsets'.format(attr)],
+                row, encoding)
+        zip_info = zipfile.ZipInfo(
+            self._encode(string('orig_filename', self._encoding)),
+            _dos_date_time_tuple(columns['date_time'][row]))
+        for attr in self._INDEX_INTS:
+            setattr(zip_info, attr, columns[attr][row])
+        for attr in self._INDEX_BYTES:
+            value = string(attr, 'latin-1').encode('latin-1')
+            setattr(zip_info, attr, value)
+        return zip_info
+
+    def _get_zip_info(self, path):
+        # Get the `ZipInfo` of the member at the given path, or raise
+        # a `KeyError` if there is none (e.g. for implicit directories).
+        node = self._table.lookup(path)
+        row = -1 if node is None else self._table.row(node)
+        if row < 0:
+            raise KeyError(path)
+        return self._load_member(row)
+
+    if six.PY2:
+        def _decode(self, string):
+            return string.decode(self._encoding)
+        def _encode(self, string):
+            return string.encode(self._encoding)
+    else:
+        def _decode(self, string):
+            return string
+        def _encode(self, string):
+            return string
 
     def getinfo(self, path, namespaces=None):  # noqa: D102
         namespaces = namespaces or ()
@@ -114,9 +324,7 @@ class ZipReadFS(base.ArchiveReadFS):
         if namespaces:
 
             try:
-                zip_name = relpath(
-                    forcedir(_path) if self.isdir(_path) else _path)
-                zip_info = self._zip.getinfo(zip_name)
+                zip_info = self._get_zip_info(_path)
             except KeyError:
                 if info['basic']['is_dir']: # Implicit directory
                     info['details'] = {
@@ -153,56 +361,51 @@ class ZipReadFS(base.ArchiveReadFS):
         if not self.isfile(_path):
             raise errors.ResourceNotFound(path)
 
-        zip_bytes = self._zip.read(relpath(_path))
-        return zip_bytes
+        with self.openbin(_path) as zip_file:
+            return zip_file.read()
 
     def isfile(self, path):  # noqa: D102
-        _path = self.validatepath(path)
-        return relpath(_path) in self._contents
+        node = self._table.lookup(self.validatepath(path))
+        return node is not None and not self._table.isdir(node)
 
     def isdir(self, path):  # noqa: D102
-        if path in '/':
-            return True
-        _path = self.validatepath(path).lower()
-        return relpath(forcedir(_path)) in self._contents
+        node = self._table.lookup(self.validatepath(path))
+        return node is not None and self._table.isdir(node)
+
+    def _get_directory_node(self, path):
+        _path = self.validatepath(path)
+        node = self._table.lookup(_path)
+        if node is None:
+            raise errors.ResourceNotFound(path)
+        if not self._table.isdir(node):
+            raise errors.DirectoryExpected(path)
+        return node
+
+    def isempty(self, path):  # noqa: D102
+        return not self._table.children(self._get_directory_node(path))
 
     def exists(self, path):  # noqa: D102
-        if path in '/':
-            return True
-        return self.isdir(path) or self.isfile(path)
+        return self._table.lookup(self.validatepath(path)) is not None
 
     def listdir(self, path):  # noqa: D102
-        return [entry.name for entry in self.scandir(path)]
+        children = self._table.children(self._get_directory_node(path))
+        return [self._table.name(child) for child in children]
 
     def scandir(self, path, namespaces=None, page=None):  # noqa: D102
         _path = self.validatepath(path)
+        children = self._table.children(self._get_directory_node(_path))
 
-        if not self.exists(path):
-            raise errors.ResourceNotFound(path)
-        elif not self.isdir(path):
-            raise errors.DirectoryExpected(path)
-
-        seen = set()
         basic_only = (
             namespaces is None
             or (len(namespaces) == 1 and next(iter(namespaces)) == "basic")
         )
 
-        for fullname in self._namelist:
-            fullname = abspath(fullname.rstrip('/'))
-            if isbase(_path, fullname) and fullname != _path:
-                name = iteratepath(relpath(frombase(_path, fullname)))[0]
-                fullname = join(_path, name)
-                if basic_only:
-                    info = Info({'basic': {
-                        'name': name,
-                        'is_dir': self.isdir(fullname)
-                    }})
-                else:
-                    info = self.getinfo(fullname, namespaces=namespaces)
-                if fullname not in seen:
-                    seen.add(fullname)
-                    yield info
+        for child in children:
+            name, is_dir = self._table.name(child), self._table.isdir(child)
+            if basic_only:
+                yield Info({'basic': {'name': name, 'is_dir': is_dir}})
+            else:
+                yield self.getinfo(join(_path, name), namespaces=namespaces)
 
     def openbin(self, path, mode='r', buffering=-1, **options):  # noqa: D102
         _path = relpath(self.validatepath(path))
@@ -216,16 +419,93 @@ class ZipReadFS(base.ArchiveReadFS):
         if not self.isfile(_path):
             raise errors.ResourceNotFound(path)
 
-        if six.PY2:
-            _path = _path.encode(self._encoding)
-
-        bin_file = self._zip.open(_path, 'r')
+        zip_info = self._get_zip_info(_path)
+        buffer = self._get_buffer(zip_info)
+        if buffer is not None:
+            bin_file = MemoryReader(buffer)
+        else:
+            bin_file = open_member(
+                zip_info, self._handle, self._lock, self._fileno,
+                self._checkpoint_interval, self._max_checkpoints)
         return _ZipFileWrapper(bin_file)
 
+    def _open_raw(self, zip_info):
+        # Open the data of a member as stored in the archive, so that it
+        # can be copied without being decompressed.
+        start = data_offset(zip_info, self._handle, self._lock, self._fileno)
+        return PositionalReader(self._handle, start, self._lock, self._fileno)
+
+    def _get_buffer(self, zip_info):
+        # Stored files of an archive on the local filesystem are read
+        # from a memory map of the archive, without copying them (Python 2
+        # cannot expose a memory map through a `memoryview`).
+        if six.PY2 or self._fileno is None or zip_info.flag_bits & 0x21:
+            return None
+        if zip_info.compress_type != zipfile.ZIP_STORED:
+            return None
+        if self._mmap is None:
+            with self._lock:
+                if self._mmap is None:
+                    self._mmap = mmap.mmap(self._fileno, 0, access=mmap.ACCESS_READ)
+        start = data_offset(zip_info, self._handle, self._lock, self._fileno)
+        return memoryview(self._mmap)[start:start + zip_info.file_size]
+
+    def getbuffer(self, path):
+        """Get a read-only buffer over the contents of a file.
+
+        Files stored without compression in an archive on the local
+        filesystem are memory-mapped, so that the returned buffer can be
+        used without copying the file contents. Other files are read
+        and decompressed in memory.
+
+        Arguments:
+            path (str): A path to a file in the archive.
+
+        Returns:
+            memoryview: the contents of the file.
+
+        Raises:
+            `~fs.errors.ResourceNotFound`: When ``path`` does not exist.
+            `~fs.errors.FileExpected`: When ``path`` is a directory.
+
+        """
+        _path = relpath(self.validatepath(path))
+
+        if self.isdir(_path):
+            raise errors.FileExpected(path)
+        if not self.isfile(_path):
+            raise errors.ResourceNotFound(path)
+
+        buffer = self._get_buffer(self._get_zip_info(_path))
+        if buffer is None:
+            buffer = memoryview(self.getbytes(path))
+        return buffer
+
+    _extract_concurrently = True
+
+    def _extract_order(self, paths):
+        def header_offset(path):
+            return self._get_zip_info(relpath(path)).header_offset
+        return sorted(paths, key=header_offset)
+
     def close(self):  # noqa: D102
         if not self.isclosed():
             super(ZipReadFS, self).close()
-            self._zip.close()
+            # the map is still used by open files or buffers if it
+            # cannot be closed, it will be closed once they are released
+            self._close_mmap()
+
+    def _close_mmap(self):
+        # Close the memory map of the archive, so that the archive file
+        # can be modified in place, or return `False` if it is still used
+        # by open files or buffers.
+        if self._mmap is not None:
+            try:
+                self._mmap.close()
+            except BufferError:
+                return False
+            self._mmap = None
+        return True
 
 
 class ZipSaver(base.ArchiveSaver):
@@ -251,9 +531,27 @@ class ZipSaver(base.ArchiveSaver):
                 **[default: zipfile.ZIP_DEFLATED]**
             buffer_size (`int`): The buffer size to use.
                 **[default: io.DEFAULT_BUFFER_SIZE]**
+            update (`str`): How to update an existing archive file in
+                place instead of writing it again to a temporary file.
+                Use ``'append'`` to write the new files after its last
+                member, and then its central directory again, when files
+                were only added to it. Use ``'holes'`` to also update it
+                when files were removed or modified, if the new data is
+                small compared to the files left untouched, leaving the
+                space used by the removed members unused, or
+                ``'compact'`` to move the following members over that
+                space. **[default: None]**
+
+        Note:
+            The archive is written again to a temporary file whenever it
+            cannot be updated in place, e.g. when writing the new files
+            fails or when it is memory-mapped by buffers still in use.
+            Members are only moved with ``update='compact'``, after
+            which a failure leaves the archive inconsistent.
 
         """
-        super(ZipSaver, self).__init__(output, overwrite, initial_position)
+        super(ZipSaver, self).__init__(
+            output, overwrite, initial_position, **options)
         self.encoding = options.pop('encoding', 'utf-8')
         self.compression = options.pop('compression', zipfile.ZIP_DEFLATED)
         self.buffer_size = options.pop('buffer_size', io.DEFAULT_BUFFER_SIZE)
@@ -262,49 +560,247 @@ class ZipSaver(base.ArchiveSaver):
         _zip = zipfile.ZipFile(
             handle, mode='w', compression=self.compression, allowZip64=True)
 
-        with _zip:
+        # Files of a `ZipFS` with the contents of a file of the original
+        # archive are copied as they are stored, instead of being
+        # recompressed, with a new header if they were renamed or if
+        # their metadata changed.
+        overlay = self._get_overlay(fs)
+        if overlay is not None and not isinstance(overlay._rfs, ZipReadFS):
+            overlay = None
 
+        with _zip:
             for path, info in fs.walk.info(namespaces=('details', 'stat')):
+                self._write_entry(_zip, fs, path, info, overlay)
+
+    def _update(self, fs, overlay):  # noqa: D102
+        if not isinstance(overlay._rfs, ZipReadFS):
+            return False
+        if super(ZipSaver, self)._update(fs, overlay):
+            return True
+        return self.update in ('holes', 'compact') \
+            and self._update_in_place(fs, overlay)
+
+    def _update_in_place(self, fs, overlay):
+        source_fs = overlay._rfs
+        members = self._members(source_fs)
+        if not members:
+            return False
+
+        # the untouched members are kept, the other files are written
+        # again after them, from the overlay only, since the data of the
+        # original archive is overwritten once members are moved
+        kept, names = [], set()
+        for path, zip_info in members:
+            if zip_info.filename.endswith('/'):
+                keep = fs.isdir(path)
+            else:
+                keep = overlay._unchanged(path)
+            if keep:
+                kept.append(zip_info)
+                names.add(path)
+        entries, protected = [], []
+        for path, info in fs.walk.info(namespaces=('details', 'stat')):
+            if path in names:
+                continue
+            if info.is_file and not overlay._wfs.isfile(path):
+                return False
+            entries.append((path, info))
+            # the original archive is written again with the data of the
+            # member a file was copied from if updating it fails
+            source = overlay._source(path) if info.is_file else None
+            if source is not None:
+                protected.append(source_fs._get_zip_info(relpath(source)))
+
+        written = sum(info.size for _, info in entries if info.is_file)
+        if written > sum(z.compress_size for z in kept):
+            return False
+        return self._write_in_place(
+            fs, source_fs, kept, entries,
+            protected=protected, compact=self.update == 'compact')
+
+    @staticmethod
+    def _entry_end(handle, zip_info):
+        # Get the offset of the end of a member, including its data
+        # descriptor, if any.
+        end = data_offset(zip_info, handle) + zip_info.compress_size
+        if zip_info.flag_bits & 0x08:
+            handle.seek(end)
+            if handle.read(4) == b'PK\x07\x08':
+                end += 4
+            zip64 = max(zip_info.file_size, zip_info.compress_size) > zipfile.ZIP64_LIMIT
+            end += 20 if zip64 else 12
+        return end
+
+    def _move(self, handle, start, end, position):
+        # Copy the bytes from ``start`` to ``end`` down to ``position``,
+        # which is never after ``start``.
+        while start < end and position != start:
+            handle.seek(start)
+            chunk = handle.read(min(end - start, self.buffer_size))
+            if not chunk:
+                raise zipfile.BadZipfile("Truncated archive")
+            handle.seek(position)
+            handle.write(chunk)
+            start += len(chunk)
+            position += len(chunk)
+
+    def _append(self, fs, source_fs, added):  # noqa: D102
+        if not isinstance(source_fs, ZipReadFS):
+            return False
+        entries = [
+            (path, fs.getinfo(path, namespaces=('details', 'stat')))
+            for path in added
+        ]
+        kept = [zip_info for _, zip_info in self._members(source_fs)]
+        return self._write_in_place(fs, source_fs, kept, entries)
+
+    @staticmethod
+    def _members(source_fs):
+        # Get the members of the original archive with their path, as
+        # normalized by the reader, except the ones shadowed by a later
+        # member of the same name.
+        members = []
+        columns, table = source_fs._columns, source_fs._table
+        names = _index.unpack_strings(
+            columns['orig_filename_data'], columns['orig_filename_offsets'],
+            source_fs._encoding)
+        for row, name in enumerate(map(_zip_filename, names)):
+            path = normpath(name)
+            node = table.lookup(path)
+            if node is not None and table.row(node) == row:
+                members.append((abspath(path), source_fs._load_member(row)))
+        return members
+
+    def _write_in_place(self, fs, source_fs, kept, entries, protected=(), compact=False):
+        # Write new entries after the members kept from the original
+        # archive, followed by a new central directory. Unless members
+        # are moved to compact the archive, the kept and protected
+        # members are never overwritten, so the archive can still be
+        # written again from them if that fails.
+        if not source_fs._close_mmap():
+            return False
+        offsets = source_fs._columns['header_offset']
+        position = min(offsets) if len(offsets) else 0
+        moved = False
+        try:
+            with io.open(self.output, 'r+b') as handle:
+                kept = sorted(kept, key=lambda z: z.header_offset)
+                ends = [self._entry_end(handle, z) for z in kept]
+                for zip_info, end in zip(kept, ends):
+                    start = zip_info.header_offset
+                    if not compact:
+                        position = max(position, end)
+                        continue
+                    if start != position:
+                        moved = True
+                        self._move(handle, start, end, position)
+                        zip_info.header_offset = position
+                    position += end - start
+                if not moved:
+                    for zip_info in protected:
+                        position = max(position, self._entry_end(handle, zip_info))
+                handle.seek(position)
+                written = self._write_entries(handle, fs, entries)
+                end = max([position] + [self._entry_end(handle, z) for z in written])
+                handle.seek(end)
+                _write_central_directory(handle, kept + written)
+                handle.truncate()
+        except Exception:
+            # the original members were overwritten, the archive cannot
+            # be written again from them
+            if moved:
+                raise
+            return False
+        return True
+
+    def _write_entries(self, handle, fs, entries):
+        # Write entries with `zipfile` at the current position of ``handle``,
+        # and get their `ZipInfo`; the central directory written when the
+        # `ZipFile` is closed only lists them, and must be written again.
+        _zip = zipfile.ZipFile(
+            handle, mode='w', compression=self.compression, allowZip64=True)
+        with _zip:
+            for path, info in entries:
+                self._write_entry(_zip, fs, path, info)
+        return _zip.infolist()
+
+    def _write_entry(self, _zip, fs, path, info, overlay=None):
+        # Zip names must be relative, directory names must end
+        # with a slash.
+        zip_name = relpath(forcedir(path) if info.is_dir else path)
+        if six.PY2:
+            # Python2 expects bytes filenames
+            zip_name = zip_name.encode(self.encoding, 'replace')
 
-                # Zip names must be relative, directory names must end
-                # with a slash.
-                zip_name = relpath(forcedir(path) if info.is_dir else path)
-                if six.PY2:
-                    # Python2 expects bytes filenames
-                    zip_name = zip_name.encode(self.encoding, 'replace')
-
-                if info.has_namespace('stat'):
-                    # get zip time directory from the stat structure
-                    st_mtime = info.get('stat', 'st_mtime', None)
-                    _mtime = time.localtime(st_mtime)
-                    zip_time = _mtime[0:6]
-
-                else:
-                    # use the modified time from details namespace.
-                    mt = info.modified or datetime.datetime.utcnow()
-                    zip_time = (
-                        mt.year, mt.month, mt.day,
-                        mt.hour, mt.minute, mt.second
-                    )
-
-                # create a custom zip_info
-                zip_info = zipfile.ZipInfo(zip_name, zip_time)
-
-                if info.is_dir:
-                    # only write empty directories (other are implicit)
-                    if next(fs.walk.files(path), None) is None:
-                        _zip.writestr(zip_info, b'')
-                else:
-                    #
-                    size = fs.getsize(path)
-                    if size is not None and size > 0:
-                        zip_info.file_size = size
-
-
-                    with fs.openbin(path, 'rb') as src_file:
-                        self._write_to_zip(_zip, zip_info, src_file)
-                        # with _zip.open(zip_info, 'w') as dst_file:
-                        #     shutil.copyfileobj(src_file, dst_file, self.buffer_size)
+        if info.has_namespace('stat'):
+            # get zip time directory from the stat structure
+            st_mtime = info.get('stat', 'st_mtime', None)
+            _mtime = time.localtime(st_mtime)
+            zip_time = _mtime[0:6]
+
+        else:
+            # use the modified time from details namespace.
+            mt = info.modified or datetime.datetime.utcnow()
+            zip_time = (
+                mt.year, mt.month, mt.day,
+                mt.hour, mt.minute, mt.second
+            )
+
+        # create a custom zip_info
+        zip_info = zipfile.ZipInfo(zip_name, zip_time)
+        zip_info.compress_type = self.compression
+
+        if info.is_dir:
+            # only write empty directories (other are implicit)
+            if next(fs.walk.files(path), None) is None:
+                _zip.writestr(zip_info, b'')
+        elif overlay is not None and overlay._source(path) is not None:
+            source = overlay._source(path)
+            date_time = None if overlay._unchanged(path) else zip_time
+            self._copy_raw(_zip, zip_name, overlay._rfs, source, date_time)
+        else:
+            #
+            size = fs.getsize(path)
+            if size is not None and size > 0:
+                zip_info.file_size = size
+
+
+            with fs.openbin(path, 'rb') as src_file:
+                self._write_to_zip(_zip, zip_info, src_file)
+                # with _zip.open(zip_info, 'w') as dst_file:
+                #     shutil.copyfileobj(src_file, dst_file, self.buffer_size)
+
+    def _copy_raw(self, _zip, zip_name, source_fs, path, date_time=None):
+        zip_info = source_fs._get_zip_info(path)
+        # the local header is located with the offset of the source archive
+        src_file = source_fs._open_raw(zip_info)
+        zip_info.filename = zip_name
+        if date_time is not None:
+            zip_info.date_time = date_time
+        # sizes are known in advance, and written in the local header
+        zip_info.flag_bits &= ~0x08
+        zip_info.extra = _strip_zip64_extra(zip_info.extra)
+        zip64 = max(zip_info.file_size, zip_info.compress_size) > zipfile.ZIP64_LIMIT
+
+        # `zipfile` leaves the handle at the end of the last entry it wrote
+        fp = _zip.fp
+        zip_info.header_offset = fp.tell()
+        fp.write(zip_info.FileHeader(zip64))
+        with src_file:
+            remaining = zip_info.compress_size
+            while remaining > 0:
+                chunk = src_file.read(min(remaining, self.buffer_size))
+                if not chunk:
+                    raise zipfile.BadZipfile(
+                        "Truncated file {!r}".format(zip_info.orig_filename))
+                fp.write(chunk)
+                remaining -= len(chunk)
+
+        # register the member like `zipfile.ZipFile.open` would
+        _zip.start_dir = fp.tell()
+        _zip.filelist.append(zip_info)
+        _zip.NameToInfo[zip_info.filename] = zip_info
+        _zip._didModify = True
 
     if sys.version_info >= (3, 6):
         def _write_to_zip(self, _zip, zip_info, src_file):
@@ -340,6 +836,8 @@ class ZipFS(base.ArchiveFS):
                 **[default: zipfile.ZIP_DEFLATED]**
             encoding (str): The encoding to use for the TAR archive.
                 **[default: 'utf-8']**
+            update (str): How to update the archive file in place instead
+                of writing it again, see `ZipSaver`. **[default: None]**
 
         """
         options.setdefault('compression', zipfile.ZIP_DEFLATED)
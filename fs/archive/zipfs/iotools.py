@@ -0,0 +1,292 @@
+# coding: utf-8
+"""Positional readers over the members of a ZIP archive.
+"""
+from __future__ import absolute_import
+from __future__ import unicode_literals
+
+import io
+import os
+import stat
+import struct
+import threading
+import zipfile
+import zlib
+
+import six
+
+from ...enums import Seek
+from .._inflate import CheckpointReader
+
+
+__all__ = ['MemoryReader', 'PositionalReader', 'pread_fileno', 'data_offset', 'open_member']
+
+
+# Local file header, see section 4.3.7 of the ZIP specification.
+_LOCAL_HEADER = struct.Struct(str('<4s2B4HL2L2H'))
+_LOCAL_MAGIC = b'PK\x03\x04'
+
+
+def pread_fileno(handle):
+    """Get the file descriptor to use for positional reads from ``handle``.
+
+    Returns:
+        int: the file descriptor of ``handle``, or `None` if `os.pread`
+        is not available or if ``handle`` is not backed by a regular file.
+
+    """
+    if not hasattr(os, 'pread'):
+        return None
+    try:
+        fileno = handle.fileno()
+        if stat.S_ISREG(os.fstat(fileno).st_mode):
+            return fileno
+    except (AttributeError, io.UnsupportedOperation, OSError, ValueError):
+        pass
+    return None
+
+
+class PositionalReader(io.RawIOBase):
+    """A read-only file over a shared handle, with its own position.
+
+    When a file descriptor is given, reads use `os.pread`, which neither
+    moves the position of the shared handle nor holds the GIL, so that
+    readers in different threads never wait for each other. Otherwise,
+    each read seeks the shared handle while holding ``lock``.
+    """
+
+    def __init__(self, handle, offset=0, lock=None, fileno=None):
+        """Create a new positional reader.
+
+        Parameters:
+            handle (`io.IOBase`): the readable and seekable shared handle.
+            offset (`int`): the initial position of the reader.
+                **[default: 0]**
+            lock (`threading.RLock`): a lock to acquire when seeking
+                ``handle``. **[default: None]**
+            fileno (`int`): the file descriptor to read from with
+                `os.pread`, as given by `pread_fileno`, or `None` to
+                seek and read ``handle`` instead. **[default: None]**
+
+        """
+        super(PositionalReader, self).__init__()
+        self._handle = handle
+        self._position = offset
+        self._lock = lock or threading.RLock()
+        self._fileno = fileno
+
+    def _end(self):
+        with self._lock:
+            self._handle.seek(0, Seek.end)
+            return self._handle.tell()
+
+    def readable(self):  # noqa: D102
+        return True
+
+    def seekable(self):  # noqa: D102
+        return True
+
+    def writable(self):  # noqa: D102
+        return False
+
+    def tell(self):  # noqa: D102
+        return self._position
+
+    def seek(self, offset, whence=Seek.set):  # noqa: D102
+        if whence == Seek.set:
+            self._position = offset
+        elif whence == Seek.current:
+            self._position += offset
+        elif whence == Seek.end:
+            self._position = self._end() + offset
+        else:
+            raise ValueError(
+                "Invalid whence ({}, should be {}, {} or {})".format(
+                    whence, Seek.set, Seek.current, Seek.end
+                )
+            )
+        if self._position < 0:
+            raise ValueError("Negative seek position {}".format(self._position))
+        return self._position
+
+    def read(self, size=-1):  # noqa: D102
+        if size is None or size < 0:
+            size = max(self._end() - self._position, 0)
+        if self._fileno is not None:
+            data = os.pread(self._fileno, size, self._position)
+        else:
+            with self._lock:
+                self._handle.seek(self._position)
+                data = self._handle.read(size)
+        self._position += len(data)
+        return data
+
+    def readinto(self, b):  # noqa: D102
+        data = self.read(len(b))
+        b[:len(data)] = data
+        return len(data)
+
+    def readall(self):  # noqa: D102
+        return self.read()
+
+
+class MemoryReader(io.RawIOBase):
+    """A read-only file over a buffer, such as a slice of a memory map.
+
+    `readinto` copies the data straight from the buffer to the given
+    one, and `getbuffer` exposes the buffer without copying it at all.
+    """
+
+    def __init__(self, buffer):  # noqa: D102, D107
+        super(MemoryReader, self).__init__()
+        self._buffer = memoryview(buffer)
+        self._position = 0
+
+    def getbuffer(self):
+        """Get a read-only view over the whole contents of the file.
+        """
+        return self._buffer
+
+    def readable(self):  # noqa: D102
+        return True
+
+    def seekable(self):  # noqa: D102
+        return True
+
+    def writable(self):  # noqa: D102
+        return False
+
+    def tell(self):  # noqa: D102
+        return self._position
+
+    def seek(self, offset, whence=Seek.set):  # noqa: D102
+        if whence == Seek.set:
+            position = offset
+        elif whence == Seek.current:
+            position = self._position + offset
+        elif whence == Seek.end:
+            position = len(self._buffer) + offset
+        else:
+            raise ValueError(
+                "Invalid whence ({}, should be {}, {} or {})".format(
+                    whence, Seek.set, Seek.current, Seek.end
+                )
+            )
+        if position < 0:
+            raise ValueError("Negative seek position {}".format(position))
+        self._position = position
+        return self._position
+
+    def read(self, size=-1):  # noqa: D102
+        end = len(self._buffer)
+        if size is not None and size >= 0:
+            end = min(end, self._position + size)
+        data = self._buffer[self._position:end].tobytes()
+        self._position += len(data)
+        return data
+
+    def readinto(self, b):  # noqa: D102
+        chunk = self._buffer[self._position:self._position + len(b)]
+        b[:len(chunk)] = chunk
+        self._position += len(chunk)
+        return len(chunk)
+
+    def readall(self):  # noqa: D102
+        return self.read()
+
+    def close(self):  # noqa: D102
+        if not self.closed:
+            self._buffer.release()
+            super(MemoryReader, self).close()
+
+
+def _read_local_header(zinfo, reader):
+    """Read the local header of a member and move ``reader`` after it.
+    """
+    header = reader.read(_LOCAL_HEADER.size)
+    if len(header) != _LOCAL_HEADER.size:
+        raise zipfile.BadZipfile("Truncated file header")
+    fields = _LOCAL_HEADER.unpack(header)
+    if fields[0] != _LOCAL_MAGIC:
+        raise zipfile.BadZipfile("Bad magic number for file header")
+    name = reader.read(fields[10])
+    if fields[11]:
+        reader.seek(fields[11], Seek.current)
+    if six.PY3:
+        name = name.decode('utf-8' if zinfo.flag_bits & 0x800 else 'cp437')
+    if name != zinfo.orig_filename:
+        raise zipfile.BadZipfile(
+            "File name in directory {!r} and header {!r} differ.".format(
+                zinfo.orig_filename, name))
+
+
+def data_offset(zinfo, handle, lock=None, fileno=None):
+    """Get the offset of the data of a member within the archive.
+
+    Raises:
+        `zipfile.BadZipfile`: when the local header of the member is
+            invalid.
+
+    """
+    with PositionalReader(handle, zinfo.header_offset, lock, fileno) as reader:
+        _read_local_header(zinfo, reader)
+        return reader.tell()
+
+
+def open_member(zinfo, handle, lock=None, fileno=None,
+                checkpoint_interval=None, max_checkpoints=None):
+    """Open a member of a ZIP archive without using its `zipfile.ZipFile`.
+
+    `zipfile.ZipFile.open` makes every member share the handle of the
+    archive, and serializes all reads on a single lock. Here, the member
+    is given its own `PositionalReader`, so that several members can be
+    read and decompressed concurrently.
+
+    If ``checkpoint_interval`` is given, deflated members are opened
+    with a `~fs.archive._inflate.CheckpointReader` instead of a
+    `zipfile.ZipExtFile`, so that seeking backwards does not require
+    decompressing the member from its start again. The CRC of the
+    member is not checked in that case.
+
+    Parameters:
+        zinfo (`zipfile.ZipInfo`): the member to open.
+        handle (`io.IOBase`): the handle storing the archive.
+        lock (`threading.RLock`): the lock to acquire when seeking
+            ``handle``. **[default: None]**
+        fileno (`int`): the file descriptor to read ``handle`` from with
+            `os.pread`, if any. **[default: None]**
+        checkpoint_interval (`int`): the number of decompressed bytes
+            between two checkpoints of the inflate state, or `None` to
+            read deflated members sequentially. **[default: None]**
+        max_checkpoints (`int`): the maximum number of checkpoints to
+            keep for the member, or `None` for no limit.
+            **[default: None]**
+
+    Returns:
+        `io.RawIOBase`: a readable file over the decompressed member.
+
+    Raises:
+        `zipfile.BadZipfile`: when the local header of the member is
+            invalid.
+        `RuntimeError`: when the member is encrypted.
+        `NotImplementedError`: when the member is compressed patched data.
+
+    """
+    if zinfo.flag_bits & 0x20:
+        raise NotImplementedError("compressed patched data (flag bit 5)")
+    if zinfo.flag_bits & 0x1:
+        raise RuntimeError(
+            "File {!r} is encrypted, password required for extraction".format(
+                zinfo.orig_filename))
+    reader = PositionalReader(handle, zinfo.header_offset, lock, fileno)
+    try:
+        _read_local_header(zinfo, reader)
+        if checkpoint_interval and zinfo.compress_type == zipfile.ZIP_DEFLATED:
+            start = reader.tell()
+            return CheckpointReader(
+                reader, start, start + zinfo.compress_size, -zlib.MAX_WBITS,
+                checkpoint_interval, max_checkpoints, zinfo.file_size,
+                close_handle=True)
+        return zipfile.ZipExtFile(reader, 'r', zinfo, None, True)
+    except:
+        reader.close()
+        raise
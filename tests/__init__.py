@@ -7,8 +7,20 @@ from __future__ import absolute_import
 import fs
 import os
 import pkg_resources
+import shutil
 import six
+import tempfile
 
 # Add the local code directory to the `fs` module path
 fs.__path__.insert(0, os.path.realpath(
     os.path.join(__file__, '..', '..', 'fs')))
+
+
+class TempDirMixin(object):
+    """Create a temporary directory for each test, removed afterwards.
+    """
+
+    def setUp(self):
+        super(TempDirMixin, self).setUp()
+        self.tempdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tempdir)
@@ -10,6 +10,11 @@ import tarfile
 import unittest
 import pkg_resources
 
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
 import fs.archive
 import fs.errors
 
@@ -58,6 +63,19 @@ class TestOpenArchive(unittest.TestCase):
         with mem.openbin('myzip.zip') as myzip:
             self.assertTrue(zipfile.is_zipfile(myzip))
 
+    def test_unmodified_not_saved(self):
+        mem = fs.open_fs('mem://')
+        with fs.archive.open_archive(mem, 'myzip.zip') as archive:
+            archive.settext('abc.txt', 'abc')
+
+        with mock.patch.object(ZipFS._saver_cls, 'save') as save:
+            with fs.archive.open_archive(mem, 'myzip.zip') as archive:
+                self.assertEqual(archive.gettext('abc.txt'), 'abc')
+            save.assert_not_called()
+            with fs.archive.open_archive(mem, 'myzip.zip') as archive:
+                archive.remove('abc.txt')
+            save.assert_called_once_with(archive)
+
     def _test_tar(self, filename, arcfile, opener):
 
         mem = fs.open_fs('mem://')
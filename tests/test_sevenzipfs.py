@@ -4,12 +4,19 @@ from __future__ import unicode_literals
 
 import os
 import io
+import functools
 import zipfile
 import tempfile
+import threading
 import unittest
 
 from six.moves import filterfalse
 
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
 import fs.test
 import fs.wrap
 import fs.errors
@@ -24,6 +31,8 @@ except ImportError:
     py7zr = None
 
 try:
+    import fs.archive.sevenzipfs.iotools
+    import fs.archive.sevenzipfs.keys
     from fs.archive.sevenzipfs import SevenZipReadFS, SevenZipFS, SevenZipSaver
 except ImportError:
     SevenZipReadFS = SevenZipFS = SevenZipSaver = None
@@ -102,6 +111,29 @@ class TestSevenZipReadFS(ArchiveReadTestCases, unittest.TestCase):
         with SevenZipReadFS(buffer, password="pwd", close_handle=False) as archive:
             self.assertEqual(archive.readtext("foo.txt"), "Hello, World")
 
+    def test_password_key_cache(self):
+        buffer = io.BytesIO()
+        source_fs = fs.memoryfs.MemoryFS()
+        source_fs.settext("foo.txt", "Hello, World")
+        source_fs.settext("bar.txt", "Goodbye, World")
+        sevenzip_compress(buffer, source_fs, password="pwd", encrypt_header=True)
+
+        calls = []
+        calculate_key = fs.archive.sevenzipfs.keys._calculate_key
+        def counting_calculate_key(*args):
+            calls.append(args)
+            return calculate_key(*args)
+        fs.archive.sevenzipfs.keys._calculate_key = counting_calculate_key
+        try:
+            buffer.seek(0)
+            with SevenZipReadFS(buffer, password="pwd", cache_size=0, close_handle=False) as archive:
+                for _ in range(3):
+                    self.assertEqual(archive.readtext("foo.txt"), "Hello, World")
+                    self.assertEqual(archive.readtext("bar.txt"), "Goodbye, World")
+                self.assertEqual(len(calls), 1)
+        finally:
+            fs.archive.sevenzipfs.keys._calculate_key = calculate_key
+
     def test_password_protected_header(self):
         buffer = io.BytesIO()
         source_fs = fs.memoryfs.MemoryFS()
@@ -123,6 +155,151 @@ class TestSevenZipReadFS(ArchiveReadTestCases, unittest.TestCase):
         with SevenZipReadFS(buffer, password="pwd", close_handle=False) as archive:
             self.assertEqual(archive.readtext("foo.txt"), "Hello, World")
 
+    def test_archive_parsed_once(self):
+        archive = self.fs._7z
+        for path in ('top.txt', 'foo/bar/egg', 'top.txt'):
+            self.fs.readbytes(path)
+        self.assertIs(self.fs._7z, archive)
+
+    def test_solid_block_cache(self):
+        calls = []
+        read = self.fs._7z.read
+        def counting_read(targets=None):
+            calls.append(targets)
+            return read(targets)
+        self.fs._7z.read = counting_read
+        paths = ('top.txt', 'foo/bar/egg', 'top2.txt', 'top.txt')
+        for path in paths:
+            self.assertEqual(self.fs.readbytes(path), self.source_fs.readbytes(path))
+        folders = {self.fs._members[abspath(path)].folder for path in paths}
+        self.assertEqual(len(calls), len(folders))
+
+    def test_solid_block_cache_disabled(self):
+        self.handle.seek(0)
+        with SevenZipReadFS(self.handle, cache_size=0, close_handle=False) as archive:
+            for path in ('top.txt', 'foo/bar/egg', 'top.txt'):
+                self.assertEqual(archive.readbytes(path), self.source_fs.readbytes(path))
+            self.assertFalse(archive._cache)
+
+    def test_openbins(self):
+        calls = []
+        read = self.fs._7z.read
+        def counting_read(targets=None):
+            calls.append(targets)
+            return read(targets)
+        self.fs._7z.read = counting_read
+        files = dict(self.fs.openbins())
+        folders = self.fs._7z.header.main_streams.unpackinfo.folders
+        self.assertEqual(len(calls), len(folders))
+        self.assertEqual(
+            sorted(files),
+            sorted(abspath(p) for p in self.source_fs.walk.files()))
+        for path, handle in files.items():
+            with handle:
+                self.assertEqual(handle.read(), self.source_fs.readbytes(path))
+
+    def test_openbins_paths(self):
+        files = dict(self.fs.openbins(['foo/bar/egg', 'top.txt']))
+        self.assertEqual(sorted(files), ['/foo/bar/egg', '/top.txt'])
+        self.assertEqual(files['/foo/bar/egg'].read(), b'foofoo')
+        with self.assertRaises(fs.errors.ResourceNotFound):
+            list(self.fs.openbins(['nope']))
+        with self.assertRaises(fs.errors.FileExpected):
+            list(self.fs.openbins(['foo']))
+
+    def test_openbins_filter(self):
+        files = dict(self.fs.openbins(filter=['top*.txt']))
+        self.assertEqual(sorted(files), ['/top.txt', '/top2.txt'])
+
+    def test_streaming(self):
+        self.handle.seek(0)
+        with SevenZipReadFS(self.handle, cache_size=0, spill_size=4, close_handle=False) as archive:
+            for path in ('top.txt', 'foo/bar/egg', 'unicode/text.txt'):
+                expected = self.source_fs.readbytes(path)
+                with archive.openbin(path) as f:
+                    self.assertIsInstance(f, fs.archive.sevenzipfs.iotools.SevenZipStreamReader)
+                    self.assertEqual(f.read(3), expected[:3])
+                    f.seek(-2, 2)
+                    self.assertEqual(f.read(), expected[-2:])
+                    self.assertIsNone(f._spool)
+                    f.seek(1)
+                    self.assertEqual(f.read(), expected[1:])
+                    self.assertTrue(f._spool._rolled)
+
+    def test_details_precomputed(self):
+        expected = {
+            path: info.raw
+            for path, info in self.fs.walk.info(namespaces=['details'])
+        }
+        file_properties = py7zr.py7zr.ArchiveFile.file_properties
+        py7zr.py7zr.ArchiveFile.file_properties = None
+        try:
+            actual = {
+                path: info.raw
+                for path, info in self.fs.walk.info(namespaces=['details'])
+            }
+        finally:
+            py7zr.py7zr.ArchiveFile.file_properties = file_properties
+        self.assertEqual(actual, expected)
+
+    def test_concurrent_reads(self):
+        results = {}
+        def read(path):
+            results[path] = self.fs.readbytes(path)
+        threads = [
+            threading.Thread(target=read, args=(path,))
+            for path in ('top.txt', 'foo/bar/egg', 'unicode/text.txt')
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results['foo/bar/egg'], b'foofoo')
+        for path, data in results.items():
+            self.assertEqual(data, self.source_fs.readbytes(path))
+
+@unittest.skipUnless(py7zr, 'py7zr not available')
+class TestSevenZipReadFSSolidBlocks(TestSevenZipReadFS):
+
+    compress = staticmethod(functools.partial(
+        sevenzip_compress, solid_files=2, workers=2))
+
+    def test_folders(self):
+        folders = self.fs._7z.header.main_streams.unpackinfo.folders
+        self.assertGreater(len(folders), 1)
+        for folder in folders:
+            self.assertLessEqual(len(folder.files), 2)
+
+    def test_solid_by_directory(self):
+        buffer = io.BytesIO()
+        sevenzip_compress(buffer, self.source_fs, solid_by_directory=True)
+        buffer.seek(0)
+        with py7zr.SevenZipFile(buffer) as z:
+            for folder in z.header.main_streams.unpackinfo.folders:
+                parents = {relpath(f.filename).rpartition('/')[0] for f in folder.files}
+                self.assertEqual(len(parents), 1)
+
+
+    def test_single_block_written_directly(self):
+        buffer = io.BytesIO()
+        with mock.patch.object(SevenZipSaver, '_compress_block') as compress_block:
+            sevenzip_compress(buffer, self.source_fs)
+        self.assertFalse(compress_block.called)
+        buffer.seek(0)
+        with SevenZipReadFS(buffer) as archive:
+            self.assertEqual(archive.readbytes('foo/bar/egg'), b'foofoo')
+
+    def test_unsupported_py7zr(self):
+        buffer = io.BytesIO()
+        with mock.patch.object(fs.archive.sevenzipfs, '_SOLID_BLOCKS', False):
+            sevenzip_compress(buffer, self.source_fs, solid_files=2, workers=2)
+        buffer.seek(0)
+        with SevenZipReadFS(buffer) as archive:
+            folders = archive._7z.header.main_streams.unpackinfo.folders
+            self.assertEqual(len(folders), 1)
+            self.assertEqual(archive.readbytes('foo/bar/egg'), b'foofoo')
+
+
 @unittest.skipUnless(py7zr, 'py7zr not available')
 class TestSevenZipFSio(ArchiveIOTestCases, unittest.TestCase):
 
@@ -2,33 +2,48 @@
 from __future__ import absolute_import
 from __future__ import unicode_literals
 
+import functools
 import io
 import os
+import random
+import shutil
 import six
+import struct
 import tarfile
 import tempfile
 import unittest
 import uuid
+import zlib
+
+try:
+    from unittest import mock
+except ImportError:
+    import mock
 
 import fs.test
 import fs.wrap
 import fs.errors
 import fs.memoryfs
+import fs.archive.base
 import fs.archive.tarfs
+import fs.archive._inflate
+import fs.archive.tarfs.blocks
 
 from fs import ResourceType
 from fs.path import join, forcedir, abspath, recursepath
 from fs.archive.test import ArchiveReadTestCases, ArchiveIOTestCases
 from fs.archive._utils import UniversalContainer
 
+from . import TempDirMixin
+
 
 FS_VERSION = tuple(map(int, fs.__version__.split('.')))
 
 
-def tar_compress(handle, source_fs):
+def tar_compress(handle, source_fs, **options):
     if hasattr(handle, 'seek') and handle.seekable():
         handle.seek(0)
-    saver = fs.archive.tarfs.TarSaver(handle, False)
+    saver = fs.archive.tarfs.TarSaver(handle, False, **options)
     saver.save(source_fs)
 
 
@@ -74,6 +89,129 @@ class TestTarReadFS(ArchiveReadTestCases, unittest.TestCase):
         self.assertRaises(fs.errors.CreateFailed, fs.archive.tarfs.TarFS, 1)
 
 
+class TestTarReadFSCheckpoints(TestTarReadFS):
+
+    compress = staticmethod(functools.partial(tar_compress, compression='gz'))
+    _archive_read_fs = staticmethod(functools.partial(
+        fs.archive.tarfs.TarReadFS, checkpoint_interval=1024))
+
+    def test_checkpoint_reader(self):
+        self.assertIsInstance(self.fs._tar.fileobj, fs.archive._inflate.CheckpointReader)
+
+    def test_random_access(self):
+        rng = random.Random(42)
+        data = bytes(bytearray(rng.randrange(256) for _ in range(50000)))
+        handle = io.BytesIO()
+        with tarfile.open(mode="w:gz", fileobj=handle) as tf:
+            for name in ('a.bin', 'b.bin', 'c.bin'):
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                tf.addfile(info, io.BytesIO(data))
+        handle.seek(0)
+        with fs.archive.tarfs.TarReadFS(handle, checkpoint_interval=4096) as tarfs:
+            for name in ('c.bin', 'a.bin', 'b.bin'):
+                with tarfs.openbin(name) as f:
+                    for _ in range(20):
+                        start = rng.randrange(len(data))
+                        f.seek(start)
+                        self.assertEqual(f.read(1000), data[start:start+1000])
+            self.assertGreater(len(tarfs._tar.fileobj._checkpoints), 1)
+
+    def test_gzip_members(self):
+        tar = io.BytesIO()
+        with tarfile.open(fileobj=tar, mode='w') as tf:
+            for name in ('a.txt', 'b.txt'):
+                info = tarfile.TarInfo(name)
+                info.size = 3000
+                tf.addfile(info, io.BytesIO(name.encode('ascii') * 600))
+        data, members = tar.getvalue(), []
+        for i in range(0, len(data), 2000):
+            compressor = zlib.compressobj(6, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+            members.append(compressor.compress(data[i:i+2000]) + compressor.flush())
+        handle = io.BytesIO(b''.join(members))
+        with fs.archive.tarfs.TarReadFS(handle, checkpoint_interval=1024) as tarfs:
+            self.assertIsInstance(tarfs._tar.fileobj, fs.archive._inflate.CheckpointReader)
+            self.assertEqual(tarfs.getbytes('b.txt'), b'b.txt' * 600)
+
+
+@unittest.skipUnless(fs.archive.tarfs.blocks.lzma, "lzma not available")
+class TestTarReadFSBlocks(TestTarReadFS):
+
+    compress = staticmethod(functools.partial(
+        tar_compress, compression='xz', block_size=2048, workers=2))
+    _archive_read_fs = staticmethod(functools.partial(
+        fs.archive.tarfs.TarReadFS, workers=2))
+
+    def test_block_reader(self):
+        self.assertIsInstance(self.fs._tar.fileobj, fs.archive.tarfs.blocks.BlockReader)
+        self.assertGreater(len(self.fs._tar.fileobj._blocks), 1)
+
+    def test_stdlib_compatible(self):
+        self.handle.seek(0)
+        with tarfile.open(fileobj=self.handle, mode='r:xz') as tf:
+            member = tf.extractfile('foo/bar/egg')
+            self.assertEqual(member.read(), b'foofoo')
+
+    def test_random_access(self):
+        rng = random.Random(42)
+        data = bytes(bytearray(rng.randrange(256) for _ in range(50000)))
+        source = fs.memoryfs.MemoryFS()
+        for name in ('a.bin', 'b.bin', 'c.bin'):
+            source.setbytes(name, data)
+        handle = io.BytesIO()
+        tar_compress(handle, source, compression='xz', block_size=4096)
+        handle.seek(0)
+        with fs.archive.tarfs.TarReadFS(handle) as tarfs:
+            self.assertIsInstance(tarfs._tar.fileobj, fs.archive.tarfs.blocks.BlockReader)
+            for name in ('c.bin', 'a.bin', 'b.bin'):
+                with tarfs.openbin(name) as f:
+                    for _ in range(20):
+                        start = rng.randrange(len(data))
+                        f.seek(start)
+                        self.assertEqual(f.read(1000), data[start:start+1000])
+
+
+class TestTarReadFSGzipBlocks(TestTarReadFS):
+
+    compress = staticmethod(functools.partial(
+        tar_compress, compression='gz', block_size=2048, workers=2))
+    _archive_read_fs = staticmethod(functools.partial(
+        fs.archive.tarfs.TarReadFS, workers=2))
+
+    def test_block_reader(self):
+        self.assertIsInstance(self.fs._tar.fileobj, fs.archive.tarfs.blocks.BlockReader)
+        self.assertGreater(len(self.fs._tar.fileobj._blocks), 1)
+
+    def test_stdlib_compatible(self):
+        self.handle.seek(0)
+        with tarfile.open(fileobj=self.handle, mode='r:gz') as tf:
+            member = tf.extractfile('foo/bar/egg')
+            self.assertEqual(member.read(), b'foofoo')
+
+    def test_bgzf(self):
+        def bgzf_member(data):
+            compressor = zlib.compressobj(6, zlib.DEFLATED, -zlib.MAX_WBITS)
+            deflated = compressor.compress(data) + compressor.flush()
+            header = struct.pack('<3sBIBBH2sHH', b'\x1f\x8b\x08', 4, 0, 0, 255,
+                                 6, b'BC', 2, len(deflated) + 25)
+            trailer = struct.pack('<II', zlib.crc32(data) & 0xffffffff, len(data))
+            return header + deflated + trailer
+
+        tar = io.BytesIO()
+        with tarfile.open(fileobj=tar, mode='w') as tf:
+            info = tarfile.TarInfo('foo.txt')
+            info.size = 12
+            tf.addfile(info, io.BytesIO(b'Hello, World'))
+        data = tar.getvalue()
+        handle = io.BytesIO(b''.join(
+            bgzf_member(data[i:i+1000]) for i in range(0, len(data), 1000)
+        ) + bgzf_member(b''))
+
+        with fs.archive.tarfs.TarReadFS(handle) as tarfs:
+            self.assertIsInstance(tarfs._tar.fileobj, fs.archive.tarfs.blocks.BlockReader)
+            self.assertEqual(tarfs.gettext('foo.txt'), 'Hello, World')
+
+
 class TestTarFSio(ArchiveIOTestCases, unittest.TestCase):
 
     compress = staticmethod(tar_compress)
@@ -162,6 +300,18 @@ class TestTarFSInferredDirectories(unittest.TestCase):
         self.assertEqual(self.fs.listdir("foo/bar/baz"), ["spam.txt"])
         self.assertEqual(self.fs.listdir("foo/yolk"), ["beans.txt"])
 
+    def test_exists(self):
+        self.assertTrue(self.fs.exists("/"))
+        self.assertTrue(self.fs.exists("foo"))
+        self.assertTrue(self.fs.exists("foo/bar/baz"))
+        self.assertTrue(self.fs.exists("foo/bar/baz/spam.txt"))
+        self.assertFalse(self.fs.exists("foo/ba"))
+        self.assertFalse(self.fs.exists("foo/eggs.bin/baz"))
+
+    def test_listdir_errors(self):
+        self.assertRaises(fs.errors.ResourceNotFound, self.fs.listdir, "foo/nothere")
+        self.assertRaises(fs.errors.DirectoryExpected, self.fs.listdir, "foo/eggs.bin")
+
     def test_getinfo(self):
         info = self.fs.getinfo("foo/bar/baz", namespaces=UniversalContainer())
         self.assertEqual(info.name, "baz")
@@ -210,3 +360,233 @@ class TestTarFSReadFromTarCFDotSlashName(unittest.TestCase):
 
         sub = self.tarfs.getinfo('sub')
         self.assertEqual(sub.raw, {'basic': {'is_dir': True, 'name': 'sub'}})
+
+
+class TestTarFSSidecarIndex(TempDirMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(TestTarFSSidecarIndex, self).setUp()
+        self.archive = os.path.join(self.tempdir, 'test.tar.gz')
+        self.index = '{}.fsindex'.format(self.archive)
+        self._build_archive(['foo/bar.txt', 'foo/baz/spam.txt', 'eggs.bin'])
+
+    def _build_archive(self, names):
+        with tarfile.open(self.archive, mode="w:gz") as tf:
+            for name in names:
+                data = name.encode('utf-8')
+                info = tarfile.TarInfo(name)
+                info.size = len(data)
+                info.mtime = 1500000000
+                tf.addfile(info, io.BytesIO(data))
+
+    def test_index_created(self):
+        self.assertFalse(os.path.exists(self.index))
+        with fs.archive.tarfs.TarReadFS(self.archive) as tarfs:
+            self.assertTrue(tarfs.exists('foo/bar.txt'))
+        self.assertFalse(os.path.exists(self.index))
+        with fs.archive.tarfs.TarReadFS(self.archive, index=True) as tarfs:
+            self.assertTrue(tarfs.exists('foo/bar.txt'))
+        self.assertTrue(os.path.exists(self.index))
+
+    def test_index_reused(self):
+        with fs.archive.tarfs.TarReadFS(self.archive, index=True) as tarfs:
+            expected = {
+                path: tarfs.getinfo(path, ['details', 'access', 'tar']).raw
+                for path in tarfs.walk.files()
+            }
+        getmembers = tarfile.TarFile.getmembers
+        try:
+            tarfile.TarFile.getmembers = None
+            with fs.archive.tarfs.TarReadFS(self.archive, index=True) as tarfs:
+                actual = {
+                    path: tarfs.getinfo(path, ['details', 'access', 'tar']).raw
+                    for path in tarfs.walk.files()
+                }
+                self.assertEqual(tarfs.getbytes('foo/baz/spam.txt'), b'foo/baz/spam.txt')
+        finally:
+            tarfile.TarFile.getmembers = getmembers
+        self.assertEqual(actual, expected)
+
+    def test_index_invalidated(self):
+        with fs.archive.tarfs.TarReadFS(self.archive, index=True) as tarfs:
+            self.assertFalse(tarfs.exists('new.txt'))
+        self._build_archive(['new.txt'])
+        with fs.archive.tarfs.TarReadFS(self.archive, index=True) as tarfs:
+            self.assertEqual(tarfs.listdir('/'), ['new.txt'])
+            self.assertEqual(tarfs.getbytes('new.txt'), b'new.txt')
+
+    def test_index_explicit_path(self):
+        index = os.path.join(self.tempdir, 'custom.idx')
+        with fs.archive.tarfs.TarReadFS(self.archive, index=index) as tarfs:
+            self.assertTrue(tarfs.isdir('foo/baz'))
+        self.assertTrue(os.path.exists(index))
+        self.assertFalse(os.path.exists(self.index))
+
+
+class TestTarFSRawCopy(TempDirMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(TestTarFSRawCopy, self).setUp()
+        self.data = os.urandom(1000)
+
+    def _build_archive(self, name, mode):
+        archive = os.path.join(self.tempdir, name)
+        with tarfile.open(archive, mode=mode) as tf:
+            for name in ('foo/bar.bin', 'foo/{}.bin'.format('x' * 120), 'spam.txt'):
+                info = tarfile.TarInfo(name)
+                info.size = len(self.data)
+                info.mtime = 1500000000
+                tf.addfile(info, io.BytesIO(self.data))
+        return archive
+
+    def _raw_members(self, archive):
+        with tarfile.open(archive) as tf:
+            with open(archive, 'rb') as f:
+                raw = {}
+                for member in tf.getmembers():
+                    f.seek(member.offset)
+                    raw[member.name] = f.read(member.offset_data - member.offset + member.size)
+                return raw
+
+    def _check_saved(self, archive):
+        openbin = fs.archive.tarfs.TarReadFS.openbin
+        opened = []
+        def _openbin(self, path, *args, **kwargs):
+            opened.append(path)
+            return openbin(self, path, *args, **kwargs)
+        fs.archive.tarfs.TarReadFS.openbin = _openbin
+        try:
+            with fs.archive.tarfs.TarFS(archive) as tarfs:
+                tarfs.setbytes('spam.txt', b'eggs')
+                tarfs.setbytes('new.txt', b'new')
+        finally:
+            fs.archive.tarfs.TarReadFS.openbin = openbin
+        self.assertEqual([path for path in opened if path.startswith('/foo')], [])
+        with tarfile.open(archive) as tf:
+            names = tf.getnames()
+            self.assertEqual(sorted(names), sorted(
+                ['foo', 'foo/bar.bin', 'foo/{}.bin'.format('x' * 120), 'new.txt', 'spam.txt']))
+            self.assertEqual(tf.extractfile('foo/bar.bin').read(), self.data)
+            self.assertEqual(tf.extractfile('spam.txt').read(), b'eggs')
+            self.assertEqual(tf.getmember('foo/bar.bin').mtime, 1500000000)
+
+    def test_uncompressed_copied_raw(self):
+        archive = self._build_archive('test.tar', 'w:')
+        expected = self._raw_members(archive)
+        self._check_saved(archive)
+        actual = self._raw_members(archive)
+        for name in ('foo/bar.bin', 'foo/{}.bin'.format('x' * 120)):
+            self.assertEqual(actual[name], expected[name])
+
+    def test_compressed_streamed_in_order(self):
+        archive = self._build_archive('test.tar.gz', 'w:gz')
+        self._check_saved(archive)
+
+
+class TestTarFSAppend(TempDirMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(TestTarFSAppend, self).setUp()
+        patcher = mock.patch.object(
+            fs.archive.base.shutil, 'move', wraps=shutil.move)
+        self.move = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _build_archive(self, name, mode):
+        archive = os.path.join(self.tempdir, name)
+        with tarfile.open(archive, mode=mode) as tf:
+            for name in ('foo/bar.txt', 'spam.txt'):
+                info = tarfile.TarInfo(name)
+                info.size = 1000
+                tf.addfile(info, io.BytesIO(b'x' * 1000))
+            members_end = tf.offset
+        return archive, members_end
+
+    def test_additions_appended(self):
+        archive, members_end = self._build_archive('test.tar', 'w:')
+        with open(archive, 'rb') as f:
+            members = f.read(members_end)
+        with fs.archive.tarfs.TarFS(archive, update='append') as tarfs:
+            tarfs.makedir('eggs')
+            tarfs.setbytes('eggs/new.bin', b'new')
+        self.move.assert_not_called()
+        with open(archive, 'rb') as f:
+            self.assertEqual(f.read(members_end), members)
+        self.assertEqual(os.path.getsize(archive) % tarfile.RECORDSIZE, 0)
+        with tarfile.open(archive) as tf:
+            self.assertEqual(
+                tf.getnames(), ['foo/bar.txt', 'spam.txt', 'eggs', 'eggs/new.bin'])
+            self.assertEqual(tf.extractfile('eggs/new.bin').read(), b'new')
+
+    def test_additions_rewritten_by_default(self):
+        archive, _ = self._build_archive('test.tar', 'w:')
+        with fs.archive.tarfs.TarFS(archive) as tarfs:
+            tarfs.setbytes('new.bin', b'new')
+        self.move.assert_called_once_with(mock.ANY, archive)
+        with tarfile.open(archive) as tf:
+            self.assertEqual(
+                sorted(tf.getnames()), ['foo', 'foo/bar.txt', 'new.bin', 'spam.txt'])
+
+    def test_append_failure_rewritten(self):
+        write_entry = fs.archive.tarfs.TarSaver._write_entry
+        failed = []
+        def fail_once(saver, *args):
+            if not failed:
+                failed.append(args)
+                raise IOError("disk full")
+            return write_entry(saver, *args)
+        patcher = mock.patch.object(
+            fs.archive.tarfs.TarSaver, '_write_entry',
+            autospec=True, side_effect=fail_once)
+        archive, _ = self._build_archive('test.tar', 'w:')
+        with patcher, fs.archive.tarfs.TarFS(archive, update='append') as tarfs:
+            tarfs.setbytes('new.bin', b'new')
+        self.assertTrue(failed)
+        self.move.assert_called_once_with(mock.ANY, archive)
+        with tarfile.open(archive) as tf:
+            self.assertEqual(
+                sorted(tf.getnames()), ['foo', 'foo/bar.txt', 'new.bin', 'spam.txt'])
+            self.assertEqual(tf.extractfile('spam.txt').read(), b'x' * 1000)
+
+    def test_compressed_rewritten(self):
+        archive, _ = self._build_archive('test.tar.gz', 'w:gz')
+        with fs.archive.tarfs.TarFS(archive, update='append') as tarfs:
+            tarfs.setbytes('new.bin', b'new')
+        self.move.assert_called_once_with(mock.ANY, archive)
+        with tarfile.open(archive) as tf:
+            self.assertEqual(tf.extractfile('new.bin').read(), b'new')
+            self.assertEqual(tf.extractfile('spam.txt').read(), b'x' * 1000)
+
+
+class TestTarFSSaverOptions(TempDirMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(TestTarFSSaverOptions, self).setUp()
+
+    def test_compression_from_extension(self):
+        archive = os.path.join(self.tempdir, 'test.tar.gz')
+        with fs.archive.tarfs.TarFS(archive) as tarfs:
+            tarfs.settext('foo.txt', 'Hello, World')
+        with tarfile.open(archive, mode='r:gz') as tf:
+            self.assertEqual(tf.getnames(), ['foo.txt'])
+
+    @unittest.skipUnless(fs.archive.tarfs.blocks.lzma, "lzma not available")
+    def test_block_size(self):
+        archive = os.path.join(self.tempdir, 'test.tar.xz')
+        with fs.archive.tarfs.TarFS(archive, block_size=1024, workers=2) as tarfs:
+            tarfs.setbytes('foo.bin', b'\x00' * 10000)
+        with open(archive, 'rb') as f:
+            blocks = fs.archive.tarfs.blocks.xz_blocks(f)
+        self.assertGreater(len(blocks), 1)
+        with fs.archive.tarfs.TarFS(archive) as tarfs:
+            self.assertEqual(tarfs.getbytes('foo.bin'), b'\x00' * 10000)
+
+    def test_block_size_gzip(self):
+        archive = os.path.join(self.tempdir, 'test.tar.gz')
+        with fs.archive.tarfs.TarFS(archive, block_size=1024, workers=2) as tarfs:
+            tarfs.setbytes('foo.bin', b'\x00' * 10000)
+        with open(archive, 'rb') as f:
+            blocks = fs.archive.tarfs.blocks.gz_blocks(f)
+        self.assertGreater(len(blocks), 1)
+        with tarfile.open(archive, mode='r:gz') as tf:
+            self.assertEqual(tf.extractfile('foo.bin').read(), b'\x00' * 10000)
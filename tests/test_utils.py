@@ -13,6 +13,8 @@ except ImportError:
     import mock
 
 from fs.archive import _utils
+from fs.archive import _journal
+from fs.archive import _table
 
 
 class TestUtils(unittest.TestCase):
@@ -58,3 +60,101 @@ class TestUtils(unittest.TestCase):
         c = _utils.UniversalContainer()
         self.assertIn(1, c)
         self.assertIn(None, c)
+
+
+class TestMemberTable(unittest.TestCase):
+
+    def setUp(self):
+        self.table = _table.MemberTable()
+        self.table.add('foo/bar/baz.txt', 0)
+        self.table.add('foo/eggs', 1, is_dir=True)
+        self.table.add('foo/bar/baz.txt', 2)
+        self.table.add('spam', 3)
+        self.table.add('foo/bar/eggs', 4)
+        self.table.freeze()
+
+    def test_lookup(self):
+        self.assertEqual(self.table.lookup('/'), 0)
+        self.assertEqual(self.table.lookup(''), 0)
+        for path in ('foo', '/foo/bar', 'foo/bar/baz.txt', '/spam'):
+            self.assertIsNotNone(self.table.lookup(path))
+        for path in ('bar', 'foo/baz.txt', 'foo/bar/baz.txt/x', 'zzz'):
+            self.assertIsNone(self.table.lookup(path))
+
+    def test_rows(self):
+        self.assertEqual(self.table.row(self.table.lookup('foo')), -1)
+        self.assertEqual(self.table.row(self.table.lookup('foo/bar/baz.txt')), 2)
+        self.assertEqual(self.table.row(self.table.lookup('foo/eggs')), 1)
+
+    def test_isdir(self):
+        self.assertTrue(self.table.isdir(0))
+        self.assertTrue(self.table.isdir(self.table.lookup('foo/bar')))
+        self.assertTrue(self.table.isdir(self.table.lookup('foo/eggs')))
+        self.assertFalse(self.table.isdir(self.table.lookup('spam')))
+
+    def test_children(self):
+        names = lambda path: [
+            self.table.name(node)
+            for node in self.table.children(self.table.lookup(path))
+        ]
+        self.assertEqual(names('/'), ['foo', 'spam'])
+        self.assertEqual(names('foo'), ['bar', 'eggs'])
+        self.assertEqual(names('foo/bar'), ['baz.txt', 'eggs'])
+        self.assertEqual(names('foo/eggs'), [])
+
+    def test_interned(self):
+        eggs = [
+            self.table.name(self.table.lookup(path))
+            for path in ('foo/eggs', 'foo/bar/eggs')
+        ]
+        self.assertIs(eggs[0], eggs[1])
+
+
+class TestJournal(unittest.TestCase):
+
+    def setUp(self):
+        original = {'/foo', '/foo/bar', '/foo/bar/baz.txt', '/spam.txt'}
+        self.journal = _journal.Journal(original.__contains__)
+
+    def test_unchanged(self):
+        self.assertFalse(self.journal)
+        self.assertIsNone(self.journal.change('/spam.txt'))
+        self.assertEqual(self.journal.source('/spam.txt'), '/spam.txt')
+        self.assertIsNone(self.journal.source('/eggs.txt'))
+
+    def test_write(self):
+        self.journal.write('/spam.txt')
+        self.journal.write('/eggs.txt')
+        self.assertEqual(self.journal.modified(), ['/spam.txt'])
+        self.assertEqual(self.journal.added(), ['/eggs.txt'])
+        self.assertIsNone(self.journal.source('/spam.txt'))
+        self.journal.remove('/eggs.txt')
+        self.assertEqual(self.journal.added(), [])
+        self.assertEqual(len(self.journal), 1)
+
+    def test_setinfo(self):
+        self.journal.setinfo('/spam.txt')
+        self.assertEqual(self.journal.metadata(), ['/spam.txt'])
+        self.assertEqual(self.journal.source('/spam.txt'), '/spam.txt')
+        self.journal.write('/spam.txt')
+        self.journal.setinfo('/spam.txt')
+        self.assertEqual(self.journal.change('/spam.txt'), _journal.MODIFIED)
+
+    def test_removed_collapsed(self):
+        for path in ('/foo/bar/baz.txt', '/foo/bar', '/foo'):
+            self.journal.remove(path)
+        self.assertEqual(self.journal.removed(), ['/foo'])
+        self.assertEqual(self.journal.change('/foo/bar/baz.txt'), _journal.REMOVED)
+        self.journal.write('/foo')
+        self.assertEqual(self.journal.removed(), ['/foo/bar'])
+        self.assertEqual(self.journal.modified(), ['/foo'])
+
+    def test_rename(self):
+        self.journal.remove('/spam.txt')
+        self.journal.rename('/eggs.txt', '/spam.txt')
+        self.assertEqual(self.journal.renamed(), [('/eggs.txt', '/spam.txt')])
+        self.assertEqual(self.journal.source('/eggs.txt'), '/spam.txt')
+        self.journal.remove('/eggs.txt')
+        self.journal.rename('/spam.txt', '/spam.txt')
+        self.assertEqual(self.journal.renamed(), [])
+        self.assertEqual(self.journal.metadata(), ['/spam.txt'])
@@ -93,3 +93,43 @@ class TestWrapWritable(FSTestCases, unittest.TestCase):
             f.seek(0)
             f.write(b'test should work')
         self.assertEqual(self.wfs.gettext('test.txt'), 'test should work')
+
+    def test_dirty(self):
+        self.sfs.settext('root.txt', 'root file')
+        wrapped_fs = WrapWritable(WrapReadOnly(self.sfs))
+        self.assertFalse(wrapped_fs._dirty)
+        self.assertEqual(wrapped_fs.gettext('root.txt'), 'root file')
+        wrapped_fs.makedir('foo', recreate=True)
+        self.assertFalse(wrapped_fs._dirty)
+        wrapped_fs.settext('root.txt', 'other text')
+        self.assertTrue(wrapped_fs._dirty)
+        for action in (
+            lambda fs: fs.remove('root.txt'),
+            lambda fs: fs.removedir('foo/bar'),
+            lambda fs: fs.makedir('bar'),
+            lambda fs: fs.appendtext('root.txt', 'abc'),
+            lambda fs: fs.settimes('root.txt'),
+        ):
+            wrapped_fs = WrapWritable(WrapReadOnly(self.sfs))
+            action(wrapped_fs)
+            self.assertTrue(wrapped_fs._dirty)
+
+    def test_journal(self):
+        self.sfs.makedirs('foo/bar', recreate=True)
+        self.sfs.settext('foo/bar/baz.txt', 'baz')
+        self.sfs.settext('root.txt', 'root file')
+        self.sfs.settext('other.txt', 'other file')
+        wrapped_fs = WrapWritable(WrapReadOnly(self.sfs))
+        wrapped_fs.move('root.txt', 'moved.txt')
+        wrapped_fs.move('moved.txt', 'renamed.txt')
+        wrapped_fs.settimes('other.txt')
+        wrapped_fs.removetree('foo')
+        wrapped_fs.settext('new.txt', 'new')
+        journal = wrapped_fs._journal
+        self.assertEqual(journal.renamed(), [('/renamed.txt', '/root.txt')])
+        self.assertEqual(journal.metadata(), ['/other.txt'])
+        self.assertEqual(journal.removed(), ['/foo', '/root.txt'])
+        self.assertEqual(journal.added(), ['/new.txt'])
+        self.assertEqual(wrapped_fs._source('renamed.txt'), '/root.txt')
+        self.assertFalse(wrapped_fs._unchanged('other.txt'))
+        self.assertIsNone(wrapped_fs._added())
@@ -4,21 +4,39 @@ from __future__ import unicode_literals
 
 import os
 import io
+import random
+import shutil
+import sys
+import datetime
+import functools
 import zipfile
+import zlib
 import tempfile
+import threading
 import unittest
 
 from six.moves import filterfalse
 
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
 import fs.test
 import fs.wrap
 import fs.errors
 import fs.memoryfs
+import fs.archive.base
 import fs.archive.zipfs
+import fs.archive.zipfs.iotools
+import fs.archive._index
+import fs.archive._inflate
 
 from fs.path import relpath, join, forcedir, abspath, recursepath
 from fs.archive.test import ArchiveReadTestCases, ArchiveIOTestCases
 
+from . import TempDirMixin
+
 
 FS_VERSION = tuple(map(int, fs.__version__.split('.')))
 
@@ -68,6 +86,529 @@ class TestZipReadFS(ArchiveReadTestCases, unittest.TestCase):
         handle = io.BytesIO()
         super(TestZipReadFS, self).setUp(handle)
 
+    def test_concurrent_reads(self):
+        results = {}
+        def read(path):
+            with self.fs.openbin(path) as f:
+                results[path] = [f.read(3), f.read()]
+        threads = [
+            threading.Thread(target=read, args=(path,))
+            for path in ('top.txt', 'foo/bar/egg', 'unicode/text.txt')
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        for path, chunks in results.items():
+            self.assertEqual(b''.join(chunks), self.source_fs.readbytes(path))
+
+    def test_getbuffer(self):
+        buffer = self.fs.getbuffer('unicode/text.txt')
+        self.assertIsInstance(buffer, memoryview)
+        self.assertEqual(buffer.tobytes(), self.source_fs.readbytes('unicode/text.txt'))
+        self.assertRaises(fs.errors.FileExpected, self.fs.getbuffer, 'foo')
+        self.assertRaises(fs.errors.ResourceNotFound, self.fs.getbuffer, 'nothere')
+
+    @unittest.skipIf(sys.version_info < (3, 7), "ZipExtFile.seek requires Python 3.7")
+    def test_seek_member(self):
+        with self.fs.openbin('unicode/text.txt') as f:
+            f.seek(10)
+            tail = f.read()
+            f.seek(0)
+            self.assertEqual(f.read()[10:], tail)
+
+
+class TestZipReadFSFile(TestZipReadFS):
+
+    @staticmethod
+    def remove_archive(handle):
+        handle.close()
+        os.remove(handle.name)
+
+    def setUp(self):
+        fd, path = tempfile.mkstemp(suffix='.zip')
+        os.close(fd)
+        super(TestZipReadFS, self).setUp(io.open(path, 'w+b'))
+
+    @unittest.skipUnless(hasattr(os, 'pread'), 'os.pread not available')
+    def test_positional_reads(self):
+        self.assertIsNotNone(self.fs._fileno)
+        # reading must not wait for the lock of the shared handle
+        acquired, release = threading.Event(), threading.Event()
+        def hold():
+            with self.fs._lock:
+                acquired.set()
+                release.wait()
+        thread = threading.Thread(target=hold)
+        thread.start()
+        acquired.wait()
+        try:
+            self.assertEqual(self.fs.getbytes('foo/bar/egg'), b'foofoo')
+        finally:
+            release.set()
+            thread.join()
+
+    @unittest.skipUnless(hasattr(os, 'pread'), 'os.pread not available')
+    def test_stored_memory_map(self):
+        data = os.urandom(10000)
+        with zipfile.ZipFile(self.handle.name, 'w', zipfile.ZIP_STORED) as zf:
+            zf.writestr('a.bin', data)
+            zf.writestr('b.bin', data, zipfile.ZIP_DEFLATED)
+        zipfs = fs.archive.zipfs.ZipReadFS(self.handle.name)
+        with zipfs:
+            with zipfs.openbin('a.bin') as f:
+                self.assertIsInstance(f._f, fs.archive.zipfs.iotools.MemoryReader)
+                buffer = bytearray(4000)
+                self.assertEqual(f.readinto(buffer), 4000)
+                self.assertEqual(bytes(buffer), data[:4000])
+                f.seek(-100, 2)
+                self.assertEqual(f.read(), data[-100:])
+            buffer = zipfs.getbuffer('a.bin')
+            self.assertIs(buffer.obj, zipfs._mmap)
+            self.assertEqual(buffer.tobytes(), data)
+            with zipfs.openbin('b.bin') as f:
+                self.assertNotIsInstance(f._f, fs.archive.zipfs.iotools.MemoryReader)
+        self.assertEqual(buffer.tobytes(), data)
+
+    def test_close_create_failed(self):
+        opened = []
+        def dump_members(zipfs, infolist):
+            opened.append(zipfs)
+            raise ValueError(infolist)
+        with mock.patch.object(
+                fs.archive.zipfs.ZipReadFS, '_dump_members',
+                autospec=True, side_effect=dump_members):
+            with self.assertRaises(fs.errors.CreateFailed):
+                fs.archive.zipfs.ZipReadFS(self.handle.name)
+        opened[0].close()
+        self.assertTrue(opened[0].isclosed())
+
+
+class TestZipReadFSCheckpoints(TestZipReadFS):
+
+    _archive_read_fs = staticmethod(functools.partial(
+        fs.archive.zipfs.ZipReadFS, checkpoint_interval=1024))
+
+    def test_checkpoint_reader(self):
+        with self.fs.openbin('unicode/text.txt') as f:
+            self.assertIsInstance(f._f, fs.archive._inflate.CheckpointReader)
+
+    def test_random_access(self):
+        rng = random.Random(42)
+        data = bytes(bytearray(rng.randrange(256) for _ in range(50000)))
+        handle = io.BytesIO()
+        with zipfile.ZipFile(handle, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('a.bin', data)
+            zf.writestr('b.bin', data, zipfile.ZIP_STORED)
+        handle.seek(0)
+        zipfs = fs.archive.zipfs.ZipReadFS(
+            handle, checkpoint_interval=2048, max_checkpoints=8)
+        with zipfs:
+            # stored members are read with `ZipExtFile`, which can only
+            # seek since Python 3.7
+            names = ('a.bin', 'b.bin') if sys.version_info >= (3, 7) else ('a.bin',)
+            for name in names:
+                with zipfs.openbin(name) as f:
+                    for _ in range(20):
+                        start = rng.randrange(len(data))
+                        f.seek(start)
+                        self.assertEqual(f.read(1000), data[start:start+1000])
+                    f.seek(-10, 2)
+                    self.assertEqual(f.read(), data[-10:])
+            with zipfs.openbin('a.bin') as f:
+                f.read()
+                self.assertLessEqual(len(f._f._checkpoints), 8)
+                self.assertGreater(len(f._f._checkpoints), 1)
+
+    def test_raw_deflate_single_stream(self):
+        data = b'spam' * 1000
+        deflate = zlib.compressobj(9, zlib.DEFLATED, -zlib.MAX_WBITS)
+        gzip = zlib.compressobj(9, zlib.DEFLATED, zlib.MAX_WBITS | 16)
+        handle = io.BytesIO(
+            deflate.compress(data) + deflate.flush()
+            + gzip.compress(b'eggs') + gzip.flush())
+        reader = fs.archive._inflate.CheckpointReader(
+            handle, wbits=-zlib.MAX_WBITS, interval=1024)
+        self.assertEqual(reader.read(), data)
+
+
+class TestZipFSSidecarIndex(TempDirMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(TestZipFSSidecarIndex, self).setUp()
+        self.archive = os.path.join(self.tempdir, 'test.zip')
+        self.index = '{}.fsindex'.format(self.archive)
+        self._build_archive(['foo/bar.txt', 'foo/baz/spam.txt', 'eggs.bin', 'empty/'])
+
+    def _build_archive(self, names):
+        with zipfile.ZipFile(self.archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+            for name in names:
+                info = zipfile.ZipInfo(name, (2017, 7, 14, 2, 40, 1))
+                info.comment = b'comment'
+                zf.writestr(info, name.encode('utf-8'), zipfile.ZIP_DEFLATED)
+
+    def test_index_created(self):
+        with fs.archive.zipfs.ZipReadFS(self.archive) as zipfs:
+            self.assertTrue(zipfs.exists('foo/bar.txt'))
+        self.assertFalse(os.path.exists(self.index))
+        with fs.archive.zipfs.ZipReadFS(self.archive, index=True) as zipfs:
+            self.assertTrue(zipfs.exists('foo/bar.txt'))
+        self.assertTrue(os.path.exists(self.index))
+
+    def test_index_reused(self):
+        with fs.archive.zipfs.ZipReadFS(self.archive, index=True) as zipfs:
+            expected = {
+                path: zipfs.getinfo(path, ['details', 'zip']).raw
+                for path in zipfs.walk.files()
+            }
+        ZipFile = zipfile.ZipFile
+        try:
+            zipfile.ZipFile = None
+            with fs.archive.zipfs.ZipReadFS(self.archive, index=True) as zipfs:
+                actual = {
+                    path: zipfs.getinfo(path, ['details', 'zip']).raw
+                    for path in zipfs.walk.files()
+                }
+                self.assertTrue(zipfs.isempty('empty'))
+                self.assertEqual(zipfs.getbytes('foo/baz/spam.txt'), b'foo/baz/spam.txt')
+        finally:
+            zipfile.ZipFile = ZipFile
+        self.assertEqual(actual, expected)
+
+    def test_index_invalidated(self):
+        with fs.archive.zipfs.ZipReadFS(self.archive, index=True) as zipfs:
+            self.assertFalse(zipfs.exists('new.txt'))
+        self._build_archive(['new.txt'])
+        with fs.archive.zipfs.ZipReadFS(self.archive, index=True) as zipfs:
+            self.assertEqual(zipfs.listdir('/'), ['new.txt'])
+            self.assertEqual(zipfs.getbytes('new.txt'), b'new.txt')
+
+    def test_index_truncated(self):
+        with fs.archive.zipfs.ZipReadFS(self.archive, index=True) as zipfs:
+            self.assertTrue(zipfs.exists('foo/bar.txt'))
+        with open(self.index, 'rb+') as f:
+            f.truncate(os.path.getsize(self.index) - 8)
+        with open(self.archive, 'rb') as f:
+            key = fs.archive._index.archive_key(f)
+        self.assertIsNone(fs.archive._index.load_index(self.index, 'zip', key))
+        with fs.archive.zipfs.ZipReadFS(self.archive, index=True) as zipfs:
+            self.assertEqual(zipfs.getbytes('foo/bar.txt'), b'foo/bar.txt')
+
+    def test_index_explicit_path(self):
+        index = os.path.join(self.tempdir, 'custom.idx')
+        with fs.archive.zipfs.ZipReadFS(self.archive, index=index) as zipfs:
+            self.assertTrue(zipfs.isdir('foo/baz'))
+        self.assertTrue(os.path.exists(index))
+        self.assertFalse(os.path.exists(self.index))
+
+    def test_names_rebuilt(self):
+        info = zipfile.ZipInfo('nul.txt')
+        info.filename = 'nul.txt\x00garbage'
+        with zipfile.ZipFile(self.archive, 'a') as zf:
+            zf.writestr(info, b'nul')
+        for _ in range(2):
+            with fs.archive.zipfs.ZipReadFS(self.archive, index=True) as zipfs:
+                self.assertNotIn('filename_data', zipfs._columns)
+                self.assertIn('nul.txt', zipfs.listdir('/'))
+                self.assertEqual(zipfs.getbytes('nul.txt'), b'nul')
+                zip_info = zipfs._get_zip_info('nul.txt')
+                self.assertEqual(zip_info.filename, 'nul.txt')
+                self.assertEqual(zip_info.orig_filename, 'nul.txt\x00garbage')
+
+
+class TestZipFSRawCopy(TempDirMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(TestZipFSRawCopy, self).setUp()
+        self.archive = os.path.join(self.tempdir, 'test.zip')
+        self.data = os.urandom(10000) + b'x' * 50000
+        with zipfile.ZipFile(self.archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('foo/bar.bin', self.data)
+            zf.writestr('foo/stored.bin', self.data, zipfile.ZIP_STORED)
+            zf.writestr('spam.txt', b'spam')
+
+    def _raw_data(self, name):
+        with zipfile.ZipFile(self.archive) as zf:
+            info = zf.getinfo(name)
+        with open(self.archive, 'rb') as f:
+            offset = fs.archive.zipfs.iotools.data_offset(info, f)
+            f.seek(offset)
+            return f.read(info.compress_size)
+
+    def test_unchanged_copied_raw(self):
+        expected = {name: self._raw_data(name) for name in ('foo/bar.bin', 'foo/stored.bin')}
+        open_member = fs.archive.zipfs.open_member
+        opened = []
+        def _open_member(zinfo, *args, **kwargs):
+            opened.append(zinfo.filename)
+            return open_member(zinfo, *args, **kwargs)
+        fs.archive.zipfs.open_member = _open_member
+        try:
+            with fs.archive.zipfs.ZipFS(self.archive) as zipfs:
+                zipfs.writetext('spam.txt', 'eggs')
+                zipfs.writetext('new.txt', 'new')
+        finally:
+            fs.archive.zipfs.open_member = open_member
+        self.assertNotIn('foo/bar.bin', opened)
+        self.assertNotIn('foo/stored.bin', opened)
+        for name, raw in expected.items():
+            self.assertEqual(self._raw_data(name), raw)
+        with zipfile.ZipFile(self.archive) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.read('foo/bar.bin'), self.data)
+            self.assertEqual(zf.read('foo/stored.bin'), self.data)
+            self.assertEqual(zf.read('spam.txt'), b'eggs')
+            self.assertEqual(zf.read('new.txt'), b'new')
+
+    def test_renamed_copied_raw(self):
+        expected = self._raw_data('foo/bar.bin')
+        open_member = fs.archive.zipfs.open_member
+        opened = []
+        def _open_member(zinfo, *args, **kwargs):
+            opened.append(zinfo.filename)
+            return open_member(zinfo, *args, **kwargs)
+        fs.archive.zipfs.open_member = _open_member
+        try:
+            with fs.archive.zipfs.ZipFS(self.archive) as zipfs:
+                zipfs.move('foo/bar.bin', 'bar.bin')
+                zipfs.settimes('foo/stored.bin', datetime.datetime(2001, 2, 3, 4, 5, 6))
+                zipfs.writebytes('new.bin', os.urandom(100000))
+                # changing metadata copies the file to the overlay,
+                # which opens the member when there is no memory map
+                del opened[:]
+        finally:
+            fs.archive.zipfs.open_member = open_member
+        self.assertNotIn('foo/stored.bin', opened)
+        self.assertEqual(self._raw_data('bar.bin'), expected)
+        with zipfile.ZipFile(self.archive) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.read('bar.bin'), self.data)
+            self.assertEqual(zf.getinfo('foo/stored.bin').date_time, (2001, 2, 3, 4, 5, 6))
+            self.assertNotIn('foo/bar.bin', zf.namelist())
+
+    def test_removed_and_modified(self):
+        with fs.archive.zipfs.ZipFS(self.archive) as zipfs:
+            zipfs.remove('foo/stored.bin')
+            zipfs.appendbytes('foo/bar.bin', b'tail')
+        with zipfile.ZipFile(self.archive) as zf:
+            self.assertEqual(sorted(zf.namelist()), ['foo/bar.bin', 'spam.txt'])
+            self.assertEqual(zf.read('foo/bar.bin'), self.data + b'tail')
+            self.assertEqual(zf.read('spam.txt'), b'spam')
+
+
+class TestZipFSAppend(TempDirMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(TestZipFSAppend, self).setUp()
+        self.archive = os.path.join(self.tempdir, 'test.zip')
+        with zipfile.ZipFile(self.archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('foo/bar.txt', b'bar')
+            zf.writestr('spam.txt', b'spam')
+            self.members_end = zf.fp.tell()
+        patcher = mock.patch.object(
+            fs.archive.base.shutil, 'move', wraps=shutil.move)
+        self.move = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_additions_appended(self):
+        with open(self.archive, 'rb') as f:
+            members = f.read(self.members_end)
+        with fs.archive.zipfs.ZipFS(self.archive, update='append') as zipfs:
+            zipfs.writetext('foo/new.txt', 'new')
+            zipfs.makedirs('eggs/empty')
+        self.move.assert_not_called()
+        with open(self.archive, 'rb') as f:
+            self.assertEqual(f.read(self.members_end), members)
+        with zipfile.ZipFile(self.archive) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(
+                zf.namelist(),
+                ['foo/bar.txt', 'spam.txt', 'eggs/', 'eggs/empty/', 'foo/new.txt'])
+            self.assertEqual(zf.read('foo/new.txt'), b'new')
+
+    def test_additions_rewritten_by_default(self):
+        with fs.archive.zipfs.ZipFS(self.archive) as zipfs:
+            zipfs.writetext('foo/new.txt', 'new')
+        self.move.assert_called_once_with(mock.ANY, self.archive)
+        with zipfile.ZipFile(self.archive) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.read('foo/new.txt'), b'new')
+
+    def test_append_failure_rewritten(self):
+        patcher = mock.patch.object(
+            fs.archive.zipfs.ZipSaver, '_write_entries',
+            side_effect=IOError("disk full"))
+        with patcher, fs.archive.zipfs.ZipFS(self.archive, update='append') as zipfs:
+            zipfs.writetext('foo/new.txt', 'new')
+        self.move.assert_called_once_with(mock.ANY, self.archive)
+        with zipfile.ZipFile(self.archive) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(
+                sorted(zf.namelist()), ['foo/bar.txt', 'foo/new.txt', 'spam.txt'])
+            self.assertEqual(zf.read('spam.txt'), b'spam')
+
+    def test_unmodified_not_saved(self):
+        with open(self.archive, 'rb') as f:
+            contents = f.read()
+        with fs.archive.zipfs.ZipFS(self.archive) as zipfs:
+            self.assertEqual(zipfs.gettext('spam.txt'), 'spam')
+            zipfs.makedirs('foo', recreate=True)
+        self.move.assert_not_called()
+        with open(self.archive, 'rb') as f:
+            self.assertEqual(f.read(), contents)
+
+    def test_large_modification_rewritten(self):
+        data = os.urandom(10000)
+        with fs.archive.zipfs.ZipFS(self.archive, update='compact') as zipfs:
+            zipfs.writetext('new.txt', 'new')
+            zipfs.writebytes('spam.txt', data)
+        self.move.assert_called_once_with(mock.ANY, self.archive)
+        with zipfile.ZipFile(self.archive) as zf:
+            self.assertEqual(zf.read('spam.txt'), data)
+            self.assertEqual(zf.read('new.txt'), b'new')
+
+
+class _WriteOnly(object):
+
+    def __init__(self, handle):
+        self._handle = handle
+
+    def write(self, data):
+        return self._handle.write(data)
+
+    def flush(self):
+        self._handle.flush()
+
+
+class TestZipFSCompaction(TempDirMixin, unittest.TestCase):
+
+    def setUp(self):
+        super(TestZipFSCompaction, self).setUp()
+        self.archive = os.path.join(self.tempdir, 'test.zip')
+        self.data = {
+            'foo/bar.bin': os.urandom(5000),
+            'foo/baz.bin': os.urandom(5000),
+            'spam.txt': b'spam' * 100,
+            'eggs.bin': os.urandom(5000),
+        }
+        patcher = mock.patch.object(
+            fs.archive.base.shutil, 'move', wraps=shutil.move)
+        self.move = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def _build_archive(self, stream=False):
+        with open(self.archive, 'wb') as f:
+            # a non-seekable stream makes `zipfile` write data descriptors
+            handle = _WriteOnly(f) if stream else f
+            with zipfile.ZipFile(handle, 'w', zipfile.ZIP_DEFLATED) as zf:
+                for name, data in self.data.items():
+                    zf.writestr(name, data)
+
+    def _check_archive(self, expected):
+        with zipfile.ZipFile(self.archive) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(sorted(zf.namelist()), sorted(expected))
+            for name, data in expected.items():
+                self.assertEqual(zf.read(name), data)
+
+    def test_removed_compacted(self):
+        self._build_archive()
+        size = os.path.getsize(self.archive)
+        with fs.archive.zipfs.ZipFS(self.archive, update='compact') as zipfs:
+            zipfs.remove('foo/bar.bin')
+            zipfs.writebytes('spam.txt', b'eggs')
+        self.move.assert_not_called()
+        self.assertLess(os.path.getsize(self.archive), size - 5000)
+        del self.data['foo/bar.bin']
+        self.data['spam.txt'] = b'eggs'
+        self._check_archive(self.data)
+
+    def test_removed_with_holes(self):
+        self._build_archive()
+        with zipfile.ZipFile(self.archive) as zf:
+            offset = zf.getinfo('eggs.bin').header_offset
+        with fs.archive.zipfs.ZipFS(self.archive, update='holes') as zipfs:
+            zipfs.removetree('foo')
+        self.move.assert_not_called()
+        with zipfile.ZipFile(self.archive) as zf:
+            self.assertEqual(zf.getinfo('eggs.bin').header_offset, offset)
+        del self.data['foo/bar.bin']
+        del self.data['foo/baz.bin']
+        self._check_archive(self.data)
+
+    def test_removed_rewritten_by_default(self):
+        self._build_archive()
+        with fs.archive.zipfs.ZipFS(self.archive, update='append') as zipfs:
+            zipfs.remove('foo/bar.bin')
+        self.move.assert_called_once_with(mock.ANY, self.archive)
+        del self.data['foo/bar.bin']
+        self._check_archive(self.data)
+
+    def test_holes_failure_rewritten(self):
+        self._build_archive()
+        patcher = mock.patch.object(
+            fs.archive.zipfs.ZipSaver, '_write_entries',
+            side_effect=IOError("disk full"))
+        with patcher, fs.archive.zipfs.ZipFS(self.archive, update='holes') as zipfs:
+            zipfs.remove('foo/baz.bin')
+            zipfs.move('foo/bar.bin', 'bar.bin')
+        self.move.assert_called_once_with(mock.ANY, self.archive)
+        self.data['bar.bin'] = self.data.pop('foo/bar.bin')
+        del self.data['foo/baz.bin']
+        self.data['foo/'] = b''
+        self._check_archive(self.data)
+
+    def test_compact_failure_raised(self):
+        self._build_archive()
+        with zipfile.ZipFile(self.archive) as zf:
+            first = min(self.data, key=lambda name: zf.getinfo(name).header_offset)
+        patcher = mock.patch.object(
+            fs.archive.zipfs.ZipSaver, '_write_entries',
+            side_effect=IOError("disk full"))
+        zipfs = fs.archive.zipfs.ZipFS(self.archive, update='compact')
+        zipfs.remove(first)
+        with patcher:
+            self.assertRaises(IOError, zipfs.close)
+        self.move.assert_not_called()
+        zipfs._saver = None
+        zipfs.close()
+
+    @unittest.skipUnless(hasattr(os, 'pread'), 'os.pread not available')
+    def test_exported_buffer_rewritten(self):
+        self.data['stored.bin'] = os.urandom(5000)
+        with zipfile.ZipFile(self.archive, 'w', zipfile.ZIP_STORED) as zf:
+            for name, data in self.data.items():
+                zf.writestr(name, data)
+        with fs.archive.zipfs.ZipFS(self.archive, update='compact') as zipfs:
+            buffer = zipfs.delegate_fs()._rfs.getbuffer('stored.bin')
+            zipfs.remove('foo/bar.bin')
+        self.move.assert_called_once_with(mock.ANY, self.archive)
+        self.assertEqual(buffer.tobytes(), self.data['stored.bin'])
+        del self.data['foo/bar.bin']
+        self._check_archive(self.data)
+
+    def test_dotslash_member_kept(self):
+        with zipfile.ZipFile(self.archive, 'w', zipfile.ZIP_DEFLATED) as zf:
+            zf.writestr('./x.txt', b'x' * 5000)
+            zf.writestr('bar.bin', self.data['foo/bar.bin'])
+            zf.writestr('spam.txt', b'spam')
+        with fs.archive.zipfs.ZipFS(self.archive, update='compact') as zipfs:
+            zipfs.remove('bar.bin')
+        self.move.assert_not_called()
+        with zipfile.ZipFile(self.archive) as zf:
+            self.assertIsNone(zf.testzip())
+            self.assertEqual(zf.namelist(), ['./x.txt', 'spam.txt'])
+            self.assertEqual(zf.read('./x.txt'), b'x' * 5000)
+
+    @unittest.skipIf(sys.version_info < (3, 5), "zipfile requires seekable files")
+    def test_data_descriptors(self):
+        self._build_archive(stream=True)
+        with fs.archive.zipfs.ZipFS(self.archive, update='compact') as zipfs:
+            zipfs.remove('foo/baz.bin')
+        self.move.assert_not_called()
+        del self.data['foo/baz.bin']
+        self._check_archive(self.data)
+
 
 class TestZipFSio(ArchiveIOTestCases, unittest.TestCase):
 
@@ -106,3 +647,47 @@ class TestZipFSio(ArchiveIOTestCases, unittest.TestCase):
                         if path != abspath(name) and not path in seen:
                             seen.add(path)
                             yield zipname(path)
+
+
+class TestZipFSInferredDirectories(unittest.TestCase):
+
+    def setUp(self):
+        self.handle = io.BytesIO()
+        with zipfile.ZipFile(self.handle, 'w') as zf:
+            zf.writestr("foo/bar/baz/spam.txt", b"spam")
+            zf.writestr("foo/eggs.bin", b"eggs")
+            zf.writestr("foo/yolk/beans.txt", b"beans")
+            zf.writestr("foo/yolk/", b"")
+            zf.writestr("foo/empty/", b"")
+        self.handle.seek(0)
+        self.fs = fs.archive.zipfs.ZipReadFS(self.handle)
+
+    def tearDown(self):
+        self.fs.close()
+
+    def test_isfile(self):
+        self.assertFalse(self.fs.isfile("foo"))
+        self.assertFalse(self.fs.isfile("foo/bar"))
+        self.assertTrue(self.fs.isfile("foo/bar/baz/spam.txt"))
+        self.assertTrue(self.fs.isfile("foo/eggs.bin"))
+        self.assertFalse(self.fs.isfile("foo/eggs.bin/baz"))
+
+    def test_isdir(self):
+        self.assertTrue(self.fs.isdir("/"))
+        self.assertTrue(self.fs.isdir("foo"))
+        self.assertTrue(self.fs.isdir("foo/bar/baz"))
+        self.assertTrue(self.fs.isdir("foo/yolk"))
+        self.assertFalse(self.fs.isdir("foo/eggs.bin"))
+        self.assertFalse(self.fs.isdir("foo/nothere"))
+
+    def test_isempty(self):
+        self.assertTrue(self.fs.isempty("foo/empty"))
+        self.assertFalse(self.fs.isempty("foo/yolk"))
+        self.assertRaises(fs.errors.DirectoryExpected, self.fs.isempty, "foo/eggs.bin")
+        self.assertRaises(fs.errors.ResourceNotFound, self.fs.isempty, "foo/nothere")
+
+    def test_listdir(self):
+        self.assertEqual(sorted(self.fs.listdir("foo")), ["bar", "eggs.bin", "empty", "yolk"])
+        self.assertEqual(self.fs.listdir("foo/bar"), ["baz"])
+        self.assertEqual(self.fs.listdir("foo/yolk"), ["beans.txt"])
+        self.assertEqual(self.fs.listdir("foo/empty"), [])